@@ -8,9 +8,9 @@ anaUltraScurve
 if __name__ == '__main__':
     # Define the parser
     import argparse
-    from gempython.gemplotting.utils.anaoptions import parent_parser, parser_scurveChanMasks
+    from gempython.gemplotting.utils.anaoptions import parent_parser, parser_scurveChanMasks, parser_scurveFit
     from gempython.gemplotting.utils.anaInfo import maxChi2Default
-    parser = argparse.ArgumentParser(description="Options to give to anaUltraScurve.py", parents=[parent_parser,parser_scurveChanMasks])
+    parser = argparse.ArgumentParser(description="Options to give to anaUltraScurve.py", parents=[parent_parser,parser_scurveChanMasks,parser_scurveFit])
     
     # Positional arguments
     parser.add_argument("GEBtype",type=str,help="Specify GEB type, options are 'long,short,m1,...,m8', if analyzing data from an ME0 detector write 'null'")
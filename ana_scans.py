@@ -8,10 +8,58 @@ ana\_scans
 .. moduleauthor:: Brian Dorney <brian.l.dorney@cern.ch>
 """
 
+from gempython.gemplotting.utils.anaInfo import deadChanCutHighDefault, deadChanCutLowDefault, fitBackendDefault, highNoiseCutDefault, maxChi2Default, maxEffPedPercentDefault, numOfGoodChansMinDefault
 from gempython.utils.gemlogger import colors, printGreen, printRed, printYellow
 
 import signal
 
+#: Options read by each analysis function, keyed by its name, which change
+#: its results, with the default the function assumes when the option is
+#: missing from its namespace.  Only these enter the task signatures, so that
+#: e.g. an scurve analyzed by the scurve subcommand is up to date for
+#: armDacCal, whose namespace lacks some of them and adds others; see
+#: gempython.gemplotting.utils.manifest.getTaskSignature()
+resultOptions = {
+        "anaUltraScurve":{
+            "channels":False,
+            "deadChanCutHigh":deadChanCutHighDefault,
+            "deadChanCutLow":deadChanCutLowDefault,
+            "doNotFit":False,
+            "drawbad":False,
+            "extChanMapping":None,
+            "fitBackend":fitBackendDefault,
+            "highNoiseCut":highNoiseCutDefault,
+            "isVFAT2":False,
+            "maxChi2":maxChi2Default,
+            "maxEffPedPercent":maxEffPedPercentDefault,
+            "PanPin":False,
+            "remaskOnly":False,
+            "seed":None,
+            "slim":False,
+            "zscore":3.5
+            },
+        "anaUltraThreshold":{
+            "channels":False,
+            "doNotSavePlots":False,
+            "extChanMapping":None,
+            "isVFAT2":False,
+            "PanPin":False,
+            "pervfat":False,
+            "zscore":3.5
+            },
+        "calibrateThrDAC":{
+            "deadChanCutHigh":deadChanCutHighDefault,
+            "deadChanCutLow":deadChanCutLowDefault,
+            "fitRange":"0,255",
+            "highNoiseCut":highNoiseCutDefault,
+            "listOfVFATs":None,
+            "maxEffPedPercent":maxEffPedPercentDefault,
+            "noLeg":False,
+            "numOfGoodChansMin":numOfGoodChansMinDefault,
+            "savePlots":False
+            }
+        }
+
 def anaDACScan(args):
     """
     Launches a call of dacAnalysis to analyze DAC Scan Data
@@ -140,7 +188,8 @@ def calArmDACParallelAna(args):
 
     # Check that input listOfScandates files are valid
     dictOfFiles = getFileList("armDacCal",chamber_config,args.scandate,args.debug,GEBtype,args.inputfilename,args.listOfScandatesFile)
-    dictOfScurvesWithoutAna = {}
+    dictOfScurves = {}
+    dictOfScurveAnaFiles = {}
     import os
     from gempython.gemplotting.utils.anautilities import getDirByAnaType, getGEBTypeFromFilename, parseListOfScanDatesFile
     from gempython.gemplotting.utils.anaInfo import tree_names
@@ -169,11 +218,12 @@ def calArmDACParallelAna(args):
                     getDirByAnaType("scurve",cName),
                     thisScandate,
                     tree_names["scurve"][0]) # Better readability?
-            if not os.path.isfile(fullPath2File) and os.path.isfile(fullPath2FileNoAna):
+            dictOfScurveAnaFiles.setdefault(geoAddr,[]).append(fullPath2File)
+            if os.path.isfile(fullPath2FileNoAna):
                 gebType = getGEBTypeFromFilename(fullPath2FileNoAna,cName)
                 newGeoAddr = (geoAddr[0], geoAddr[1], geoAddr[2], thisScandate)
-                dictOfScurvesWithoutAna[newGeoAddr] = (fullPath2FileNoAna,cName,gebType)
-            elif not os.path.isfile(fullPath2File) and not os.path.isfile(fullPath2FileNoAna):
+                dictOfScurves[newGeoAddr] = (fullPath2FileNoAna,cName,gebType)
+            elif not os.path.isfile(fullPath2File):
                 printRed("calibrateArmDAC() - I did not find a valid raw scurve or analyzed scurve file for {0} scandate {1} from input file {2}".format(
                     cName,
                     thisScandate,
@@ -182,70 +232,46 @@ def calArmDACParallelAna(args):
             pass # End loop over listOfScurveTuples
         pass # End loop over dictOfFiles
 
-    # Analyze any raw scurve files needing analysis
-    from gempython.utils.wrappers import runCommand
-    if len(dictOfScurvesWithoutAna) > 0:
-        if args.debug:
-            msg="Following scurve files need analysis:\n"
-            for geoAddr,infoTuple in dictOfScurvesWithoutAna.iteritems():
-                msg="{0}\n\t{1}{2}{3}".format(msg,colors.GREEN,infoTuple[0],colors.ENDC)
-            print("{0}\n".format(msg))
-            pass
-
+    # Analyze any raw scurve files whose analysis is missing or out of date
+    if len(dictOfScurves) > 0:
         # Make output directories and set permissions
-        makeOutDirectories(dictOfScurvesWithoutAna)
+        makeOutDirectories(dictOfScurves)
 
         # Launch the pool processes
-        scurveMultiProcessing(args,dictOfScurvesWithoutAna)
+        scurveMultiProcessing(args,dictOfScurves,incremental=True)
 
         pass # End analyze un-analyzed scurves
 
-    # Setup a pool
-    from multiprocessing import Pool
-    from gempython.gemplotting.utils.anautilities import getNumCores2Use, init_worker
-    pool = Pool(getNumCores2Use(args), initializer=init_worker) # Allocate number of CPU's based on getNumCores2Use()
-
     # Perform ARM DAC calibration analysis
-    from gempython.gemplotting.utils.threshAlgos import calibrateThrDACStar
-    import itertools, sys, traceback
+    from gempython.gemplotting.utils.multiprocUtils import AnalysisTask, getFileCost
     from gempython.gemplotting.utils.namespace import Namespace
+    from gempython.gemplotting.utils.threshAlgos import calibrateThrDAC
 
-    namespaces = []
-    for calInfoTuple in dictOfFiles.values():
-        namespaces.append(Namespace(
-            inputFile = calInfoTuple[0].format(DETECTOR=calInfoTuple[1]),
-            fitRange = "0,255",
-            listOfVFATs = None,
-            noLeg = args.noLeg,
-            outputDir = calInfoTuple[0][0:calInfoTuple[0].rfind("/")+1],
-            savePlots = args.savePlots,
-            debug = args.debug
-            ))
+    listOfTasks = []
+    for geoAddr,calInfoTuple in dictOfFiles.iteritems():
+        inputFile = calInfoTuple[0].format(DETECTOR=calInfoTuple[1])
+        outputDir = calInfoTuple[0][0:calInfoTuple[0].rfind("/")+1]
+        listOfTasks.append(AnalysisTask(
+            name = inputFile,
+            func = calibrateThrDAC,
+            args = (Namespace(
+                inputFile = inputFile,
+                fitRange = "0,255",
+                listOfVFATs = None,
+                noLeg = args.noLeg,
+                outputDir = outputDir,
+                savePlots = args.savePlots,
+                debug = args.debug
+                ),),
+            cost = getFileCost(inputFile),
+            inputFile = inputFile,
+            outputFile = outputDir+tree_names["armDacCalAna"][0].format(DETECTOR=calInfoTuple[1]),
+            dependencies = dictOfScurveAnaFiles.get(geoAddr,[])))
+        pass
 
     try:
         print("Calibration CFG_THR_ARM_DAC; please be patient")
-        pool.map_async(calibrateThrDACStar,
-                itertools.izip(namespaces)
-                ).get(1800) # wait at most 30 minutes, this should be "relatively" quick
-    except KeyboardInterrupt:
-        printRed("Caught KeyboardInterrupt, terminating workers")
-        pool.terminate()
-        printRed("Analysis Failed")
-    except Exception as err:
-        printRed("Caught {0}: {1}, terminating workers".format(type(err), err.message))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-    except: # catch *all* exceptions
-        e = sys.exc_info()[0]
-        printRed("Caught non-Python Exception %s"%(e))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-    else:
-        printGreen("Analysis Completed Successfully")
-        pool.close()
-        pool.join()
+        runAnalysisTasks(args, listOfTasks)
     finally:
         # Ensure permissions of all files in subdirectories have group read and write
         setPermissions(dictOfFiles)
@@ -253,6 +279,60 @@ def calArmDACParallelAna(args):
 
     return
 
+def fillCalCache(args):
+    """
+    Retrieves from the GEM DB the calibration of every VFAT found in the raw
+    scurve files stored under $DATA_PATH, with one query for all chambers, and
+    stores it in the local calibration cache, see
+    gempython.gemplotting.utils.dbutils.getVFAT3CalInfo(), so that later
+    analyses of these chips do not query the DB
+
+    args - object returned by argparse.ArgumentParser.parse_args()
+    """
+
+    import os
+    import numpy as np
+    import root_numpy as rp
+    from gempython.gemplotting.utils.anaInfo import tree_names
+    from gempython.gemplotting.utils.anautilities import getDataPath, getDirByAnaType
+    from gempython.gemplotting.utils.dbutils import getCalCachePath, getVFAT3CalInfo
+    from gempython.gemplotting.utils.scancatalog import listScandates
+
+    dataPath = getDataPath()
+    if args.chambers is not None:
+        listOfChambers = args.chambers.split(",")
+    else:
+        listOfChambers = sorted(name for name in os.listdir(dataPath) if os.path.isdir(os.path.join(dataPath, name)))
+
+    setOfChipIDs = set()
+    for chamber in listOfChambers:
+        scurveDir = getDirByAnaType("scurve", chamber)
+        if not os.path.isdir(scurveDir):
+            continue
+
+        nVFATs = len(setOfChipIDs)
+        for scandate in listScandates(scurveDir):
+            scurveFile = "{0}/{1}/{2}".format(scurveDir, scandate, tree_names["scurve"][0])
+            try:
+                setOfChipIDs.update(np.unique(rp.root2array(scurveFile, treename=tree_names["scurve"][1], branches=["vfatID"])["vfatID"]).tolist())
+            except (IOError, ValueError):
+                if args.debug:
+                    printYellow("No vfatID found in {0}".format(scurveFile))
+                pass
+            pass
+        if args.debug:
+            print("Found {0} new VFATs in the scurves of {1}".format(len(setOfChipIDs) - nVFATs, chamber))
+        pass
+
+    if len(setOfChipIDs) > 0:
+        print("Retrieving the calibration of {0} VFATs".format(len(setOfChipIDs)))
+        getVFAT3CalInfo(sorted(setOfChipIDs), args.debug, refresh=args.refresh)
+        pass
+
+    printGreen("Calibration of {0} VFATs stored in {1}".format(len(setOfChipIDs), getCalCachePath()))
+
+    return
+
 def getChamberConfig(args):
     """
     Determines the chamber_config and GEBtype dictionaries based on input arguments.
@@ -338,17 +418,19 @@ def getFileList(anaType,chamber_config,scandate,debug=False,GEBtype=None,inputfi
 
     from gempython.gemplotting.utils.anaInfo import tree_names
     from gempython.gemplotting.utils.anautilities import getDirByAnaType, getGEBTypeFromFilename
+    from gempython.gemplotting.utils.scancatalog import scanExists, scanFileExists
     import os
     if scandate is not None:
         listOfFoundFiles = [ ]
         for geoAddr,cName in chamber_config.iteritems():
             # Determine filename
             if "Ana" in anaType:
-                thisPath = "{0}/{1}".format(getDirByAnaType(anaType.replace("Ana",""),cName),scandate)
+                dirPath = getDirByAnaType(anaType.replace("Ana",""),cName)
             elif ((anaType == "sbitRateor") or (anaType == 'sbitRatech')):
-                thisPath = "{0}/{1}".format(getDirByAnaType(anaType,None),scandate)
+                dirPath = getDirByAnaType(anaType,None)
             else:
-                thisPath = "{0}/{1}".format(getDirByAnaType(anaType,cName),scandate)
+                dirPath = getDirByAnaType(anaType,cName)
+            thisPath = "{0}/{1}".format(dirPath,scandate)
             filename = "{0}/{1}".format(thisPath,tree_names[anaType][0])
 
             # Check that this file is not in listOfFoundFiles
@@ -365,10 +447,10 @@ def getFileList(anaType,chamber_config,scandate,debug=False,GEBtype=None,inputfi
                 
                 # If anaType is trimV3, armDacCal or armDacCalAna check if the path, excluding file, is valid
                 # For all other anaTypes check if the file is valid
-                if (((anaType == "trimV3") or ("armDacCal" in anaType)) and os.path.isdir(thisPath)):
+                if (((anaType == "trimV3") or ("armDacCal" in anaType)) and scanExists(dirPath,scandate)):
                     fileDict[geoAddr]=infoTuple
                     listOfFoundFiles.append(filename)
-                elif os.path.isfile(filename):
+                elif scanFileExists(dirPath,scandate,tree_names[anaType][0]):
                     fileDict[geoAddr]=infoTuple
                     listOfFoundFiles.append(filename)
                     pass
@@ -406,17 +488,18 @@ def getFileList(anaType,chamber_config,scandate,debug=False,GEBtype=None,inputfi
 
             # Determine filename
             if "Ana" in anaType:
-                thisPath = "{0}/{1}".format(getDirByAnaType(anaType.replace("Ana",""),cName),scandate)
+                dirPath = getDirByAnaType(anaType.replace("Ana",""),cName)
             else:
-                thisPath = "{0}/{1}".format(getDirByAnaType(anaType,cName),scandate)
+                dirPath = getDirByAnaType(anaType,cName)
+            thisPath = "{0}/{1}".format(dirPath,scandate)
             filename = "{0}/{1}".format(thisPath,tree_names[anaType][0])
 
             # If anaType is trimV3, armDacCal or armDacCalAna check if the path, excluding file, is valid
             # For all other anaTypes check if the file is valid
-            if (((anaType == "trimV3") or ("armDacCal" in anaType)) and (not os.path.isdir(thisPath))):
+            if (((anaType == "trimV3") or ("armDacCal" in anaType)) and (not scanExists(dirPath,scandate))):
                 printYellow("Path {0} does not exist or is not readable; no matching path for entry ({1},{2},{3}). Skipping".format(thisPath,cName,scandate,anaType))
                 continue
-            elif not os.path.isfile(filename):
+            elif not scanFileExists(dirPath,scandate,tree_names[anaType][0]):
                 printYellow("File {0} does not exist or is not readable; no matching file for entry ({1},{2},{3}). Skipping".format(filename,cName,scandate,anaType))
                 continue
 
@@ -482,48 +565,120 @@ def latencyParallelAna(args):
     # Make output directories and set permissions
     makeOutDirectories(dictOfFiles)
 
-    # Setup a pool
-    from multiprocessing import Pool
-    from gempython.gemplotting.utils.anautilities import getNumCores2Use, init_worker
-    pool = Pool(getNumCores2Use(args), initializer=init_worker) # Allocate number of CPU's based on getNumCores2Use()
-
-    # Launch the pool processes
-    from gempython.gemplotting.utils.latAlgos import anaUltraLatencyStar
-    import itertools, sys, traceback
+    # Launch the tasks, one per input file
+    from gempython.gemplotting.utils.latAlgos import anaUltraLatency
+    from gempython.gemplotting.utils.multiprocUtils import AnalysisTask, getFileCost
+    listOfTasks = [ AnalysisTask(
+                name = latFile[0],
+                func = anaUltraLatency,
+                args = (
+                    latFile[0],                     # infilename
+                    args.debug,                     # debug
+                    args.latSigMaskRange,           # latSigMaskRange
+                    args.latSigRange,               # latSigRange
+                    latFile[0].replace(".root",""), # outputDir
+                    "latencyAna.root",              # outfilename
+                    args.performFit                 # performFit
+                    ),
+                cost = getFileCost(latFile[0]),
+                inputFile = latFile[0],
+                outputFile = latFile[0].replace(".root","")+"/latencyAna.root",
+                dependencies = []) for latFile in dictOfFiles.values() ]
     try:
-        pool.map_async(anaUltraLatencyStar,
-                itertools.izip(
-                    [latFile[0] for latFile in dictOfFiles.values()],                       # infilename
-                    [args.debug for latFile in dictOfFiles.values()],                       # debug
-                    [args.latSigMaskRange for geoAddr in dictOfFiles.keys()],               # latSigMaskRange
-                    [args.latSigRange for geoAddr in dictOfFiles.keys()],                   # latSigRange
-                    [latFile[0].replace(".root","") for latFile in dictOfFiles.values()],   # outputDir
-                    ["latencyAna.root" for geoAddr in dictOfFiles.keys()],                  # outfilename
-                    [args.performFit for geoAddr in dictOfFiles.keys()]                     # performFit
-                    )
-                ).get(7200) # wait at most 2 hours
-    except KeyboardInterrupt:
-        printRed("Caught KeyboardInterrupt, terminating workers")
-        pool.terminate()
-        printRed("Analysis Failed")
-    except Exception as err:
-        printRed("Caught {0}: {1}, terminating workers".format(type(err), err.message))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-    except: # catch *all* exceptions
-        e = sys.exc_info()[0]
-        printRed("Caught non-Python Exception %s"%(e))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-    else:
-        printGreen("Analysis Completed Successfully")
-        pool.close()
-        pool.join()
+        runAnalysisTasks(args, listOfTasks)
     finally:
         # Ensure permissions of all files in subdirectories have group read and write
         setPermissions(dictOfFiles)
+        updateScanCatalog(dictOfFiles)
+
+    return
+
+def loadCalibrations(args, listOfTasks):
+    """
+    For the scurve analysis of VFAT3 data, retrieves with a single DB query
+    the CAL_DAC calibration of the VFATs of all input files of listOfTasks, see
+    gempython.gemplotting.utils.dbutils.prefetchVFAT3CalInfo(), and stores it
+    in gempython.gemplotting.utils.multiprocUtils.sharedData from where the
+    worker processes receive it instead of each querying the DB.
+
+    anaUltraScurve() is called with calFile=None, so the calibration is not a
+    file recorded in the manifest; instead a digest of the calibration of the
+    VFATs of each input file is returned, as a dictionary keyed by task name,
+    to enter the task signature.  Failures are not fatal, the workers then
+    query the DB themselves and the digest is None.
+
+    args        - object returned by argparse.ArgumentParser.parse_args()
+    listOfTasks - list of AnalysisTask
+    """
+
+    from gempython.gemplotting.utils.scurveAlgos import anaUltraScurve
+    listOfScurveTasks = [ task for task in listOfTasks if task.func is anaUltraScurve ]
+    dictOfDigests = dict((task.name, None) for task in listOfScurveTasks)
+    if len(listOfScurveTasks) == 0 or getattr(args, "isVFAT2", False):
+        return dictOfDigests
+
+    import numpy as np
+    import root_numpy as rp
+    dictOfChipIDs = {}
+    for task in listOfScurveTasks:
+        try:
+            dictOfChipIDs[task.name] = np.unique(rp.root2array(task.inputFile, treename="scurveTree", branches=["vfatID"])["vfatID"]).tolist()
+        except (IOError, ValueError):
+            pass # the task will report it
+        pass
+
+    from gempython.gemplotting.utils.cacheutils import getDigest
+    from gempython.gemplotting.utils.dbutils import getVFAT3CalInfo, prefetchVFAT3CalInfo
+    setOfChipIDs = set([-1]) # anaUltraScurve() uses -1 for the VFATs missing from the input
+    for listOfChipIDs in dictOfChipIDs.values():
+        setOfChipIDs.update(listOfChipIDs)
+        pass
+    try:
+        print("Retrieving the calibration of {0} VFATs".format(len(setOfChipIDs)-1))
+        prefetchVFAT3CalInfo(list(setOfChipIDs), args.debug)
+        for name, listOfChipIDs in dictOfChipIDs.iteritems():
+            calInfo = getVFAT3CalInfo(listOfChipIDs, args.debug) # from sharedData
+            dictOfDigests[name] = getDigest(
+                    np.array(listOfChipIDs),
+                    calInfo['cal_dacm'].values.astype(float),
+                    calInfo['cal_dacb'].values.astype(float))
+            pass
+    except Exception as err:
+        printYellow("Unable to retrieve the VFAT calibrations from the DB, each task will query it: {0}".format(err))
+        pass
+
+    return dictOfDigests
+
+def loadSharedData(args, listOfTasks):
+    """
+    Loads the channel mapping files, as ChannelMap's, see
+    gempython.gemplotting.utils.anautilities.loadMapping(), once before the
+    tasks of listOfTasks are launched, into
+    gempython.gemplotting.utils.multiprocUtils.sharedData from where the worker
+    processes receive them instead of each loading them again.  The
+    calibrations are loaded by loadCalibrations().
+
+    Failures are not fatal, the workers then load the data themselves.
+
+    args        - object returned by argparse.ArgumentParser.parse_args()
+    listOfTasks - list of AnalysisTask
+    """
+
+    # Channel mappings; the analyses read them with the default isVFAT2=True of getMapping()
+    import pkg_resources
+    from gempython.gemplotting.utils.anautilities import loadMapping
+    MAPPING_PATH = pkg_resources.resource_filename('gempython.gemplotting', 'mapping/')
+    listOfMappingFiles = [ MAPPING_PATH+'/longChannelMap.txt', MAPPING_PATH+'/shortChannelMap.txt' ]
+    if getattr(args, "extChanMapping", None) is not None:
+        listOfMappingFiles.append(args.extChanMapping)
+    for mappingFile in listOfMappingFiles:
+        try:
+            loadMapping(mappingFile)
+        except (IOError, ValueError) as err:
+            if args.debug:
+                printYellow("Unable to load channel mapping {0}: {1}".format(mappingFile, err))
+            pass
+        pass
 
     return
 
@@ -547,65 +702,132 @@ def makeOutDirectories(dictOfFiles, permissions="g+rw"):
         pass
     return
 
-def scurveMultiProcessing(args, dictOfFiles):
+def rescanScanCatalog(args):
+    """
+    Refreshes the catalog of the scans stored under $DATA_PATH, see
+    gempython.gemplotting.utils.scancatalog.rescanCatalog()
+
+    args - object returned by argparse.ArgumentParser.parse_args()
+    """
+
+    listOfChambers = None
+    if args.chambers is not None:
+        listOfChambers = args.chambers.split(",")
+    listOfAnaTypes = None
+    if args.anaTypes is not None:
+        listOfAnaTypes = args.anaTypes.split(",")
+
+    from gempython.gemplotting.utils.scancatalog import getCatalogPath, rescanCatalog, scanFileTypes
+    if listOfAnaTypes is not None:
+        for anaType in listOfAnaTypes:
+            if anaType not in scanFileTypes:
+                raise RuntimeError("rescanScanCatalog(): anaType {0} is not cataloged, possible values are {1}".format(anaType, sorted(scanFileTypes.keys())))
+            pass
+        pass
+
+    nScans = rescanCatalog(listOfChambers, listOfAnaTypes, args.debug)
+    printGreen("Cataloged {0} scans in {1}".format(nScans, getCatalogPath()))
+
+    return
+
+def runAnalysisTasks(args, listOfTasks, incremental=False):
+    """
+    Runs listOfTasks on at most getNumCores2Use(args) processes, sharing with
+    them the data loaded by loadSharedData(), see
+    gempython.gemplotting.utils.multiprocUtils.planWorkers() and
+    gempython.gemplotting.utils.multiprocUtils.runTasks(), and records the
+    completion of each task in the manifest of its output directory, see
+    gempython.gemplotting.utils.manifest.  Returns the list of TaskResult's.
+
+    If args.resume or incremental is True, and args.force is not, the tasks
+    whose output is up to date are skipped: the output exists and neither its
+    input files, nor the code, resultOptions or DB calibration of the task
+    changed since it was produced, see loadCalibrations().
+
+    args        - object returned by argparse.ArgumentParser.parse_args()
+    listOfTasks - list of AnalysisTask
+    incremental - if True skip the up to date tasks even if args.resume is False
+    """
+
+    from gempython.gemplotting.utils.anautilities import getNumCores2Use
+    from gempython.gemplotting.utils.manifest import getTaskSignature, isTaskDone, recordTask
+    from gempython.gemplotting.utils.multiprocUtils import TaskResult, planWorkers, printTaskSummary, runTasks
+
+    dictOfCalDigests = loadCalibrations(args, listOfTasks)
+    dictOfSignatures = dict((task.name, getTaskSignature(task.func, task.args, resultOptions.get(task.func.__name__, {}), (dictOfCalDigests.get(task.name),))) for task in listOfTasks)
+
+    listOfSkipped = []
+    if (args.resume or incremental) and not args.force:
+        listOfSkipped = [ task for task in listOfTasks if isTaskDone(task.inputFile, task.outputFile, task.dependencies, dictOfSignatures[task.name]) ]
+        listOfTasks = [ task for task in listOfTasks if task not in listOfSkipped ]
+        if len(listOfSkipped) > 0:
+            printYellow("Skipping {0} input files whose analysis is up to date, use --force to analyze them again".format(len(listOfSkipped)))
+            if args.debug:
+                for task in listOfSkipped:
+                    print("\t{0}".format(task.name))
+                pass
+            pass
+        pass
+
+    def recordResult(task, result):
+        try:
+            recordTask(task.inputFile, task.outputFile, result.status, result.elapsed, task.dependencies, dictOfSignatures[task.name])
+        except (IOError, OSError) as err:
+            printYellow("Unable to record the completion of {0}: {1}".format(task.name, err))
+            pass
+        return
+
+    listOfResults = []
+    if len(listOfTasks) > 0:
+        loadSharedData(args, listOfTasks)
+        nWorkers = planWorkers(listOfTasks, getNumCores2Use(args), args.workers is not None)
+        listOfResults = runTasks(listOfTasks, nWorkers, args.taskTimeout, args.debug, recordResult)
+    listOfResults.extend(TaskResult(task.name, "skipped", "", 0., 0.) for task in listOfSkipped)
+    printTaskSummary(listOfResults)
+
+    return listOfResults
+
+def scurveMultiProcessing(args, dictOfFiles, incremental=False):
     """
-    Analyze a set of scurve measurements in parallel with anaUltraScurve
+    Analyze a set of scurve measurements in parallel with anaUltraScurve, one task per file, see
+    runAnalysisTasks().  Returns the list of TaskResult's.
 
     args        - object returned by argparse.ArgumentParser.parse_args() 
     dictOfFiles - dictionary where keys are a tuple of the geographic address (shelf,slot,link) and
                   whose values are a tuple (filename,chamberName,GEBtype). See the values of the
                   gemVariants dictionary of gempython.tools.hw_constants for possible GEBtype values
+    incremental - if True only the files whose analysis is missing or out of date are analyzed
     """
 
-    # Setup a pool
-    from multiprocessing import Pool
-    from gempython.gemplotting.utils.anautilities import getNumCores2Use, init_worker
-    pool = Pool(getNumCores2Use(args), initializer=init_worker) # Allocate number of CPU's based on getNumCores2Use()
-
-    # Launch the pool processes
-    from gempython.gemplotting.utils.scurveAlgos import anaUltraScurveStar
-    import itertools, sys, traceback
+    # Launch the tasks, one per input file
+    from gempython.gemplotting.utils.multiprocUtils import AnalysisTask, getFileCost
+    from gempython.gemplotting.utils.scurveAlgos import anaUltraScurve
+    outfilename = getattr(args, "outfilename", "SCurveFitData.root")
+    listOfTasks = [ AnalysisTask(
+                name = scurveFile[0],
+                func = anaUltraScurve,
+                args = (
+                    args,                               # args namespace
+                    scurveFile[0],                      # scurveFilename
+                    None,                               # calFile
+                    scurveFile[2],                      # GEBtype
+                    scurveFile[0].replace(".root",""),  # outputDir
+                    None                                # vfatList
+                    ),
+                cost = getFileCost(scurveFile[0]),
+                inputFile = scurveFile[0],
+                outputFile = scurveFile[0].replace(".root","")+"/"+outfilename,
+                dependencies = []) for scurveFile in dictOfFiles.values() ]
     try:
         print("Launching scurve analysis processes, this may take some time, please be patient")
-        pool.map_async(anaUltraScurveStar,
-            itertools.izip(
-                [args for geoAddr in dictOfFiles.keys()],                                    # args namespace
-                [scurveFile[0] for scurveFile in dictOfFiles.values()],                      # scurveFilename
-                [None for geoAddr in dictOfFiles.keys()],                                    # calFile
-                [scurveFile[2] for scurveFile in dictOfFiles.values()],                      # GEBtype
-                [scurveFile[0].replace(".root","") for scurveFile in dictOfFiles.values()],  # outputDir
-                [None for geoAddr in dictOfFiles.keys()]                                     # vfatList
-                )
-            ).get(7200) # wait at most 2 hours
-    except KeyboardInterrupt:
-        printRed("Caught KeyboardInterrupt, terminating workers")
-        pool.terminate()
-        printRed("Analysis Failed")
-        sys.exit()
-    except Exception as err:
-        printRed("Caught {0}: {1}, terminating workers".format(type(err), err.message))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-        sys.exit()
-    except: # catch *all* exceptions
-        e = sys.exc_info()[0]
-        printRed("Caught non-Python Exception %s"%(e))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-        sys.exit()
-    else:
-        printGreen("Analysis Completed Successfully")
-        pool.close()
-        pool.join()
-        analysisPassed = True
+        listOfResults = runAnalysisTasks(args, listOfTasks, incremental)
     finally:
         # Ensure permissions of all files in subdirectories have group read and write
         setPermissions(dictOfFiles)
+        updateScanCatalog(dictOfFiles)
         pass
 
-    return
+    return listOfResults
 
 def scurveParallelAna(args):
     """
@@ -662,11 +884,6 @@ def threshTrkParallelAna(args):
     # Get list of input files for threshold analysis
     dictOfFiles = getFileList("thresholdch",chamber_config,args.scandate,args.debug,GEBtype,args.inputfilename,args.listOfScandatesFile)
     
-    # Setup a pool
-    from multiprocessing import Pool
-    from gempython.gemplotting.utils.anautilities import getNumCores2Use, init_worker
-    pool = Pool(getNumCores2Use(args), initializer=init_worker) # Allocate number of CPU's based on getNumCores2Use()
-
     # Should the chConfig.txt file produced in the threshold analysis include updates from a completed scurve analysis?
     if args.scurveScandate is not None:
         dictOfScurveAnaFiles = getFileList("scurveAna",chamber_config,args.scurveScandate,args.debug,GEBtype,args.inputfilename,None)
@@ -681,42 +898,31 @@ def threshTrkParallelAna(args):
     # Make output directories and set permissions
     makeOutDirectories(dictOfFiles)
 
-    # Launch the pool processes
-    from gempython.gemplotting.utils.threshAlgos import anaUltraThresholdStar
-    import itertools, sys, traceback
+    # Launch the tasks, one per input file
+    from gempython.gemplotting.utils.multiprocUtils import AnalysisTask, getFileCost
+    from gempython.gemplotting.utils.threshAlgos import anaUltraThreshold
+    outfilename = getattr(args, "outfilename", "ThresholdPlots.root")
+    listOfTasks = [ AnalysisTask(
+                name = thrFile[0],
+                func = anaUltraThreshold,
+                args = (
+                    args,                                   # args namespace
+                    thrFile[0],                             # thrFilename
+                    GEBtype[geoAddr],                       # GEBtype
+                    thrFile[0].replace(".root",""),         # outputDir
+                    dictOfScurveAnaFiles[geoAddr][0]        # fileScurveFitTree
+                    ),
+                cost = getFileCost(thrFile[0]),
+                inputFile = thrFile[0],
+                outputFile = thrFile[0].replace(".root","")+"/"+outfilename,
+                dependencies = [ dictOfScurveAnaFiles[geoAddr][0] ] if dictOfScurveAnaFiles[geoAddr][0] is not None else []) for geoAddr,thrFile in dictOfFiles.iteritems() ]
     try:
         print("Launching threshold analysis processes, this may take some time, please be patient")
-        pool.map_async(anaUltraThresholdStar,
-                itertools.izip(
-                    [args for geoAddr in dictOfFiles.keys()],                               # args namespace
-                    [thrFile[0] for thrFile in dictOfFiles.values()],                       # thrFilename
-                    [GEBtype[geoAddr] for geoAddr in dictOfFiles.keys()],                   # GEBtype
-                    [thrFile[0].replace(".root","") for thrFile in dictOfFiles.values()],   # outputDir
-                    [scurveFile[0] for scurveFile in dictOfScurveAnaFiles.values()]         # fileScurveFitTree
-                    )
-                ).get(7200) # wait at most 2 hours
-    except KeyboardInterrupt:
-        printRed("Caught KeyboardInterrupt, terminating workers")
-        pool.terminate()
-        printRed("Analysis Failed")
-    except Exception as err:
-        printRed("Caught {0}: {1}, terminating workers".format(type(err), err.message))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-    except: # catch *all* exceptions
-        e = sys.exc_info()[0]
-        printRed("Caught non-Python Exception %s"%(e))
-        pool.terminate()
-        traceback.print_exc(file=sys.stdout)
-        printRed("Analysis Failed")
-    else:
-        printGreen("Analysis Completed Successfully")
-        pool.close()
-        pool.join()
+        runAnalysisTasks(args, listOfTasks)
     finally:
         # Ensure permissions of all files in subdirectories have group read and write
         setPermissions(dictOfFiles)
+        updateScanCatalog(dictOfFiles)
         pass
 
     return
@@ -791,6 +997,23 @@ def trimParallelAna(args):
 
     return
 
+def updateScanCatalog(dictOfFiles):
+    """
+    Updates the scan catalog entries of the scandate directories holding the
+    files of dictOfFiles, e.g. once they have been analyzed.
+    See gempython.gemplotting.utils.scancatalog
+
+        dictOfFiles - dictionary of tuples where the first element of each tuple is a the name of a TFile.
+                      See documentation for getFileList()
+    """
+
+    from gempython.gemplotting.utils.scancatalog import updateScan
+    import os
+    for infoTuple in dictOfFiles.values():
+        updateScan(os.path.dirname(infoTuple[0]))
+        pass
+    return
+
 if __name__ == '__main__':
     import argparse
     
@@ -815,6 +1038,10 @@ if __name__ == '__main__':
     cpuUsagee.add_argument("--light", action="store_true", help="Analysis uses only 25%% of available cores")
     cpuUsagee.add_argument("--medium", action="store_true", help="Analysis uses only 50%% of available cores")
     cpuUsagee.add_argument("--heavy", action="store_true", help="Analysis uses only 75%% of available cores")
+    cpuUsagee.add_argument("--workers", type=int, help="Analysis uses exactly this number of worker processes (at most one per input file), regardless of the load and available memory")
+    parser_parallelAna.add_argument("--resume", action="store_true", help="Only analyze the input files whose analysis is missing or out of date, i.e. whose input files (raw data, calibration, scurve fit results), analysis code or options changed since their analysis, as recorded in the anaManifest.json file of each output directory; use this to restart an interrupted batch or in a periodic job over all chambers")
+    parser_parallelAna.add_argument("--force", action="store_true", help="Analyze all input files even if their analysis is up to date; overrides --resume and, for armDacCal, also analyzes again the scurves which have already been analyzed")
+    parser_parallelAna.add_argument("--taskTimeout", type=int, default=7200, help="Maximum time in seconds the analysis of a single input file may take, 0 for no limit; a task exceeding it is reported as failed while the others continue")
 
     # create the parent parser for making output plots w.r.t ASIC channel or panasonic connector pin
     parser_stripChanOrPinType = argparse.ArgumentParser(add_help = False)
@@ -826,10 +1053,10 @@ if __name__ == '__main__':
     parser_zscore = argparse.ArgumentParser(add_help = False)
     parser_zscore.add_argument("-z","--zscore", type=float, default=10,help="Z-Score for Outlier Identification in MAD Algo, used to set HotChannel bit")
 
-    from gempython.gemplotting.utils.anaoptions import parser_scurveChanMasks
+    from gempython.gemplotting.utils.anaoptions import parser_scurveChanMasks, parser_scurveFit
     
     # List of parent parsers specifically scurce analysis
-    listOfParentParsers4Scurves = [parser_fileAndConfig, parser_parallelAna, parser_scurveChanMasks, parser_stripChanOrPinType, parser_zscore]
+    listOfParentParsers4Scurves = [parser_fileAndConfig, parser_parallelAna, parser_scurveChanMasks, parser_scurveFit, parser_stripChanOrPinType, parser_zscore]
 
     # create the parser that sub parsers will come from
     # =================================================
@@ -899,6 +1126,24 @@ if __name__ == '__main__':
 
     parser_trim.set_defaults(func=trimParallelAna)
 
+    # Create subparser for the scan catalog
+    # -------------------------------------------------
+    parser_rescan = subparserCmds.add_parser("rescan", help="Refreshes the catalog of the scans stored under $DATA_PATH which is used to find scandates, see gempython.gemplotting.utils.scancatalog")
+    parser_rescan.add_argument("-d","--debug", action="store_true",help = "Print additional debugging information")
+    parser_rescan.add_argument("--chambers",type=str,default=None,help="Comma separated list of detector serial numbers to catalog; if not provided all directories under $DATA_PATH are cataloged")
+    parser_rescan.add_argument("--anaTypes",type=str,default=None,help="Comma separated list of analysis types to catalog, e.g. 'scurve,trim'; if not provided all cataloged types are considered")
+
+    parser_rescan.set_defaults(func=rescanScanCatalog)
+
+    # Create subparser for the VFAT calibration cache
+    # -------------------------------------------------
+    parser_calCache = subparserCmds.add_parser("calCache", help="Retrieves from the GEM DB the calibration of all VFATs found in the scurves stored under $DATA_PATH and stores it in the local cache used by the analyses, see gempython.gemplotting.utils.dbutils")
+    parser_calCache.add_argument("-d","--debug", action="store_true",help = "Print additional debugging information")
+    parser_calCache.add_argument("--chambers",type=str,default=None,help="Comma separated list of detector serial numbers to consider; if not provided all directories under $DATA_PATH are considered")
+    parser_calCache.add_argument("--refresh", action="store_true",help = "Retrieve the calibration of all VFATs again, even if the cached one is recent")
+
+    parser_calCache.set_defaults(func=fillCalCache)
+
     # Parser the arguments and call the appropriate function
     # =================================================
     from gempython.utils.wrappers import envCheck
@@ -0,0 +1,228 @@
+r"""
+``batchFit`` --- Vectorized S-curve fitting
+===========================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.fitting.batchFit
+
+Fits many S-curves at once with numpy array operations instead of one ``TF1``
+per channel. The model is the same as the one used by
+:py:class:`gempython.gemplotting.fitting.fitScanData.ScanDataFitter`:
+
+.. math::
+
+    f(x) = p_3 \cdot \mathrm{erf}\left(\frac{\max(p_2, x) - p_0}{\sqrt{2} p_1}\right) + p_3
+
+Every function in this module works on a batch of ``K`` curves sampled on
+``n`` points; inputs are arrays of shape ``(K, n)`` (or broadcastable to it) and
+outputs are arrays of shape ``(K,)``.
+
+Documentation
+-------------
+"""
+
+import numpy as np
+
+#: Index of the parameters that are floated by :py:func:`fitScurves`, the
+#: pedestal clamp :math:`p_2` is held at its initial value
+FREE_PARAMS = (0, 1, 3)
+
+def scurveModel(x, p0, p1, p2, p3):
+    """
+    Evaluates the S-curve model for a batch of curves
+
+    x       - numpy array of shape (K, n) of charge values
+    p0..p3  - numpy arrays of shape (K,) holding the model parameters
+    """
+    from scipy.special import erf
+
+    z = (np.maximum(p2[:,None], x) - p0[:,None]) / (np.sqrt(2.) * p1[:,None])
+    return p3[:,None] * erf(z) + p3[:,None]
+
+def scurveJacobian(x, p0, p1, p2, p3):
+    """
+    Returns a tuple (f, J) where f is the model evaluated as in scurveModel()
+    and J is a numpy array of shape (K, n, 3) holding the analytic derivatives
+    of f with respect to the FREE_PARAMS (p0, p1, p3)
+    """
+    from scipy.special import erf
+
+    z = (np.maximum(p2[:,None], x) - p0[:,None]) / (np.sqrt(2.) * p1[:,None])
+    erfz = erf(z)
+    dfdz = p3[:,None] * 2. / np.sqrt(np.pi) * np.exp(-z*z)
+
+    jac = np.empty(x.shape + (3,))
+    jac[...,0] = -dfdz / (np.sqrt(2.) * p1[:,None])
+    jac[...,1] = -dfdz * z / p1[:,None]
+    jac[...,2] = erfz + 1.
+
+    return (p3[:,None] * erfz + p3[:,None], jac)
+
+def getCrossing(x, occupancy, level):
+    """
+    Returns a numpy array of shape (K,) holding, for each curve, the x value
+    at which a monotonically increasing occupancy first reaches level; the two
+    neighbouring points are linearly interpolated.  Curves that never reach
+    level are set to nan.
+
+    x         - numpy array of shape (K, n), sorted in increasing x along axis 1
+    occupancy - numpy array of shape (K, n), non-decreasing along axis 1
+    level     - float, fraction of the plateau
+    """
+    above = occupancy >= level
+    idxHigh = np.argmax(above, axis=1)
+    idxLow = np.maximum(idxHigh - 1, 0)
+    rows = np.arange(x.shape[0])
+
+    xLow, xHigh = x[rows,idxLow], x[rows,idxHigh]
+    occLow, occHigh = occupancy[rows,idxLow], occupancy[rows,idxHigh]
+    frac = np.where(occHigh > occLow, (level - occLow) / np.where(occHigh > occLow, occHigh - occLow, 1.), 0.)
+
+    return np.where(np.any(above, axis=1), xLow + frac * (xHigh - xLow), np.nan)
+
+def getCrossingGuess(x, y):
+    """
+    Estimates the S-curve mean and width from the cumulative occupancy: the
+    mean is taken at the 50% crossing and the width as half the distance
+    between the 16% and 84% crossings.  Returns a tuple of numpy arrays
+    (mean, sigma) each of shape (K,); entries are nan if a curve has no hits.
+
+    The occupancy is forced to be monotonic and normalized to its plateau so
+    that channels which do not reach full efficiency are still estimated.
+
+    x   - numpy array of shape (K, n), sorted in increasing x along axis 1
+    y   - numpy array of shape (K, n) storing the number of hits
+    """
+    x = np.broadcast_to(x, y.shape).astype(float)
+    occupancy = np.maximum.accumulate(np.maximum(y.astype(float), 0.), axis=1)
+    plateau = occupancy[:,-1]
+    occupancy = occupancy / np.where(plateau > 0, plateau, 1.)[:,None]
+
+    mean = getCrossing(x, occupancy, 0.5)
+    sigma = 0.5 * (getCrossing(x, occupancy, 0.84) - getCrossing(x, occupancy, 0.16))
+
+    # A step contained in a single bin gives no width, use the bin size
+    binWidth = np.abs(x[:,1] - x[:,0]) if x.shape[1] > 1 else np.ones(x.shape[0])
+    sigma = np.where(sigma > 0, sigma, 0.5 * binWidth)
+
+    return (np.where(plateau > 0, mean, np.nan), np.where(plateau > 0, sigma, np.nan))
+
+def getChi2(x, y, weight, p2, params):
+    """
+    Returns the chi2 of scurveModel() with respect to data y and weights
+    weight, params is a numpy array of shape (K, 3) ordered as FREE_PARAMS
+    """
+    resid = y - scurveModel(x, params[:,0], params[:,1], p2, params[:,2])
+    return np.sum(weight * resid * resid, axis=1)
+
+def fitScurves(x, y, nev, p0Limits, p1Limits, p0Guess, p1Guess, p2=None, maxIter=100, tolerance=1e-7, debug=False):
+    """
+    Fits a batch of S-curves with a damped Gauss-Newton (Levenberg-Marquardt)
+    minimization of the chi2 using the analytic Jacobian of scurveModel().  All
+    curves are advanced together; parameter limits are enforced by projecting
+    each step back inside the limits.
+
+    Points are weighted by 1/y as in a ROOT chi2 fit where the bin error was
+    set to sqrt(y); points with y == 0 are ignored.
+
+    Returns a dictionary of numpy arrays of shape (K,) with keys:
+
+        'p0', 'p1', 'p2', 'p3' - fitted parameters
+        'chi2'                 - chi2 of the fit
+        'ndf'                  - number of degrees of freedom
+        'valid'                - True if the minimization converged, i.e. a
+                                 step no longer changes chi2, to a finite chi2
+        'stalled'              - True if the minimization stopped because no
+                                 step could improve chi2 although it still
+                                 changes, such fits are not valid
+
+    x        - numpy array of shape (K, n) of charge values
+    y        - numpy array of shape (K, n) storing the number of hits
+    nev      - numpy array of shape (K,) storing the number of pulses per point
+    p0Limits - tuple of numpy arrays (low, high) each of shape (K,)
+    p1Limits - as p0Limits but for p1
+    p0Guess  - numpy array of shape (K,), initial value of p0
+    p1Guess  - as p0Guess but for p1
+    p2       - numpy array of shape (K,), value of the pedestal clamp p2; 0 if None
+    maxIter  - maximum number of iterations
+    tolerance - relative change in chi2 below which a curve is considered converged
+    debug    - prints the number of curves still being minimized at each iteration
+    """
+    nCurves = y.shape[0]
+    x = np.broadcast_to(x, y.shape).astype(float)
+    y = y.astype(float)
+    nev = np.asarray(nev, dtype=float)
+    weight = np.where(y > 0, 1. / np.where(y > 0, y, 1.), 0.)
+    nPoints = np.count_nonzero(weight, axis=1)
+
+    if p2 is None:
+        p2 = np.zeros(nCurves)
+
+    # Parameter limits, ordered as FREE_PARAMS
+    low = np.stack([ np.minimum(*p0Limits), np.minimum(*p1Limits), 0.75 * nev / 2. ], axis=1)
+    high = np.stack([ np.maximum(*p0Limits), np.maximum(*p1Limits), 1.25 * nev / 2. ], axis=1)
+    low[:,1] = np.maximum(low[:,1], 1e-6) # width must stay positive
+
+    theta = np.stack([ p0Guess, p1Guess, nev / 2. ], axis=1).astype(float)
+    theta = np.clip(np.nan_to_num(theta), low, high)
+
+    chi2 = getChi2(x, y, weight, p2, theta)
+    damping = 1e-3 * np.ones(nCurves)
+    converged = np.zeros(nCurves, dtype=bool)
+    stalled = np.zeros(nCurves, dtype=bool)
+    identity = np.eye(3)
+
+    for iteration in range(maxIter):
+        active = ~(converged | stalled)
+        if not np.any(active):
+            break
+        if debug:
+            print("fitScurves(): iteration {0}, {1} curves still being minimized".format(iteration, np.count_nonzero(active)))
+
+        xA = x[active]
+        yA = y[active]
+        wA = weight[active]
+        thetaA = theta[active]
+        modelA, jac = scurveJacobian(xA, thetaA[:,0], thetaA[:,1], p2[active], thetaA[:,2])
+
+        # Normal equations, damped along the diagonal
+        alpha = np.einsum('kni,kn,knj->kij', jac, wA, jac)
+        beta = np.einsum('kni,kn->ki', jac, wA * (yA - modelA))
+        diag = np.einsum('kii->ki', alpha)
+        diag = np.maximum(diag, 1e-12 * (np.max(diag, axis=1, keepdims=True) + 1.))
+        alphaDamped = alpha + damping[active][:,None,None] * diag[:,:,None] * identity
+        step = np.linalg.solve(alphaDamped, beta[...,None])[...,0]
+
+        thetaTry = np.clip(thetaA + step, low[active], high[active])
+        chi2Try = getChi2(xA, yA, wA, p2[active], thetaTry)
+        improved = np.isfinite(chi2Try) & (chi2Try <= chi2[active])
+
+        # Accept or reject the step for each curve
+        relChange = np.abs(chi2[active] - chi2Try) / np.maximum(chi2[active], 1e-12)
+        idxActive = np.flatnonzero(active)
+        theta[idxActive[improved]] = thetaTry[improved]
+        chi2[idxActive[improved]] = chi2Try[improved]
+        damping[idxActive] = np.where(improved, damping[active] * 0.1, damping[active] * 10.)
+        damping = np.clip(damping, 1e-12, 1e12)
+
+        # A curve has converged when a step, accepted or not, no longer changes
+        # chi2; it is stalled when the damping is at its maximum but steps
+        # still change chi2 without improving it
+        converged[idxActive] = relChange < tolerance
+        stalled[idxActive] = ~converged[idxActive] & (damping[idxActive] >= 1e12)
+        pass
+
+    ndf = nPoints - len(FREE_PARAMS)
+    valid = converged & np.all(np.isfinite(theta), axis=1) & np.isfinite(chi2) & (chi2 > 0.) & (ndf > 0)
+
+    return {
+            'p0':theta[:,0],
+            'p1':theta[:,1],
+            'p2':p2,
+            'p3':theta[:,2],
+            'chi2':chi2,
+            'ndf':ndf,
+            'valid':valid,
+            'stalled':stalled
+            }
@@ -39,7 +39,7 @@ class DeadChannelFinder(object):
             dead, ``False`` otherwise.
     """
     def __init__(self, nVFATS=24):
-        self.isDead = [ np.ones(128, dtype=bool) for i in range(nVFATS) ]
+        self.isDead = np.ones((nVFATS, 128), dtype=bool)
 
     def feed(self, event):
         """
@@ -55,12 +55,17 @@ class ScanDataFitter(DeadChannelFinder):
     This class is used in two steps:
 
     #. The data to fit is passed to the object using :py:meth:`feedHisto`,
-       :py:meth:`readFile` or repeated calls to :py:meth:`feed`.
+       :py:meth:`readFile`, :py:meth:`readFileColumnar`,
+       :py:meth:`feedArrays` or repeated calls to :py:meth:`feed`.
     #. The fit is performed by calling :py:meth:`fit`.
 
     One cannot count on all attributes being present before calling
     :py:meth:`fit`.
 
+    The data are stored in numpy arrays; the ``TH1D`` and ``TF1`` of a given
+    channel are only created when requested with :py:meth:`getHisto` and
+    :py:meth:`getFunc`.
+
     .. note::
 
         If the :py:attr:`calDAC2Q_m` and :py:attr:`calDAC2Q_b` were supplied at
@@ -69,28 +74,29 @@ class ScanDataFitter(DeadChannelFinder):
     See :program:`anaUltraScurve.py` for example usage.
 
     Attributes:
-        Nev (ndict): 2D array of ``int``, indexed as ``[vfat][channel]``.
+        Nev (numpy.ndarray): 2D array of ``float``, indexed as
+            ``[vfat][channel]``, storing the number of pulses sent to each
+            channel; ``0`` if the channel received no data.
+
+        nBins (int): Number of bins of the S-curve histograms
 
-        scanFuncs (ndict): 2D array of ``TF1``, indexed as ``[vfat][channel]``.
-            After fitting, each entry contains the fit function for the
-            corresponding channel. The functions are color-coded:
+        scanEdges (numpy.ndarray): 2D array of ``float``, indexed as
+            ``[vfat][bin]``, storing the low edges of the S-curve histogram
+            bins ``1`` to ``nBins+1`` (overflow) of each VFAT
 
-            ======= =====================================
-            Color   Meaning
-            ======= =====================================
-            Black   Default
-            Blue    Fit Converged
-            Gray    Dead channel or empty input histogram
-            Orange  Fit result is empty
-            ======= =====================================
+        scanHits (numpy.ndarray): 3D array of ``float``, indexed as
+            ``[vfat][channel][bin]``, that contain the S-curve results (number
+            of events vs charge). ``bin`` follows the ``TH1`` convention, ``0``
+            and ``nBins+1`` being the underflow and overflow bins; see
+            :py:meth:`getHisto`.
 
-        scanHistos (ndict): 2D array of ``TH1``, indexed as
-            ``[vfat][channel]``, that contain the S-curve results (number of
-            events vs charge)
+        scanFitParams (numpy.ndarray): 3D array of ``float``, indexed as
+            ``[vfat][channel][param]``, storing the four parameters of the
+            fit function of each channel; see :py:meth:`getFunc`.
 
-        scanCount (ndict): 2D array of ``int``, indexed as ``[vfat][channel]``.
-            Each entry contains the total number of events for the corresponding
-            channel.
+        scanCount (numpy.ndarray): 2D array of ``int``, indexed as
+            ``[vfat][channel]``. Each entry contains the total number of events
+            for the corresponding channel.
 
         scanFitResults (ndict): 3D array of ``float``, indexed as
             ``[idx][vfat][channel]``, that contain the fit results. ``idx`` has
@@ -128,6 +134,11 @@ class ScanDataFitter(DeadChannelFinder):
             zeros.
 
         isVFAT3 (bool): Whether the detector under consideration uses VFAT3
+
+        fitRestarts (list): 2D array of ``int``, indexed as
+            ``[vfat][channel]``. Each entry contains the number of additional
+            fits that were needed after the one started from the initial
+            guess, see :py:meth:`fit`.
     """
 
     from gempython.gemplotting.utils.anaInfo import maxChi2Default
@@ -139,15 +150,11 @@ class ScanDataFitter(DeadChannelFinder):
         from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
         r.gStyle.SetOptStat(0)
 
-        self.Nev = ndict()
-        self.scanFuncs  = ndict()
-        self.scanHistos = ndict()
-        self.scanHistosChargeBins = ndict()
-        self.scanCount  = ndict()
         self.scanFitResults   = ndict()
 
         self.isVFAT3    = isVFAT3
         self.nVFATS     = nVFATS
+        self.nBins      = 254
 
         self.maxChi2 = maxChi2
 
@@ -167,24 +174,19 @@ class ScanDataFitter(DeadChannelFinder):
             self.scanFitResults[4][vfat] = np.zeros(maxChans)
             self.scanFitResults[5][vfat] = np.zeros(maxChans)
             self.scanFitResults[6][vfat] = np.zeros(maxChans, dtype=bool)
-            for ch in range(0,maxChans):
-                self.scanCount[vfat][ch] = 0
-                if self.isVFAT3:
-                    self.scanFuncs[vfat][ch] = r.TF1('scurveFit_vfat{0}_chan{1}'.format(vfat,ch),'[3]*TMath::Erf((TMath::Max([2],x)-[0])/(TMath::Sqrt(2)*[1]))+[3]',
-                            self.calDAC2Q_m[vfat]*253+self.calDAC2Q_b[vfat],self.calDAC2Q_m[vfat]*1+self.calDAC2Q_b[vfat])
-                    self.scanHistos[vfat][ch] = r.TH1D('scurve_vfat{0}_chan{1}_h'.format(vfat,ch),'scurve_vfat{0}_chan{1}_h'.format(vfat,ch),
-                            254,self.calDAC2Q_m[vfat]*254.5+self.calDAC2Q_b[vfat],self.calDAC2Q_m[vfat]*0.5+self.calDAC2Q_b[vfat])
-                else:
-                    self.scanFuncs[vfat][ch] = r.TF1('scurveFit_vfat{0}_chan{1}'.format(vfat,ch),'[3]*TMath::Erf((TMath::Max([2],x)-[0])/(TMath::Sqrt(2)*[1]))+[3]',
-                            self.calDAC2Q_m[vfat]*1+self.calDAC2Q_b[vfat],self.calDAC2Q_m[vfat]*253+self.calDAC2Q_b[vfat])
-                    self.scanHistos[vfat][ch] = r.TH1D('scurve_vfat{0}_chan{1}_h'.format(vfat,ch),'scurve_vfat{0}_chan{1}_h'.format(vfat,ch),
-                            254,self.calDAC2Q_m[vfat]*0.5+self.calDAC2Q_b[vfat],self.calDAC2Q_m[vfat]*254.5+self.calDAC2Q_b[vfat])
-                    pass
-                self.scanHistosChargeBins[vfat][ch] = [self.scanHistos[vfat][ch].GetXaxis().GetBinLowEdge(binX) for binX in range(1,self.scanHistos[vfat][ch].GetNbinsX()+2) ] #Include overflow
-                pass
             pass
 
+        self.Nev = np.zeros((self.nVFATS, maxChans))
+        self.scanCount = np.zeros((self.nVFATS, maxChans), dtype=int)
+        self.scanHits = np.zeros((self.nVFATS, maxChans, self.nBins+2))
+        self.scanFitParams = np.zeros((self.nVFATS, maxChans, 4))
+
+        # Same low edges as TAxis::GetBinLowEdge() for bins 1 to nBins+1 (overflow)
+        from gempython.gemplotting.utils.binning import getUniformBinEdges
+        self.scanEdges = np.array([ getUniformBinEdges(self.nBins, *self.getHistoRange(vfat)) for vfat in range(0,self.nVFATS) ])
+
         self.fitValid = [ np.zeros(maxChans, dtype=bool) for vfat in range(self.nVFATS) ]
+        self.fitRestarts = [ np.zeros(maxChans, dtype=int) for vfat in range(self.nVFATS) ]
 
         return
 
@@ -209,19 +211,80 @@ class ScanDataFitter(DeadChannelFinder):
                 pass
             pass
 
-        from gempython.gemplotting.utils.anautilities import first_index_gt
-        from math import sqrt
-        chargeBin = first_index_gt(self.scanHistosChargeBins[event.vfatN][event.vfatCH], charge)-1
-        self.scanHistos[event.vfatN][event.vfatCH].SetBinContent(chargeBin,event.Nhits)
-        self.scanHistos[event.vfatN][event.vfatCH].SetBinError(chargeBin,sqrt(event.Nhits))
+        from gempython.gemplotting.utils.binning import findBin
+        chargeBin = findBin(self.scanEdges[event.vfatN], charge)
+        if chargeBin >= 0: # TH1::SetBinContent() ignores negative bins
+            self.scanHits[event.vfatN][event.vfatCH][chargeBin] = event.Nhits
         self.Nev[event.vfatN][event.vfatCH] = event.Nev
 
         return
 
+    def feedArrays(self, vfatN, vfatCH, vcal, Nhits, Nev, isCurrentPulse=None, calSF=None):
+        """
+        Vectorized version of :py:meth:`feed`: takes columns of the S-curve
+        tree, e.g. as returned by ``root_numpy.tree2array``, and updates the
+        results for all entries at once.
+
+        Args:
+            vfatN (numpy.ndarray): VFAT position of each entry
+            vfatCH (numpy.ndarray): VFAT channel of each entry
+            vcal (numpy.ndarray): ``CFG_CAL_DAC`` (``VCal`` for VFAT2) of each
+                entry
+            Nhits (numpy.ndarray): Number of hits of each entry
+            Nev (numpy.ndarray): Number of pulses of each entry
+            isCurrentPulse (numpy.ndarray): Whether each entry was taken in
+                current pulse mode, only used for VFAT3; ``None`` if the
+                branch is not present
+            calSF (numpy.ndarray): Current pulse scale factor of each entry,
+                see ``dict_calSF`` in
+                :py:mod:`gempython.gemplotting.utils.anaInfo`
+        """
+        vfatN = np.asarray(vfatN, dtype=int)
+        vfatCH = np.asarray(vfatCH, dtype=int)
+        vcal = np.asarray(vcal, dtype=float)
+        Nhits = np.asarray(Nhits)
+        if not (len(vfatN) > 0):
+            return
+
+        self.isDead[vfatN, vfatCH] = False
+
+        calDAC2Q_m = np.asarray(self.calDAC2Q_m, dtype=float)
+        calDAC2Q_b = np.asarray(self.calDAC2Q_b, dtype=float)
+        charge = calDAC2Q_m[vfatN]*vcal+calDAC2Q_b[vfatN]
+        if self.isVFAT3: #v3 electronics
+            isCounted = ((256-vcal) > 254)
+            if isCurrentPulse is not None:
+                #Q = CAL_DUR * CAL_DAC * 10nA * CAL_FS
+                isCurrentPulse = np.asarray(isCurrentPulse, dtype=bool)
+                calSFValue = np.array([ dict_calSF[sf] for sf in sorted(dict_calSF) ])[np.asarray(calSF, dtype=int)]
+                charge = np.where(isCurrentPulse, (1./ 40079000) * vcal * (10 * 1e-9) * calSFValue * 1e15, charge)
+                isCounted = np.where(isCurrentPulse, vcal > 254, isCounted)
+        else:
+            isCounted = (vcal > 250)
+            pass
+        np.add.at(self.scanCount, (vfatN[isCounted], vfatCH[isCounted]), Nhits[isCounted])
+
+        # Same bin as the findBin() lookup in feed()
+        from gempython.gemplotting.utils.binning import findBins
+        chargeBin = np.zeros(len(charge), dtype=int)
+        for vfat in np.unique(vfatN):
+            onVFAT = (vfatN == vfat)
+            chargeBin[onVFAT] = findBins(self.scanEdges[vfat], charge[onVFAT])
+            pass
+        inRange = (chargeBin >= 0) # TH1::SetBinContent() ignores negative bins
+        self.scanHits[vfatN[inRange], vfatCH[inRange], chargeBin[inRange]] = Nhits[inRange]
+        self.Nev[vfatN, vfatCH] = Nev
+
+        return
+
     def feedHisto(self, vfatN, vfatCH, histo, nEvts=None):
         """
         Feed the fitter with data stored in an histogram.
 
+        The histogram must have :py:attr:`nBins` bins, its contents are
+        copied into :py:attr:`scanHits` and interpreted with the binning of
+        the fitter.
+
         Args:
             vfatN (int): The VFAT under consideration
             vfatCH (int): The channel under consideration
@@ -229,31 +292,72 @@ class ScanDataFitter(DeadChannelFinder):
             nEvts (int): Override :py:attr`Nev` for the channel under
                 consideration (else the maximum value in the histogram is used)
         """
-        self.scanHistos[vfatN][vfatCH] = histo
+        if histo.GetNbinsX() != self.nBins:
+            raise ValueError("ScanDataFitter.feedHisto(): histogram {0} has {1} bins, expected {2}".format(histo.GetName(), histo.GetNbinsX(), self.nBins))
+
+        import root_numpy as rp
+        self.scanHits[vfatN][vfatCH] = rp.hist2array(histo, include_overflow=True)
         self.isDead[vfatN][vfatCH] = False
         if nEvts is None:
-            maxBin = self.scanHistos[vfatN][vfatCH].GetMaximumBin()
-            self.Nev[vfatN][vfatCH] = self.scanHistos[vfatN][vfatCH].GetBinContent(maxBin)
+            maxBin = histo.GetMaximumBin()
+            self.Nev[vfatN][vfatCH] = histo.GetBinContent(maxBin)
         else:
             self.Nev[vfatN][vfatCH] = nEvts
 
         return
 
-    def fit(self, debug=False):
+    def fit(self, debug=False, backend="root", nWorkers=1, vfatList=None, seed=None):
         """
         Iteratively fits all scurves, and populates the relevant class
         attributes.
 
+        Each channel is first fit starting from the mean and width estimated
+        by :py:func:`gempython.gemplotting.fitting.batchFit.getCrossingGuess`.
+        Only if this fit fails, or its :math:`\chi^2` is above
+        :py:attr:`maxChi2`, the fit is restarted from a scan of initial
+        values; the number of restarts is stored in :py:attr:`fitRestarts`.
+
+        Args:
+            debug (bool): Print additional information while fitting
+            backend (string): Fitting engine to use, one of ``fitBackends``
+                from :py:mod:`gempython.gemplotting.utils.anaInfo`. ``root``
+                fits each channel with ``TH1::Fit``; ``numpy`` fits all
+                channels of the detector at once, see :py:meth:`fitBatch`
+            nWorkers (int): Number of processes used to fit, if different
+                from one the VFATs are fit in parallel, see
+                :py:meth:`fitParallel`
+            vfatList (list): VFAT positions to fit, if ``None`` all VFATs are
+                fit
+            seed (int): Seed for the random initial values used when a fit
+                is restarted. Each channel uses its own seed derived from this
+                one, see :py:func:`getChannelSeed`, so that the results do not
+                depend on how the VFATs are split across processes. If
+                ``None`` a time based seed is used and results are not
+                reproducible.
+
         Returns: The filled :py:attr:`scanFitResults`
         """
 
+        from gempython.gemplotting.utils.anaInfo import fitBackends
+        if backend not in fitBackends:
+            raise ValueError("ScanDataFitter.fit(): backend '{0}' not understood, expected one of {1}".format(backend, fitBackends))
+        elif nWorkers != 1:
+            return self.fitParallel(debug=debug, backend=backend, nWorkers=nWorkers, vfatList=vfatList, seed=seed)
+        elif backend == "numpy":
+            return self.fitBatch(debug=debug, vfatList=vfatList)
+
         r.gROOT.SetBatch(True)
         r.gStyle.SetOptStat(0)
+        from gempython.gemplotting.fitting.batchFit import getCrossingGuess
         from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
 
         random = r.TRandom3()
         random.SetSeed(0)
         for vfat in range(0,self.nVFATS):
+            # If provided, skip all VFATs but the requested ones
+            if ((vfatList is not None) and (vfat not in vfatList)):
+                continue
+
             if self.isVFAT3:
                 fitTF1 = r.TF1('myERF','[3]*TMath::Erf((TMath::Max([2],x)-[0])/(TMath::Sqrt(2)*[1]))+[3]',
                             self.calDAC2Q_m[vfat]*253+self.calDAC2Q_b[vfat],self.calDAC2Q_m[vfat]*1+self.calDAC2Q_b[vfat])
@@ -269,16 +373,25 @@ class ScanDataFitter(DeadChannelFinder):
                 if debug:
                     print('fitting vfat {0} chan {1}'.format(vfat,ch))
 
+                if seed is not None:
+                    random.SetSeed(getChannelSeed(seed, vfat, ch))
+
                 if self.isDead[vfat][ch]:
                     fitTF1.SetLineColor(r.kGray)
                     continue # Don't try to fit dead channels
-                elif not (self.scanHistos[vfat][ch].Integral() > 0):
+                elif not (np.sum(self.scanHits[vfat][ch][1:-1]) > 0):
                     fitTF1.SetLineColor(r.kGray)
                     continue # Don't try to fit with 0 entries
 
                 fitChi2 = 0
                 MinChi2Temp = 99999999
                 stepN = 0
+                nFits = 0
+
+                # Initial guess from the data, the scan below is only used if this fails
+                guessP0, guessP1 = getCrossingGuess(self.getBinCenters(vfat)[None,:], self.scanHits[vfat][ch][None,1:-1])
+                scanHisto = self.getHisto(vfat, ch)
+                useGuess = np.isfinite(guessP0[0]) and np.isfinite(guessP1[0])
 
                 if debug:
                     print("| stepN | vfatN | vfatCH | isVFAT3 | p0_low | p0 | p0_high | p1_low | p1 | p1_high | p2_low | p2 | p2_high |")
@@ -288,15 +401,25 @@ class ScanDataFitter(DeadChannelFinder):
                     rand = abs(random.Gaus(10, 5)) # take positive definite numbers
 
                     # Make sure the input parameters are positive
-                    if rand > 100: continue
-                    if (self.calDAC2Q_m[vfat]*(8+stepN*8)+self.calDAC2Q_b[vfat]) < 0:
-                        stepN +=1
-                        continue
-                    #if (self.calDAC2Q_m[vfat]*(rand)+self.calDAC2Q_b[vfat]) < 0: continue
+                    if not useGuess:
+                        if rand > 100: continue
+                        if (self.calDAC2Q_m[vfat]*(8+stepN*8)+self.calDAC2Q_b[vfat]) < 0:
+                            stepN +=1
+                            continue
+                        #if (self.calDAC2Q_m[vfat]*(rand)+self.calDAC2Q_b[vfat]) < 0: continue
 
                     # Provide an initial guess
-                    init_guess_p0 = self.calDAC2Q_m[vfat]*(8+stepN*8)+self.calDAC2Q_b[vfat]
-                    init_guess_p1 = abs(self.calDAC2Q_m[vfat]*rand) #self.calDAC2Q_m[vfat] might be negative (e.g. VFAT3 case)
+                    if useGuess:
+                        # Keep the guess inside the parameter limits set below
+                        if self.isVFAT3:
+                            p0Range = sorted([self.calDAC2Q_m[vfat]*(256)+self.calDAC2Q_b[vfat], self.calDAC2Q_m[vfat]*(1)+self.calDAC2Q_b[vfat]])
+                        else:
+                            p0Range = sorted([-0.01, self.calDAC2Q_m[vfat]*(256)+self.calDAC2Q_b[vfat]])
+                        init_guess_p0 = min(max(guessP0[0], p0Range[0]), p0Range[1])
+                        init_guess_p1 = min(guessP1[0], abs(self.calDAC2Q_m[vfat]*(128)+self.calDAC2Q_b[vfat]))
+                    else:
+                        init_guess_p0 = self.calDAC2Q_m[vfat]*(8+stepN*8)+self.calDAC2Q_b[vfat]
+                        init_guess_p1 = abs(self.calDAC2Q_m[vfat]*rand) #self.calDAC2Q_m[vfat] might be negative (e.g. VFAT3 case)
                     init_guess_p2 = 0.
                     init_guess_p3 = self.Nev[vfat][ch]/2.
 
@@ -352,10 +475,13 @@ class ScanDataFitter(DeadChannelFinder):
                                         self.Nev[vfat][ch]
                                     ))
                     # Fit
-                    fitResult = self.scanHistos[vfat][ch].Fit('myERF','SQ')
+                    fitResult = scanHisto.Fit('myERF','SQ')
+                    nFits += 1
+                    fromGuess = useGuess
+                    useGuess = False
                     fitEmpty = fitResult.IsEmpty()
                     if fitEmpty:
-                        fitTF1.SetLineColor(kOrange-2)
+                        fitTF1.SetLineColor(r.kOrange-2)
                         # Don't try to fit empty data again
                         break
                     fitValid = fitResult.IsValid()
@@ -363,10 +489,10 @@ class ScanDataFitter(DeadChannelFinder):
                         continue
                     fitChi2 = fitTF1.GetChisquare()
                     fitNDF = fitTF1.GetNDF()
-                    stepN +=1
+                    if not fromGuess:
+                        stepN +=1
                     if (fitChi2 < MinChi2Temp and fitChi2 > 0.0):
-                        self.scanFuncs[vfat][ch] = fitTF1.Clone('scurveFit_vfat{0}_chan{1}_h'.format(vfat,ch))
-                        self.scanFuncs[vfat][ch].SetLineColor(r.kBlue-2)
+                        self.scanFitParams[vfat][ch] = [ fitTF1.GetParameter(idx) for idx in range(4) ]
                         self.scanFitResults[0][vfat][ch] = fitTF1.GetParameter(0)
                         self.scanFitResults[1][vfat][ch] = fitTF1.GetParameter(1)
                         self.scanFitResults[2][vfat][ch] = fitTF1.GetParameter(2)
@@ -379,11 +505,12 @@ class ScanDataFitter(DeadChannelFinder):
                         pass
                     if (MinChi2Temp < self.maxChi2): break
                     pass
+                self.fitRestarts[vfat][ch] = max(nFits - 1, 0)
                 if debug:
                     print("Converged fit results:")
-                    print("| stepN | vfatN | vfatCH | isVFAT3 | p0 | p1 | p2 | Chi2 | NDF | NormChi2 |")
-                    print("| :---: | :---: | :----: | :-----: | :-: | :-: | :-: | :--: | :-: | :------: |")
-                    print("| {0} | {1} | {2} | {3} | {4} | {5} | {6} | {7} | {8} | {9} |".format(
+                    print("| stepN | restarts | vfatN | vfatCH | isVFAT3 | p0 | p1 | p2 | Chi2 | NDF | NormChi2 |")
+                    print("| :---: | :------: | :---: | :----: | :-----: | :-: | :-: | :-: | :--: | :-: | :------: |")
+                    print("| {0} | {10} | {1} | {2} | {3} | {4} | {5} | {6} | {7} | {8} | {9} |".format(
                             stepN,
                             vfat,
                             ch,
@@ -393,15 +520,356 @@ class ScanDataFitter(DeadChannelFinder):
                             self.scanFitResults[2][vfat][ch],
                             self.scanFitResults[3][vfat][ch],
                             self.scanFitResults[5][vfat][ch],
-                            self.scanFitResults[3][vfat][ch] / self.scanFitResults[5][vfat][ch]))
+                            self.scanFitResults[3][vfat][ch] / self.scanFitResults[5][vfat][ch],
+                            self.fitRestarts[vfat][ch]))
                     pass
                 pass
             pass
+
+        self.printRestartSummary(vfatList)
         return self.scanFitResults
 
+    def fitBatch(self, debug=False, vfatList=None):
+        """
+        Fits all scurves of the detector as a single array computation using
+        :py:func:`gempython.gemplotting.fitting.batchFit.fitScurves` and
+        populates the same class attributes as :py:meth:`fit`.
+
+        The initial guess is taken from the crossings of the occupancy, the
+        parameter limits are the same as the ones used by the ``TF1`` fit and
+        the pedestal clamp (parameter 2) is held at zero.  As in :py:meth:`fit`
+        the channels whose fit is not valid or has a :math:`\chi^2` above
+        :py:attr:`maxChi2` are fit again from the same scan of initial values
+        of parameter 0, all together at each step, and the best valid fit is
+        kept; the number of restarts is stored in :py:attr:`fitRestarts`.
+
+        Args:
+            debug (bool): Print additional information while fitting
+            vfatList (list): VFAT positions to fit, if ``None`` all VFATs are
+                fit
+
+        Returns: The filled :py:attr:`scanFitResults`
+        """
+
+        from gempython.gemplotting.fitting.batchFit import fitScurves, getCrossingGuess
+        from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
+
+        # Gather the data of all channels, x is the bin center in charge units
+        hits = self.scanHits[:,:,1:-1].reshape(self.nVFATS*maxChans, self.nBins)
+        centers = np.repeat(np.array([ self.getBinCenters(vfat) for vfat in range(0,self.nVFATS) ]), maxChans, axis=0)
+        nev = self.Nev.reshape(self.nVFATS*maxChans)
+
+        # Don't try to fit dead channels or channels with 0 entries
+        toFit = np.logical_not(np.concatenate(self.isDead)) & (np.sum(hits, axis=1) > 0)
+        if vfatList is not None:
+            toFit &= np.repeat(np.in1d(np.arange(self.nVFATS), vfatList), maxChans)
+        idxFit = np.flatnonzero(toFit)
+        if not (len(idxFit) > 0):
+            return self.scanFitResults
+
+        # Parameter limits, same as in the TF1 fit
+        vfatOfCurve = idxFit // maxChans
+        calM = np.asarray(self.calDAC2Q_m, dtype=float)[vfatOfCurve]
+        calB = np.asarray(self.calDAC2Q_b, dtype=float)[vfatOfCurve]
+        if self.isVFAT3:
+            p0Limits = (calM*256+calB, calM*1+calB)
+        else:
+            p0Limits = (-0.01 * np.ones(len(idxFit)), calM*256+calB)
+        p1Limits = (np.zeros(len(idxFit)), calM*128+calB)
+
+        print("fitting {0} channels".format(len(idxFit)))
+        p0Guess, p1Guess = getCrossingGuess(centers[idxFit], hits[idxFit])
+        fitRes = fitScurves(
+                centers[idxFit],
+                hits[idxFit],
+                nev[idxFit],
+                p0Limits,
+                p1Limits,
+                p0Guess,
+                p1Guess,
+                debug=debug)
+
+        # Restart the failed fits, the width is started from the mean of the
+        # random values used by the TF1 fit
+        restarts = np.zeros(len(idxFit), dtype=int)
+        for stepN in range(0,30):
+            isFailed = ~(fitRes['valid'] & (fitRes['chi2'] < self.maxChi2))
+            if not np.any(isFailed):
+                break
+            p0Restart = calM*(8+stepN*8)+calB
+            idxRestart = np.flatnonzero(isFailed & (p0Restart >= 0))
+            if not (len(idxRestart) > 0):
+                continue
+            restartRes = fitScurves(
+                    centers[idxFit[idxRestart]],
+                    hits[idxFit[idxRestart]],
+                    nev[idxFit[idxRestart]],
+                    (p0Limits[0][idxRestart], p0Limits[1][idxRestart]),
+                    (p1Limits[0][idxRestart], p1Limits[1][idxRestart]),
+                    p0Restart[idxRestart],
+                    np.abs(calM[idxRestart]*10.),
+                    debug=debug)
+            restarts[idxRestart] += 1
+            isBetter = restartRes['valid'] & (~fitRes['valid'][idxRestart] | (restartRes['chi2'] < fitRes['chi2'][idxRestart]))
+            for key in fitRes:
+                fitRes[key][idxRestart[isBetter]] = restartRes[key][isBetter]
+                pass
+            pass
+
+        # Store the results of the converged fits
+        for idx, curve in enumerate(idxFit):
+            vfat = curve // maxChans
+            ch = curve % maxChans
+            self.fitRestarts[vfat][ch] = restarts[idx]
+            if not fitRes['valid'][idx]:
+                continue
+            self.scanFitParams[vfat][ch] = [ fitRes['p0'][idx], fitRes['p1'][idx], fitRes['p2'][idx], fitRes['p3'][idx] ]
+            self.scanFitResults[0][vfat][ch] = fitRes['p0'][idx]
+            self.scanFitResults[1][vfat][ch] = fitRes['p1'][idx]
+            self.scanFitResults[2][vfat][ch] = fitRes['p2'][idx]
+            self.scanFitResults[3][vfat][ch] = fitRes['chi2'][idx]
+            self.scanFitResults[4][vfat][ch] = self.scanCount[vfat][ch]
+            self.scanFitResults[5][vfat][ch] = fitRes['ndf'][idx]
+            self.scanFitResults[6][vfat][ch] = True
+            self.fitValid[vfat][ch] = True
+            pass
+
+        print("{0} of {1} fits converged".format(np.count_nonzero(fitRes['valid']), len(idxFit)))
+        self.printRestartSummary(vfatList)
+        return self.scanFitResults
+
+    def fitParallel(self, debug=False, backend="root", nWorkers=0, vfatList=None, seed=None):
+        """
+        Fits the scurves with a pool of processes, one task per VFAT. Each
+        task receives only the numpy arrays of its VFAT (hits, number of
+        events, calibration), see :py:func:`fitVFATs`, and returns the fit
+        results as arrays, see :py:meth:`getFitResultArrays`.  Results are
+        stored by VFAT position so they do not depend on the order in which
+        the tasks complete.
+
+        Daemonic processes, e.g. the workers of ``ana_scans.py``, cannot
+        start a pool; in that case the VFATs are fit in the current process.
+
+        Args:
+            debug (bool): Print additional information while fitting
+            backend (string): Fitting engine, see :py:meth:`fit`
+            nWorkers (int): Number of processes, if smaller than one all
+                available cores are used
+            vfatList (list): VFAT positions to fit, if ``None`` all VFATs are
+                fit
+            seed (int): Seed of the fit, see :py:meth:`fit`
+
+        Returns: The filled :py:attr:`scanFitResults`
+        """
+
+        import multiprocessing as mp
+        from gempython.utils.gemlogger import printYellow
+        if mp.current_process().daemon:
+            printYellow("ScanDataFitter.fitParallel(): daemonic processes are not allowed to have children, fitting in the current process")
+            return self.fit(debug=debug, backend=backend, nWorkers=1, vfatList=vfatList, seed=seed)
+
+        # Only VFATs with data are sent to the workers
+        listOfVFATs = [ vfat for vfat in range(0,self.nVFATS)
+                if (((vfatList is None) or (vfat in vfatList)) and not np.all(self.isDead[vfat])) ]
+        if not (len(listOfVFATs) > 0):
+            return self.scanFitResults
+        if nWorkers < 1:
+            nWorkers = mp.cpu_count()
+
+        from gempython.gemplotting.utils.anautilities import init_worker
+        from itertools import izip
+        pool = mp.Pool(min(nWorkers, len(listOfVFATs)), initializer=init_worker)
+        print("fitting {0} vfats with {1} processes".format(len(listOfVFATs), min(nWorkers, len(listOfVFATs))))
+        try:
+            # map_async().get() with a timeout, unlike map(), lets the main
+            # process receive a KeyboardInterrupt
+            listOfResults = pool.map_async(fitVFATsStar,
+                    [ ( [vfat],
+                        self.scanHits[[vfat]],
+                        self.Nev[[vfat]],
+                        self.scanCount[[vfat]],
+                        self.isDead[[vfat]],
+                        np.asarray(self.calDAC2Q_m, dtype=float),
+                        np.asarray(self.calDAC2Q_b, dtype=float),
+                        self.isVFAT3,
+                        self.maxChi2,
+                        backend,
+                        debug,
+                        seed ) for vfat in listOfVFATs ]
+                    ).get(7200) # wait at most 2 hours
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+            pool.join()
+
+        for vfat, fitResults in izip(listOfVFATs, listOfResults):
+            self.setFitResultArrays(fitResults, [vfat])
+            pass
+
+        self.printRestartSummary(vfatList)
+        return self.scanFitResults
+
+    def getCacheKey(self, backend="root", vfatList=None, seed=None):
+        """
+        Returns a key identifying the results of :py:meth:`fit` for the data
+        currently loaded: a digest of the hits, number of events, calibration,
+        fit options and of the source code of the fitting modules.
+
+        Args:
+            backend (string): Fitting engine, see :py:meth:`fit`
+            vfatList (list): VFAT positions to fit, see :py:meth:`fit`
+            seed (int): Seed of the fit, see :py:meth:`fit`
+        """
+
+        import sys
+        from gempython.gemplotting.fitting import batchFit
+        from gempython.gemplotting.utils.cacheutils import getDigest, getSourceVersion
+
+        return getDigest(
+                self.scanHits,
+                self.Nev,
+                self.scanCount,
+                self.isDead,
+                np.asarray(self.calDAC2Q_m, dtype=float),
+                np.asarray(self.calDAC2Q_b, dtype=float),
+                self.isVFAT3,
+                self.nBins,
+                self.maxChi2,
+                backend,
+                seed,
+                sorted(vfatList) if vfatList is not None else None,
+                getSourceVersion([sys.modules[__name__], batchFit]))
+
+    def getFitResultArrays(self, vfatList=None):
+        """
+        Returns the results of the fit as a dictionary of numpy arrays, indexed
+        by VFAT along their first axis, that can be passed between processes
+        or stored on disk:
+
+        =============== ================================================
+        Key             Content
+        =============== ================================================
+        scanFitResults  :py:attr:`scanFitResults`, shape ``(7,nVFAT,128)``
+        scanFitParams   :py:attr:`scanFitParams`
+        fitValid        :py:attr:`fitValid`
+        fitRestarts     :py:attr:`fitRestarts`
+        =============== ================================================
+
+        Args:
+            vfatList (list): VFAT positions to return, if ``None`` all VFATs
+                are returned
+        """
+
+        if vfatList is None:
+            vfatList = range(0,self.nVFATS)
+
+        return {
+                'scanFitResults':np.array([ [ self.scanFitResults[idx][vfat] for vfat in vfatList ] for idx in range(7) ], dtype=float),
+                'scanFitParams':self.scanFitParams[vfatList],
+                'fitValid':np.array(self.fitValid)[vfatList],
+                'fitRestarts':np.array(self.fitRestarts)[vfatList]
+                }
+
+    def setFitResultArrays(self, fitResults, vfatList=None):
+        """
+        Stores fit results produced by :py:meth:`getFitResultArrays`
+
+        Args:
+            fitResults (dict): Output of :py:meth:`getFitResultArrays`
+            vfatList (list): VFAT positions, in the order of the first axis of
+                the arrays of fitResults; if ``None`` all VFATs
+        """
+
+        if vfatList is None:
+            vfatList = range(0,self.nVFATS)
+
+        for idx, vfat in enumerate(vfatList):
+            for resIdx in range(7):
+                self.scanFitResults[resIdx][vfat] = fitResults['scanFitResults'][resIdx][idx].astype(bool if resIdx == 6 else float)
+                pass
+            self.scanFitParams[vfat] = fitResults['scanFitParams'][idx]
+            self.fitValid[vfat] = fitResults['fitValid'][idx].astype(bool)
+            self.fitRestarts[vfat] = fitResults['fitRestarts'][idx].astype(int)
+            pass
+        return
+
+    def printRestartSummary(self, vfatList=None):
+        """
+        Prints how many of the fitted channels needed to restart the fit after
+        the one started from the initial guess, see :py:attr:`fitRestarts`.
+        Only the channels that were fit are counted, i.e. not the dead ones nor
+        the ones without hits.
+
+        Args:
+            vfatList (list): VFAT positions that were fit, if ``None`` all
+                VFATs
+        """
+
+        restarts = np.array(self.fitRestarts)
+        fitted = np.logical_not(np.array(self.isDead)) & (np.sum(self.scanHits[:,:,1:-1], axis=2) > 0)
+        if vfatList is not None:
+            fitted &= np.in1d(np.arange(self.nVFATS), vfatList)[:,None]
+        nFitted = np.count_nonzero(fitted)
+        nRestarted = np.count_nonzero(restarts[fitted] > 0)
+        print("{0} of {1} fitted channels needed a restart, {2} restarts in total (max {3} for a single channel)".format(
+            nRestarted,
+            nFitted,
+            np.sum(restarts[fitted]),
+            np.max(restarts[fitted]) if nFitted > 0 else 0))
+        return
+
+    def evalFuncs(self, x):
+        """
+        Evaluates the fit functions of all channels at x without creating any
+        ``TF1``. Returns a numpy array of shape ``(nVFATS, 128)``; as for
+        ``TF1::Eval()`` channels that were not fit give ``nan``.
+
+        Args:
+            x (float): Point, in charge units, at which to evaluate
+        """
+        from gempython.gemplotting.fitting.batchFit import scurveModel
+
+        params = self.scanFitParams.reshape(-1,4)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = scurveModel(x * np.ones((len(params),1)), params[:,0], params[:,1], params[:,2], params[:,3])
+        return values.reshape(self.scanFitParams.shape[:2])
+
+    def getBinCenters(self, vfat):
+        """Returns a numpy array with the centers of the S-curve histogram bins of the given VFAT"""
+        edges = self.scanEdges[vfat]
+        return 0.5 * (edges[1:] + edges[:-1])
+
     def getFunc(self, vfat, ch):
-        """Returns the fit function for the given VFAT and channel"""
-        return self.scanFuncs[vfat][ch]
+        """
+        Returns a new ``TF1`` holding the fit function for the given VFAT and
+        channel, see :py:func:`makeScurveFunc`.
+        """
+        low, high = self.getFuncRange(vfat)
+        return makeScurveFunc('scurveFit_vfat{0}_chan{1}'.format(vfat,ch), self.scanFitParams[vfat][ch], low, high, self.fitValid[vfat][ch])
+
+    def getFuncRange(self, vfat):
+        """Returns a tuple (low, high) with the range, in charge units, of the fit functions of the given VFAT"""
+        if self.isVFAT3:
+            return (self.calDAC2Q_m[vfat]*253+self.calDAC2Q_b[vfat], self.calDAC2Q_m[vfat]*1+self.calDAC2Q_b[vfat])
+        else:
+            return (self.calDAC2Q_m[vfat]*1+self.calDAC2Q_b[vfat], self.calDAC2Q_m[vfat]*253+self.calDAC2Q_b[vfat])
+
+    def getHisto(self, vfat, ch):
+        """
+        Returns a new ``TH1D`` filled with the S-curve data of the given VFAT
+        and channel, see :py:func:`makeScurveHisto`.
+        """
+        low, high = self.getHistoRange(vfat)
+        return makeScurveHisto('scurve_vfat{0}_chan{1}_h'.format(vfat,ch), self.scanHits[vfat][ch], low, high)
+
+    def getHistoRange(self, vfat):
+        """Returns a tuple (low, high) with the axis range, in charge units, of the S-curve histograms of the given VFAT"""
+        if self.isVFAT3:
+            return (self.calDAC2Q_m[vfat]*254.5+self.calDAC2Q_b[vfat], self.calDAC2Q_m[vfat]*0.5+self.calDAC2Q_b[vfat])
+        else:
+            return (self.calDAC2Q_m[vfat]*0.5+self.calDAC2Q_b[vfat], self.calDAC2Q_m[vfat]*254.5+self.calDAC2Q_b[vfat])
 
     def readFile(self, treeFileName):
         """
@@ -413,7 +881,159 @@ class ScanDataFitter(DeadChannelFinder):
             self.feed(event)
         return
 
-def fitScanData(treeFileName, isVFAT3=False, calFileName=None, calTuple=None, gemType="ge11"):
+    def readFileColumnar(self, treeFileName, vfatList=None, chunkSize=500000):
+        """
+        Same as :py:meth:`readFile` but reads the ``scurveTree`` in chunks of
+        columns with ``root_numpy`` instead of entry by entry, see
+        :py:meth:`feedTree`.
+        """
+        inF = r.TFile(treeFileName)
+        self.feedTree(inF.scurveTree, vfatList=vfatList, chunkSize=chunkSize)
+        inF.Close()
+        return
+
+    def feedTree(self, scurveTree, vfatList=None, chunkSize=500000):
+        """
+        Reads the branches needed for the fit from an S-curve ``TTree`` with
+        ``root_numpy.tree2array``, chunkSize entries at a time, and passes them
+        to :py:meth:`feedArrays`.
+
+        Args:
+            scurveTree (TTree): The ``scurveTree`` produced by ``ultraScurve.py``
+            vfatList (list): VFAT positions to consider, if ``None`` all VFATs
+                are used
+            chunkSize (int): Maximum number of entries held in memory at once
+        """
+        import root_numpy as rp
+
+        listOfBranches = scurveTree.GetListOfBranches()
+        branches = [ 'vfatN', 'vfatCH', 'vcal', 'Nhits', 'Nev' ]
+        hasCurrentPulse = (self.isVFAT3 and ('isCurrentPulse' in listOfBranches))
+        if hasCurrentPulse:
+            branches += [ 'isCurrentPulse', 'calSF' ]
+
+        for start in range(0, scurveTree.GetEntries(), chunkSize):
+            scanData = rp.tree2array(scurveTree, branches=branches, start=start, stop=start+chunkSize)
+            if vfatList is not None:
+                scanData = scanData[np.in1d(scanData['vfatN'], vfatList)]
+            self.feedArrays(
+                    vfatN=scanData['vfatN'],
+                    vfatCH=scanData['vfatCH'],
+                    vcal=scanData['vcal'],
+                    Nhits=scanData['Nhits'],
+                    Nev=scanData['Nev'],
+                    isCurrentPulse=scanData['isCurrentPulse'] if hasCurrentPulse else None,
+                    calSF=scanData['calSF'] if hasCurrentPulse else None)
+            pass
+        return
+
+def makeScurveFunc(name, params, low, high, isValid=True):
+    """
+    Returns a new ``TF1`` of the S-curve model. Converged fits are drawn in
+    blue, other channels in black.
+
+    Args:
+        name (str): Name of the ``TF1``
+        params (list): The four parameters of the model
+        low (float): Low edge of the range of the function, in charge units
+        high (float): High edge of the range of the function
+        isValid (bool): Whether the fit converged
+    """
+    func = r.TF1(name,'[3]*TMath::Erf((TMath::Max([2],x)-[0])/(TMath::Sqrt(2)*[1]))+[3]',low,high)
+    for idx in range(4):
+        func.SetParameter(idx, params[idx])
+        pass
+    if isValid:
+        func.SetLineColor(r.kBlue-2)
+    else:
+        func.SetLineColor(r.kBlack)
+    return func
+
+def makeScurveHisto(name, hits, low, high):
+    """
+    Returns a new ``TH1D`` with ``len(hits)-2`` bins between low and high
+    whose contents, including the underflow and overflow bins, are hits. The
+    error of each bin is the square root of its content and the histogram is
+    not attached to any ``TDirectory``.
+
+    Args:
+        name (str): Name and title of the ``TH1D``
+        hits (numpy.ndarray): Number of hits in each bin, indexed by ``TH1`` bin
+        low (float): Low edge of the axis, in charge units
+        high (float): High edge of the axis
+    """
+    import root_numpy as rp
+
+    hits = np.asarray(hits, dtype=float)
+    histo = r.TH1D(name,name,len(hits)-2,low,high)
+    histo.SetDirectory(0)
+    rp.array2hist(hits, histo, errors=np.sqrt(hits))
+    return histo
+
+def getChannelSeed(seed, vfat, ch):
+    """
+    Returns the seed used for the fit of a given channel, derived from seed
+    with a hash so that neighbouring channels get unrelated sequences. The
+    result is in [1, 2^32-1] since a seed of 0 makes ``TRandom3`` use the time.
+
+    Args:
+        seed (int): Seed of the fit, see :py:meth:`ScanDataFitter.fit`
+        vfat (int): VFAT position
+        ch (int): VFAT channel
+    """
+    import hashlib
+    digest = hashlib.sha1("{0}:{1}:{2}".format(seed, vfat, ch)).hexdigest()
+    return int(digest[:8], 16) % 4294967295 + 1
+
+def fitVFATs(vfatList, scanHits, Nev, scanCount, isDead, calDAC2Q_m, calDAC2Q_b, isVFAT3, maxChi2, backend="root", debug=False, seed=None):
+    """
+    Fits the scurves of the VFATs in vfatList with a :py:class:`ScanDataFitter`
+    built from numpy arrays, this is the task run by the workers of
+    :py:meth:`ScanDataFitter.fitParallel`.
+
+    Returns the fit results of the VFATs in vfatList, see
+    :py:meth:`ScanDataFitter.getFitResultArrays`
+
+    Args:
+        vfatList (list): VFAT positions to fit
+        scanHits (numpy.ndarray): :py:attr:`ScanDataFitter.scanHits` of the
+            VFATs in vfatList
+        Nev (numpy.ndarray): As scanHits but for :py:attr:`ScanDataFitter.Nev`
+        scanCount (numpy.ndarray): As scanHits but for
+            :py:attr:`ScanDataFitter.scanCount`
+        isDead (numpy.ndarray): As scanHits but for
+            :py:attr:`DeadChannelFinder.isDead`
+        calDAC2Q_m (numpy.ndarray): Calibration slope of all VFATs
+        calDAC2Q_b (numpy.ndarray): Calibration intercept of all VFATs
+        isVFAT3 (bool): Whether the detector uses VFAT3
+        maxChi2 (float): Max acceptable chi2
+        backend (string): Fitting engine, see :py:meth:`ScanDataFitter.fit`
+        debug (bool): Print additional information while fitting
+        seed (int): Seed of the fit, see :py:meth:`ScanDataFitter.fit`
+    """
+    fitter = ScanDataFitter(
+            calDAC2Q_m=calDAC2Q_m,
+            calDAC2Q_b=calDAC2Q_b,
+            isVFAT3=isVFAT3,
+            nVFATS=len(calDAC2Q_m),
+            maxChi2=maxChi2
+            )
+    fitter.scanHits[vfatList] = scanHits
+    fitter.Nev[vfatList] = Nev
+    fitter.scanCount[vfatList] = scanCount
+    fitter.isDead[vfatList] = isDead
+    fitter.fit(debug=debug, backend=backend, vfatList=vfatList, seed=seed)
+
+    return fitter.getFitResultArrays(vfatList)
+
+def fitVFATsStar(inputs):
+    """
+    Wrapper of :py:func:`fitVFATs` that takes its arguments as a tuple, for
+    use with ``multiprocessing.Pool.map``
+    """
+    return fitVFATs(*inputs)
+
+def fitScanData(treeFileName, isVFAT3=False, calFileName=None, calTuple=None, gemType="ge11", fitBackend="root", nWorkers=1, seed=None):
     """
     Helper function to fit scan data. Creates a :py:class:`ScanDataFitter`,
     loads the data and returns the results of :py:meth:`ScanDataFitter.fit`.
@@ -423,6 +1043,13 @@ def fitScanData(treeFileName, isVFAT3=False, calFileName=None, calTuple=None, ge
         isVFAT3 (bool): Whether the detector uses VFAT3
         calFileName (string): Path to the file that contains calibration data
         calTuple (tuple): Tuple of numpy arrays providing CAL_DAC calibration, idx = 0 (1) for slope (intercept); indexed by VFAT position
+        gemType (string): Type of detector, see ``vfatsPerGemVariant`` from
+            ``gempython.tools.hw_constants``
+        fitBackend (string): Fitting engine, see :py:meth:`ScanDataFitter.fit`
+        nWorkers (int): Number of processes used to fit, see
+            :py:meth:`ScanDataFitter.fit`
+        seed (int): Seed of the fit, if provided the results are
+            reproducible; see :py:meth:`ScanDataFitter.fit`
 
     .. seealso::
 
@@ -454,7 +1081,7 @@ def fitScanData(treeFileName, isVFAT3=False, calFileName=None, calTuple=None, ge
         pass
 
     # Read the output data
-    fitter.readFile(treeFileName)
+    fitter.readFileColumnar(treeFileName)
 
     # Fit
-    return fitter.fit()
+    return fitter.fit(backend=fitBackend, nWorkers=nWorkers, seed=seed)
@@ -286,10 +286,10 @@ def arbitraryPlotter(anaType, listDataPtTuples, rootFileName, treeName, branchNa
     """
 
     from gempython.gemplotting.utils.anautilities import filePathExists, getDirByAnaType
+    from gempython.gemplotting.utils.scanresults import readScanResults
 
     import numpy as np
     import os
-    import root_numpy as rp
 
     # Make branches to load
     listNames = ["vfatN"]
@@ -320,12 +320,10 @@ def arbitraryPlotter(anaType, listDataPtTuples, rootFileName, treeName, branchNa
                 pass
         filename = "{0}/{1}/{2}".format(dirPath, scandate, rootFileName)
 
-        # Get TTree
+        # Get the data, from the columnar copy of the TTree if it is available
         try:
-            dataFile = r.TFile(filename, "READ")
-            dataTree = dataFile.Get(treeName)
-            knownBranches = dataTree.GetListOfBranches()
-        except AttributeError as e:
+            arrayVFATData = readScanResults(filename, treeName, listNames)
+        except IOError as e:
             print('{0} may not exist in {1}'.format(treeName,filename))
             print(e)
             if skipBad:
@@ -336,24 +334,15 @@ def arbitraryPlotter(anaType, listDataPtTuples, rootFileName, treeName, branchNa
                 exit(os.EX_DATAERR)
                 pass
             pass
-
-        # Check to make sure listNames are present in dataTree
-        for testBranch in listNames:
-            if testBranch not in knownBranches:
-                print("Branch {0} not in TTree {1} of file {2}".format(branchName, treeName, filename))
-                print("Existing Branches are:")
-                for realBranch in knownBranches:
-                    print(realBranch)
-                print("Please try again using one of the existing branches")
-                exit(os.EX_DATAERR)
+        except ValueError as e:
+            print("Branch {0} not in TTree {1} of file {2}".format(branchName, treeName, filename))
+            print(e)
+            print("Please try again using one of the existing branches")
+            exit(os.EX_DATAERR)
 
         # Get dependent variable value
-        arrayVFATData = rp.tree2array(dataTree,listNames)
         dataThisVFAT = arrayVFATData[ arrayVFATData['vfatN'] == vfat] #VFAT Level
 
-        # Close the TFile
-        dataFile.Close()
-        
         if vfatCH is not None and strip is None:
             dataThisVFAT = dataThisVFAT[ dataThisVFAT['vfatCH'] == vfatCH ] #VFAT Channel Level
         elif strip is not None and vfatCH is None:
@@ -398,10 +387,10 @@ def arbitraryPlotter2D(anaType, listDataPtTuples, rootFileName, treeName, branch
     """
   
     from gempython.gemplotting.utils.anautilities import filePathExists, getDirByAnaType
+    from gempython.gemplotting.utils.scanresults import readScanResults
 
     import numpy as np
     import os
-    import root_numpy as rp
 
     # Make branches to load
     listNames = ["vfatN"]
@@ -435,12 +424,10 @@ def arbitraryPlotter2D(anaType, listDataPtTuples, rootFileName, treeName, branch
                 pass
         filename = "{0}/{1}/{2}".format(dirPath, scandate, rootFileName)
 
-        # Get TTree
+        # Get the data, from the columnar copy of the TTree if it is available
         try:
-            dataFile = r.TFile(filename, "READ")
-            dataTree = dataFile.Get(treeName)
-            knownBranches = dataTree.GetListOfBranches()
-        except AttributeError as e:
+            arrayVFATData = readScanResults(filename, treeName, listNames)
+        except IOError as e:
             print('{0} may not exist in {1}'.format(treeName,filename))
             print(e)
             if skipBad:
@@ -451,24 +438,15 @@ def arbitraryPlotter2D(anaType, listDataPtTuples, rootFileName, treeName, branch
                 exit(os.EX_DATAERR)
                 pass
             pass
-
-        # Check to make sure listNames are present in dataTree
-        for testBranch in listNames:
-            if testBranch not in knownBranches:
-                print("Branch {0} not in TTree {1} of file {2}".format(branchName, treeName, filename))
-                print("Existing Branches are:")
-                for realBranch in knownBranches:
-                    print(realBranch)
-                print("Please try again using one of the existing branches")
-                exit(os.EX_DATAERR)
+        except ValueError as e:
+            print("Branch {0} not in TTree {1} of file {2}".format(branchName, treeName, filename))
+            print(e)
+            print("Please try again using one of the existing branches")
+            exit(os.EX_DATAERR)
 
         # Get dependent variable value - VFAT Level
-        arrayVFATData = rp.tree2array(dataTree,listNames)
         dataThisVFAT = arrayVFATData[ arrayVFATData['vfatN'] == vfat] #VFAT Level
 
-        # Close the TFile
-        dataFile.Close()
-
         # Get the data for each strip and store it as a tuple in the list to be returned
         for chan in range(0,128):
             dataThisChan = dataThisVFAT[ dataThisVFAT[strChanName] == chan] #Channel Level
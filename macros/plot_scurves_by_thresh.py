@@ -28,10 +28,12 @@ if __name__ == '__main__':
     canvas = r.TCanvas('canvas', 'canvas', 500, 500)
     canvas.cd()
     i = 0
+    from gempython.gemplotting.utils.scurveAlgos import getScurveFitHistoTree, getScurveHistoAndFit
+    from itertools import izip
     for thresh in thr:
-        for event in fitF.scurveFitTree:
+        for event, curves in izip(fitF.scurveFitTree, getScurveFitHistoTree(fitF)):
             if (event.vthr == thresh) and (event.vfatN == vfat) and (event.ROBstr == strip):
-                Scurves.append((event.scurve_h).Clone())
+                Scurves.append(getScurveHistoAndFit(curves)[0])
                 pass
             pass
         pass
@@ -32,10 +32,11 @@ def overlay_scurve(vfat, vfatCH, fit_filename=None, tupleTObjects=None, vfatChNo
     if fit_filename is not None:
         r.TH1.AddDirectory(False)
         fitFile   = r.TFile(fit_filename)
-        for event in fitFile.scurveFitTree:
+        from gempython.gemplotting.utils.scurveAlgos import getScurveFitHistoTree, getScurveHistoAndFit
+        from itertools import izip
+        for event, curves in izip(fitFile.scurveFitTree, getScurveFitHistoTree(fitFile)):
             if (event.vfatN == vfat) and ((event.vfatCH == vfatCH and vfatChNotROBstr) or (event.ROBstr == vfatCH and not vfatChNotROBstr)):
-                scurveHisto = event.scurve_h.Clone()
-                scurveFit = event.scurve_fit.Clone()
+                scurveHisto, scurveFit = getScurveHistoAndFit(curves)
                 pass
             pass
     elif tupleTObjects is not None:
@@ -119,9 +120,11 @@ def plot_vfat_summary(vfat, fit_filename, vfatChNotROBstr=True):
         vSum = Tr.H2D('vSum', 'vSum for VFAT %i; Strips; VCal [DAC units]'%vfat, 128, -0.5, 127.5, 256, -0.5, 255.5)
         pass
     vSum.GetYaxis().SetTitleOffset(1.5)
-    for event in fitF.scurveFitTree:
+    from gempython.gemplotting.utils.scurveAlgos import getScurveFitHistoTree, getScurveHistoAndFit
+    from itertools import izip
+    for event, curves in izip(fitF.scurveFitTree, getScurveFitHistoTree(fitF)):
         if (event.vfatN == vfat):
-            Scurve = ((event.scurve_h).Clone())
+            Scurve = getScurveHistoAndFit(curves)[0]
             for valX in range(0, 256):
                 valY = Scurve.FindBin(valX)
                 if vfatChNotROBstr:
@@ -0,0 +1,213 @@
+r"""
+``channelMapLUT`` --- Look up tables between channels, strips and pins
+======================================================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.mapping.channelMapLUT
+
+The mapping between the ASIC channels of each VFAT, the readout strips and the
+pins of the Panasonic connector is held by a :py:class:`ChannelMap` as
+``(nVFATs, 128)`` numpy ``int16`` arrays indexed as ``[vfatN][vfatCH]``,
+together with the inverse maps from strip and pin to channel.  Lookups of many
+channels at once are done with :py:meth:`ChannelMap.map`.
+
+Mapping files, see ``anautilities.getMapping()`` for their format, are parsed
+with :py:meth:`ChannelMap.fromFile` which keeps a binary copy of the tables in
+the cache directory ``channelMaps``, keyed on the content of the file.
+
+Documentation
+-------------
+"""
+
+import numpy as np
+
+#: Maximum size in MB of the on-disk cache of parsed mapping files
+channelMapCacheSizeMB = 10
+
+class ChannelMap(object):
+    """
+    Look up table between the ASIC channels, the readout strips and the
+    Panasonic connector pins of the VFATs of a detector.
+
+    The tables are the attributes strip, panPin and vfatCH, numpy int16
+    arrays of shape (nVFATs, 128) indexed by [vfatN][vfatCH], and their
+    inverses chanOfStrip and chanOfPanPin indexed by [vfatN][strip] and
+    [vfatN][panPin] (-1 for a strip or pin without channel).
+
+    For compatibility with the nested dictionary formerly returned by
+    anautilities.getMapping(), channelMap[vfatN][name][vfatCH] gives the
+    value of mappingNames name (see anaInfo.py) for this channel, as a python
+    int, and iterating over a ChannelMap gives the VFAT positions.
+    """
+
+    def __init__(self, strip, panPin, vfatCH=None):
+        """
+        strip  - array of shape (nVFATs, 128) giving the strip of each channel
+        panPin - array of shape (nVFATs, 128) giving the Panasonic pin of each channel
+        vfatCH - array of shape (nVFATs, 128) giving the channel number, if None
+                 the channel numbers are 0 to 127
+        """
+
+        self.strip = np.asarray(strip, dtype=np.int16)
+        self.panPin = np.asarray(panPin, dtype=np.int16)
+        if vfatCH is None:
+            vfatCH = np.tile(np.arange(self.strip.shape[1]), (len(self.strip), 1))
+        self.vfatCH = np.asarray(vfatCH, dtype=np.int16)
+
+        self.chanOfStrip = self.invert(self.strip)
+        self.chanOfPanPin = self.invert(self.panPin)
+        self.listOfRows = None
+
+    @staticmethod
+    def invert(table):
+        """
+        Returns the inverse of table, an array of shape (nVFATs, 128) holding
+        per VFAT a permutation of 0 to 127: inverse[vfatN][table[vfatN][chan]] == chan.
+        Entries of the inverse that do not appear in table are -1.
+
+        table - array of shape (nVFATs, 128)
+        """
+
+        inverse = -np.ones(table.shape, dtype=np.int16)
+        vfatN = np.repeat(np.arange(table.shape[0]), table.shape[1])
+        inChannels = np.tile(np.arange(table.shape[1]), table.shape[0])
+        valid = (table.ravel() >= 0) & (table.ravel() < table.shape[1])
+        inverse[vfatN[valid], table.ravel()[valid]] = inChannels[valid]
+
+        return inverse
+
+    @classmethod
+    def fromFile(cls, mappingFileName, isVFAT2=True, useCache=True):
+        """
+        Returns the ChannelMap described by the mapping file mappingFileName.
+        The parsed tables are stored in the cache directory "channelMaps",
+        see cacheutils.getCacheDir(), under a digest of the content of the
+        file, so a file is only parsed again when it changes.
+
+        mappingFileName - physical filename of file which contains the mapping
+                          information, see anautilities.getMapping()
+        isVFAT2         - if True the ASIC channels of the file are numbered
+                          from 1 instead of 0
+        useCache        - if False the on-disk cache is neither read nor written
+        """
+
+        from gempython.gemplotting.utils.cacheutils import getCacheDir, getDigest, loadFromCache, storeInCache
+
+        with open(mappingFileName, "rb") as mappingFile:
+            content = mappingFile.read()
+
+        key = getDigest("ChannelMap", content, isVFAT2)
+        arrays = None
+        if useCache:
+            try:
+                arrays = loadFromCache(getCacheDir("channelMaps"), key)
+            except OSError:
+                pass
+            pass
+
+        if arrays is None:
+            # columns: vfat, strip, channel, PanPin; the first line is the header
+            mapData = np.loadtxt(mappingFileName, dtype=int, skiprows=1, ndmin=2)
+            vfatN = mapData[:,0]
+            vfatCH = mapData[:,2] - 1 if isVFAT2 else mapData[:,2] #EDMS document numbers VFAT3 channels from [0,127]
+
+            arrays = {
+                    "strip":np.zeros((vfatN.max()+1, 128), dtype=np.int16),
+                    "panPin":np.zeros((vfatN.max()+1, 128), dtype=np.int16),
+                    "vfatCH":np.zeros((vfatN.max()+1, 128), dtype=np.int16)
+                    }
+            arrays["strip"][vfatN, vfatCH] = mapData[:,1]
+            arrays["panPin"][vfatN, vfatCH] = mapData[:,3]
+            arrays["vfatCH"][vfatN, vfatCH] = vfatCH
+            if useCache:
+                try:
+                    storeInCache(getCacheDir("channelMaps"), key, arrays, channelMapCacheSizeMB)
+                except (IOError, OSError): # e.g. read-only home directory
+                    pass
+                pass
+            pass
+
+        return cls(arrays["strip"], arrays["panPin"], arrays["vfatCH"])
+
+    def getArray(self, name):
+        """
+        Returns the table of mappingNames name (see anaInfo.py), i.e. one of
+        "Strip", "PanPin" or "vfatCH"
+
+        name - name of the table
+        """
+
+        if name == "Strip":
+            return self.strip
+        elif name == "PanPin":
+            return self.panPin
+        elif name == "vfatCH":
+            return self.vfatCH
+
+        raise LookupError("ChannelMap.getArray() - unknown table '{0}'".format(name))
+
+    def map(self, vfatN, vfatCH, name="Strip"):
+        """
+        Returns the value of the table name, see getArray(), for each
+        (vfatN, vfatCH) pair; the inputs may be numpy arrays of any shape
+
+        vfatN  - VFAT position(s)
+        vfatCH - ASIC channel(s)
+        name   - name of the table
+        """
+
+        return self.getArray(name)[vfatN, vfatCH]
+
+    def stripToChannel(self, vfatN, strip):
+        """
+        Returns the ASIC channel(s) of the strip(s), -1 if not connected
+
+        vfatN - VFAT position(s)
+        strip - strip number(s)
+        """
+
+        return self.chanOfStrip[vfatN, strip]
+
+    def panPinToChannel(self, vfatN, panPin):
+        """
+        Returns the ASIC channel(s) of the Panasonic pin(s), -1 if not connected
+
+        vfatN  - VFAT position(s)
+        panPin - Panasonic pin number(s)
+        """
+
+        return self.chanOfPanPin[vfatN, panPin]
+
+    def resize(self, nVFATs):
+        """
+        Returns a ChannelMap holding the first nVFATs VFATs of this one; if it
+        has fewer the missing VFATs are mapped to 0
+
+        nVFATs - number of VFATs
+        """
+
+        if nVFATs == len(self.strip):
+            return self
+
+        def resized(table):
+            newTable = np.zeros((nVFATs, table.shape[1]), dtype=np.int16)
+            nCopied = min(nVFATs, len(table))
+            newTable[:nCopied] = table[:nCopied]
+            return newTable
+
+        return ChannelMap(resized(self.strip), resized(self.panPin), resized(self.vfatCH))
+
+    def __len__(self):
+        return len(self.strip)
+
+    def __iter__(self):
+        return iter(range(len(self.strip)))
+
+    def __getitem__(self, vfatN):
+        if self.listOfRows is None:
+            self.listOfRows = [ { "Strip":strip, "PanPin":panPin, "vfatCH":vfatCH }
+                    for strip, panPin, vfatCH in zip(self.strip.tolist(), self.panPin.tolist(), self.vfatCH.tolist()) ]
+            pass
+
+        return self.listOfRows[vfatN]
@@ -0,0 +1,89 @@
+#!/bin/env python
+
+"""
+Benchmark of the retrieval of the VFAT calibration of a batch of chambers,
+with an SQLite stand-in of the GEM DB, see dbutils.makeDBStandIn().  Reports
+the number of queries and the time taken to get the calibration of every
+chamber:
+
+    per chamber - one getVFAT3ProdSumView() per chamber, as done before the
+                  batch was prefetched
+    prefetch    - prefetchVFAT3CalInfo() of all chambers followed by one
+                  getVFAT3CalInfo() per chamber, as ana_scans.py does, with an
+                  empty calibration cache
+    cached      - the same once the calibration cache is filled
+
+Usage: python tests/benchmark_dbutils.py [nChambers]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from gempython.gemplotting.utils import dbutils
+from gempython.gemplotting.utils.dbutils import makeVFAT3ProdSummaryStandIn
+from gempython.gemplotting.utils.multiprocUtils import sharedData
+
+def timeQueries(func):
+    """
+    Returns a tuple (result of func(), number of queries sent to the DB, time taken in s)
+    """
+
+    listOfQueries = []
+    readSQL = pd.read_sql
+    def countingReadSQL(*args, **kwargs):
+        listOfQueries.append(args[0])
+        return readSQL(*args, **kwargs)
+    pd.read_sql = countingReadSQL
+    try:
+        startTime = time.time()
+        result = func()
+        elapsed = time.time() - startTime
+    finally:
+        pd.read_sql = readSQL
+
+    return (result, len(listOfQueries), elapsed)
+
+def main(nChambers=100, nVFATs=24):
+    tmpDir = tempfile.mkdtemp()
+    try:
+        standIn = os.path.join(tmpDir, "gemdb.sqlite")
+        os.environ["GEM_ONLINE_DB_STANDIN"] = standIn
+        os.environ["GEM_VFAT_CAL_CACHE"] = os.path.join(tmpDir, "vfat3CalInfo.sqlite")
+        dictOfChambers = dict((chamber, range(chamber*nVFATs + 1, (chamber+1)*nVFATs + 1)) for chamber in range(nChambers))
+        dbutils.makeDBStandIn(standIn, "GEM_VFAT3_PROD_SUMMARY_V_RH",
+                makeVFAT3ProdSummaryStandIn([ chipId for vfatList in dictOfChambers.values() for chipId in vfatList ]))
+
+        def perChamber():
+            return dict((chamber, dbutils.getVFAT3ProdSumView(vfatList)) for chamber, vfatList in dictOfChambers.iteritems())
+
+        def prefetch():
+            sharedData.pop(("vfat3CalInfo",), None)
+            dbutils.prefetchVFAT3CalInfo([ chipId for vfatList in dictOfChambers.values() for chipId in vfatList ])
+            return dict((chamber, dbutils.getVFAT3CalInfo(vfatList)) for chamber, vfatList in dictOfChambers.iteritems())
+
+        reference, nQueries, elapsed = timeQueries(perChamber)
+        print("{0} chambers of {1} VFATs".format(nChambers, nVFATs))
+        print("{0:12s} {1:4d} queries {2:8.3f} s".format("per chamber", nQueries, elapsed))
+        for name in [ "prefetch", "cached" ]:
+            dictOfCalInfo, nQueries, elapsed = timeQueries(prefetch)
+            print("{0:12s} {1:4d} queries {2:8.3f} s".format(name, nQueries, elapsed))
+            for chamber, calInfo in dictOfCalInfo.iteritems():
+                expected = reference[chamber].sort_values('vfatN')['cal_dacm'].values
+                if not np.array_equal(calInfo.sort_values('vfatN')['cal_dacm'].values, expected):
+                    raise RuntimeError("Calibration of chamber {0} differs".format(chamber))
+                pass
+            pass
+    finally:
+        sharedData.pop(("vfat3CalInfo",), None)
+        shutil.rmtree(tmpDir)
+
+    return
+
+if __name__ == '__main__':
+    main(*[ int(arg) for arg in sys.argv[1:] ])
@@ -0,0 +1,117 @@
+"""
+Tests of the VFAT calibration cache of gempython.gemplotting.utils.dbutils,
+with an SQLite stand-in of the GEM DB, see dbutils.makeDBStandIn().
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from gempython.gemplotting.utils import cacheutils, dbutils
+from gempython.gemplotting.utils.dbutils import makeVFAT3ProdSummaryStandIn
+from gempython.gemplotting.utils.multiprocUtils import sharedData
+
+class TestCalCache(unittest.TestCase):
+    listOfIDs = [ 0x10, 0x11, 0x12 ]
+    missingID = 0x99
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.standIn = os.path.join(self.tmpDir, "gemdb.sqlite")
+        dbutils.makeDBStandIn(self.standIn, "GEM_VFAT3_PROD_SUMMARY_V_RH", makeVFAT3ProdSummaryStandIn(self.listOfIDs, calDACm=0.25))
+
+        self.oldEnv = dict((name, os.environ.get(name)) for name in [ "GEM_ONLINE_DB_STANDIN", "GEM_VFAT_CAL_CACHE" ])
+        os.environ["GEM_ONLINE_DB_STANDIN"] = self.standIn
+        os.environ["GEM_VFAT_CAL_CACHE"] = os.path.join(self.tmpDir, "vfat3CalInfo.sqlite")
+
+        # Record the VFATs of each DB query
+        self.listOfQueries = []
+        self.getVFAT3ProdSumView = dbutils.getVFAT3ProdSumView
+        def getVFAT3ProdSumView(vfatList, debug=False):
+            self.listOfQueries.append(sorted(vfatList))
+            return self.getVFAT3ProdSumView(vfatList, debug)
+        dbutils.getVFAT3ProdSumView = getVFAT3ProdSumView
+
+    def tearDown(self):
+        dbutils.getVFAT3ProdSumView = self.getVFAT3ProdSumView
+        self.closeConnections()
+        sharedData.pop(("vfat3CalInfo",), None)
+        for name, value in self.oldEnv.iteritems():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+            pass
+        shutil.rmtree(self.tmpDir)
+
+    def closeConnections(self):
+        for connection in cacheutils.processConnections.values():
+            if connection is not None:
+                connection.close()
+            pass
+        cacheutils.processConnections.clear()
+
+    def ageCache(self, seconds):
+        calCache = dbutils.openCalCache()
+        calCache.execute("UPDATE vfat3CalInfo SET fetched = fetched - ?", (seconds,))
+        calCache.commit()
+
+    def getCalDACm(self, vfatList, **kwargs):
+        return list(dbutils.getVFAT3CalInfo(vfatList, **kwargs).sort_values('vfatN')['cal_dacm'])
+
+    def testCacheHit(self):
+        self.assertEqual(self.getCalDACm(self.listOfIDs), [0.25]*3)
+        self.assertEqual(self.listOfQueries, [ self.listOfIDs ])
+
+        # Found in the cache, even by another connection
+        self.closeConnections()
+        self.assertEqual(self.getCalDACm(self.listOfIDs[::-1]), [0.25]*3)
+        self.assertEqual(len(self.listOfQueries), 1)
+
+    def testExpiry(self):
+        self.getCalDACm(self.listOfIDs)
+        dbutils.makeDBStandIn(self.standIn, "GEM_VFAT3_PROD_SUMMARY_V_RH", makeVFAT3ProdSummaryStandIn(self.listOfIDs, calDACm=0.5))
+
+        self.ageCache(dbutils.calCacheMaxAge - 60)
+        self.assertEqual(self.getCalDACm(self.listOfIDs), [0.25]*3)
+        self.assertEqual(len(self.listOfQueries), 1)
+
+        self.ageCache(120)
+        self.assertEqual(self.getCalDACm(self.listOfIDs), [0.5]*3)
+        self.assertEqual(self.listOfQueries, [ self.listOfIDs ]*2)
+
+    def testNotFoundExpiry(self):
+        self.assertTrue(np.isnan(self.getCalDACm([ self.missingID ] + self.listOfIDs)[0]))
+
+        # VFATs not found are looked up again sooner than the others
+        dbutils.makeDBStandIn(self.standIn, "GEM_VFAT3_PROD_SUMMARY_V_RH", makeVFAT3ProdSummaryStandIn(self.listOfIDs + [ self.missingID ], calDACm=0.25))
+        self.ageCache(dbutils.calCacheNotFoundMaxAge - 60)
+        self.assertTrue(np.isnan(self.getCalDACm([ self.missingID ])[0]))
+        self.ageCache(120)
+        self.assertEqual(self.getCalDACm([ self.missingID ] + self.listOfIDs), [0.25]*4)
+        self.assertEqual(self.listOfQueries, [ sorted(self.listOfIDs + [ self.missingID ]), [ self.missingID ] ])
+
+    def testRefresh(self):
+        self.getCalDACm(self.listOfIDs)
+        dbutils.makeDBStandIn(self.standIn, "GEM_VFAT3_PROD_SUMMARY_V_RH", makeVFAT3ProdSummaryStandIn(self.listOfIDs, calDACm=0.5))
+        self.assertEqual(self.getCalDACm(self.listOfIDs, refresh=True), [0.5]*3)
+        self.assertEqual(self.getCalDACm(self.listOfIDs), [0.5]*3)
+        self.assertEqual(len(self.listOfQueries), 2)
+
+    def testStaleFallback(self):
+        self.getCalDACm(self.listOfIDs)
+        self.ageCache(dbutils.calCacheMaxAge + 60)
+        os.environ["GEM_ONLINE_DB_STANDIN"] = os.path.join(self.tmpDir, "unreachable.sqlite")
+
+        # Stale entries are used when the DB cannot be reached...
+        self.assertEqual(self.getCalDACm(self.listOfIDs), [0.25]*3)
+
+        # ...but not when they are explicitly refreshed or some VFATs are not cached
+        self.assertRaises(IOError, dbutils.getVFAT3CalInfo, self.listOfIDs, refresh=True)
+        self.assertRaises(IOError, dbutils.getVFAT3CalInfo, self.listOfIDs + [ self.missingID ])
+
+if __name__ == '__main__':
+    unittest.main()
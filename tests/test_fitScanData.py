@@ -0,0 +1,102 @@
+"""
+Regression tests of the reproducibility of
+gempython.gemplotting.fitting.fitScanData.ScanDataFitter: with a seed the fit
+results must be bitwise identical from one run to the next and whatever the
+split of the VFATs across calls or processes.
+"""
+
+import unittest
+
+import numpy as np
+
+from gempython.gemplotting.fitting.fitScanData import ScanDataFitter
+
+def makeScanData(nVFATS=3, seed=20190425):
+    """
+    Returns a dictionary of the columns of a synthetic S-curve tree, see
+    ScanDataFitter.feedArrays(), of nVFATS VFAT2's with 128 channels each;
+    the last VFAT has a few channels without hits and a few without data.
+    """
+
+    from scipy.special import erf
+
+    random = np.random.RandomState(seed)
+    vfatN, vfatCH = np.meshgrid(np.arange(nVFATS), np.arange(128), indexing='ij')
+    mean = random.uniform(60, 160, vfatN.shape)
+    sigma = random.uniform(1, 8, vfatN.shape)
+
+    vcal = np.arange(256)
+    Nev = 100
+    efficiency = 0.5 * erf((vcal[None,None,:] - mean[:,:,None]) / (np.sqrt(2) * sigma[:,:,None])) + 0.5
+    Nhits = random.binomial(Nev, efficiency).astype(float)
+    Nhits[-1,:4] = 0
+
+    hasData = np.ones(vfatN.shape, dtype=bool)
+    hasData[-1,4:8] = False
+    shape = (np.count_nonzero(hasData), len(vcal))
+    return {
+            'vfatN':np.broadcast_to(vfatN[hasData][:,None], shape).ravel(),
+            'vfatCH':np.broadcast_to(vfatCH[hasData][:,None], shape).ravel(),
+            'vcal':np.broadcast_to(vcal[None,:], shape).ravel(),
+            'Nhits':Nhits[hasData].ravel(),
+            'Nev':Nev * np.ones(shape).ravel()
+            }
+
+class TestReproducibleFit(unittest.TestCase):
+    nVFATS = 3
+    seed = 1234
+
+    def setUp(self):
+        self.scanData = makeScanData(self.nVFATS)
+
+    def makeFitter(self):
+        fitter = ScanDataFitter(
+                calDAC2Q_m=0.25 * np.ones(self.nVFATS),
+                calDAC2Q_b=np.zeros(self.nVFATS),
+                isVFAT3=False,
+                nVFATS=self.nVFATS)
+        fitter.feedArrays(**self.scanData)
+        return fitter
+
+    def fitResults(self, backend, **fitOptions):
+        fitter = self.makeFitter()
+        fitter.fit(backend=backend, seed=self.seed, **fitOptions)
+        return fitter.getFitResultArrays()
+
+    def assertResultsEqual(self, results, reference):
+        for key in reference:
+            self.assertTrue(np.array_equal(results[key], reference[key]), "{0} differs".format(key))
+            pass
+        return
+
+    def checkBackend(self, backend):
+        reference = self.fitResults(backend)
+        self.assertTrue(np.any(reference['fitValid']))
+
+        # Same data and seed, fit again
+        self.assertResultsEqual(self.fitResults(backend), reference)
+
+        # One VFAT at a time, then a different split
+        fitter = self.makeFitter()
+        for vfat in range(self.nVFATS):
+            fitter.fit(backend=backend, seed=self.seed, vfatList=[vfat])
+            pass
+        self.assertResultsEqual(fitter.getFitResultArrays(), reference)
+
+        fitter = self.makeFitter()
+        fitter.fit(backend=backend, seed=self.seed, vfatList=[2,0])
+        fitter.fit(backend=backend, seed=self.seed, vfatList=[1])
+        self.assertResultsEqual(fitter.getFitResultArrays(), reference)
+
+        # One task per VFAT in a pool of processes
+        self.assertResultsEqual(self.fitResults(backend, nWorkers=2), reference)
+        return
+
+    def testRootBackend(self):
+        self.checkBackend("root")
+
+    def testNumpyBackend(self):
+        self.checkBackend("numpy")
+
+if __name__ == '__main__':
+    unittest.main()
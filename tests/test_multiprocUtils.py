@@ -0,0 +1,85 @@
+"""
+Tests of the per task deadlines of gempython.gemplotting.utils.multiprocUtils.runTasks():
+a task stuck where SIGALRM is not delivered or whose worker dies must neither
+affect the other tasks nor hang runTasks().
+"""
+
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+from gempython.gemplotting.utils import multiprocUtils
+
+# Tasks must be module level functions to be pickled
+def sleepTask(seconds):
+    time.sleep(seconds)
+
+def stuckTask(seconds):
+    signal.signal(signal.SIGALRM, signal.SIG_IGN) # as if running in compiled code
+    time.sleep(seconds)
+
+def dyingTask():
+    os._exit(1)
+
+def failingTask():
+    raise ValueError("failingTask")
+
+def makeTask(name, func, args, cost):
+    return multiprocUtils.AnalysisTask(name, func, args, cost, None, None, [])
+
+class TestRunTasks(unittest.TestCase):
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.oldEnv = os.environ.get("GEM_PLOTTING_CACHE")
+        os.environ["GEM_PLOTTING_CACHE"] = self.cacheDir
+        self.oldGrace = multiprocUtils.taskTimeoutGrace
+        multiprocUtils.taskTimeoutGrace = 1
+
+    def tearDown(self):
+        multiprocUtils.taskTimeoutGrace = self.oldGrace
+        if self.oldEnv is None:
+            del os.environ["GEM_PLOTTING_CACHE"]
+        else:
+            os.environ["GEM_PLOTTING_CACHE"] = self.oldEnv
+        shutil.rmtree(self.cacheDir)
+
+    def runTasks(self, listOfTasks, timeout):
+        return dict((result.name, result.status) for result in multiprocUtils.runTasks(listOfTasks, 2, timeout))
+
+    def testDeadlines(self):
+        listOfTasks = [
+                makeTask("stuck", stuckTask, (60,), 4),
+                makeTask("sleep", sleepTask, (3,), 3),
+                makeTask("dying", dyingTask, (), 2),
+                makeTask("failing", failingTask, (), 1),
+                makeTask("short", sleepTask, (0.1,), 0) ]
+        startTime = time.time()
+        dictOfStatus = self.runTasks(listOfTasks, timeout=1)
+        self.assertLess(time.time() - startTime, 30)
+        self.assertEqual(dictOfStatus, {
+            "stuck":"timeout",
+            "sleep":"timeout",
+            "dying":"lost",
+            "failing":"failed",
+            "short":"done" })
+
+    def testDyingWorkers(self):
+        # Every worker dies right after announcing its task, which must have
+        # reached runTasks() nonetheless
+        listOfTasks = [ makeTask("dying{0}".format(i), dyingTask, (), i) for i in range(4) ]
+        for timeout in [ 1, 0 ]:
+            startTime = time.time()
+            dictOfStatus = self.runTasks(listOfTasks, timeout=timeout)
+            self.assertLess(time.time() - startTime, 30)
+            self.assertEqual(dictOfStatus, dict((task.name, "lost") for task in listOfTasks))
+
+    def testNoTimeout(self):
+        # No limit: a task sleeping longer than the grace period must complete
+        listOfTasks = [ makeTask("stuck", stuckTask, (3,), 1), makeTask("short", sleepTask, (0.1,), 0) ]
+        self.assertEqual(self.runTasks(listOfTasks, timeout=0), { "stuck":"done", "short":"done" })
+
+if __name__ == '__main__':
+    unittest.main()
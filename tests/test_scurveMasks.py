@@ -0,0 +1,94 @@
+"""
+Tests of the channel mask decisions of gempython.gemplotting.utils.scurveAlgos,
+getChannelMaskReasons() and getEffPedFraction(), on hand-made numpy arrays.
+"""
+
+import unittest
+
+import numpy as np
+
+from gempython.gemplotting.utils.anaInfo import MaskReason
+from gempython.gemplotting.utils.scurveAlgos import getChannelMaskReasons, getEffPedFraction
+
+class TestEffPedFraction(unittest.TestCase):
+    def testFraction(self):
+        effPed = np.array([[0., 5., 30., 7.]])
+        nev = np.array([[100., 100., 600., 0.]])
+        fraction = getEffPedFraction(effPed, nev)
+        self.assertTrue(np.array_equal(fraction[:,:3], [[0., 0.05, 0.05]]))
+        self.assertTrue(np.isnan(fraction[0,3])) # no pulses
+
+class TestChannelMaskReasons(unittest.TestCase):
+    nVFATS = 2
+    nChans = 128
+
+    def setUp(self):
+        # Well behaved channels: spread in mean, noise above the dead channel cut and
+        # below the high noise cut, small effective pedestal and a valid fit
+        random = np.random.RandomState(20190425)
+        shape = (self.nVFATS, self.nChans)
+        self.scurveMean = random.normal(30., 1., shape)
+        self.scurveSigma = random.uniform(0.5, 1., shape)
+        self.effPedFraction = np.zeros(shape)
+        self.fitFailed = np.zeros(shape, dtype=bool)
+
+    def getMaskReasons(self):
+        return getChannelMaskReasons(
+                scurveMean=self.scurveMean,
+                scurveSigma=self.scurveSigma,
+                effPedFraction=self.effPedFraction,
+                fitFailed=self.fitFailed,
+                zscore=3.5,
+                deadChanCutLow=0.01,
+                deadChanCutHigh=0.1,
+                highNoiseCut=1.5,
+                maxEffPedPercent=0.02)
+
+    def testNotMasked(self):
+        reason, mask = self.getMaskReasons()
+        self.assertTrue(np.all(reason == MaskReason.NotMasked))
+        self.assertFalse(np.any(mask))
+
+    def testReasons(self):
+        self.scurveMean[0,3] = 5.       # far below the other channels of VFAT0
+        self.scurveSigma[0,10] = 0.05   # dead
+        self.scurveSigma[1,20] = 2.     # noisy
+        self.effPedFraction[1,30] = 0.1 # high effective pedestal
+        self.fitFailed[1,40] = True
+        self.effPedFraction[1,41] = np.nan # no data, never HighEffPed
+
+        reason, mask = self.getMaskReasons()
+
+        expected = np.zeros(reason.shape, dtype=int)
+        expected[0,3] = MaskReason.HotChannel
+        expected[0,10] = MaskReason.DeadChannel
+        expected[1,20] = MaskReason.HighNoise
+        expected[1,30] = MaskReason.HighEffPed
+        expected[1,40] = MaskReason.FitFailed
+        self.assertTrue(np.array_equal(reason, expected))
+
+        # Dead channels are not masked
+        expectedMask = (expected != MaskReason.NotMasked)
+        expectedMask[0,10] = False
+        self.assertTrue(np.array_equal(mask, expectedMask))
+
+    def testHotChannelByVFAT(self):
+        # A mean which is low for VFAT0 is typical of VFAT1
+        self.scurveMean[1] += 20.
+        self.scurveMean[1,0] = 32.
+        self.scurveMean[0,0] = 10.
+        reason, mask = self.getMaskReasons()
+        self.assertEqual(reason[0,0], MaskReason.HotChannel)
+        self.assertEqual(reason[1,0], MaskReason.HotChannel)
+        self.assertEqual(np.count_nonzero(reason), 2)
+
+    def testCombinedReasons(self):
+        self.scurveSigma[0,7] = 3.
+        self.effPedFraction[0,7] = 0.5
+        self.fitFailed[0,7] = True
+        reason, mask = self.getMaskReasons()
+        self.assertEqual(reason[0,7], MaskReason.HighNoise | MaskReason.HighEffPed | MaskReason.FitFailed)
+        self.assertTrue(mask[0,7])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,13 @@ numOfGoodChansMinDefault = 10 #: default value of: minimum number of good channe
 #: The default value for the maximum chi2 an acceptable scurve fit
 maxChi2Default=10
 
+#: Engines available for fitting scurves, see ScanDataFitter.fit()
+fitBackends = [ "root", "numpy" ]
+fitBackendDefault = "root"
+
+#: Maximum size, in MB, of the on-disk cache of scurve fit results
+fitCacheMaxSizeDefault = 500
+
 #: The default values for the cuts that determine the scurve fit quality masks
 maxEffPedPercentDefault=0.02
 highNoiseCutDefault=1.5
@@ -33,3 +33,16 @@ chanMaskGroup.add_argument("--maxEffPedPercent", type=float, default=maxEffPedPe
 chanMaskGroup.add_argument("--highNoiseCut", type=float, default=highNoiseCutDefault, help="Threshold in fC for setting the HighNoise maskReason, if channel (scurve_sigma > highNoiseCut) then HighNoise is set")
 chanMaskGroup.add_argument("--deadChanCutLow", type=float, default=deadChanCutLowDefault,help="If channel (deadChanCutLow < scurve_sigma < deadChanCutHigh) then DeadChannel is set")
 chanMaskGroup.add_argument("--deadChanCutHigh", type=float, default=deadChanCutHighDefault, help="If channel (deadChanCutHigh < scurve_sigma < deadChanCutHigh) then DeadChannel is set")
+chanMaskGroup.add_argument("--remaskOnly", action="store_true", help="Do not analyze the scurves, instead recompute the channel masks of an existing scurve analysis output with the cuts given here; only the mask and maskReason branches, the summary plots without masked channels and chConfig.txt are rewritten")
+
+parser_scurveFit = argparse.ArgumentParser(add_help = False)
+
+from anaInfo import fitBackends,fitBackendDefault
+
+scurveFitGroup = parser_scurveFit.add_argument_group(title="Options for scurve fitting", description="Parameters which specify how the scurves are fit")
+scurveFitGroup.add_argument("--fitWorkers", type=int, default=1, help="Number of processes used to fit the scurves of one detector, the VFATs are split across them; 0 uses all available cores. Ignored when the analysis itself runs in a pool of processes, e.g. ana_scans.py")
+scurveFitGroup.add_argument("--seed", type=int, default=None, help="Seed of the random initial values used when a scurve fit is restarted, if provided the fit results are reproducible; otherwise a time based seed is used")
+scurveFitGroup.add_argument("--no-cache", action="store_true", dest="noCache", help="Do not look up or store scurve fit results in the on-disk fit cache")
+scurveFitGroup.add_argument("--rebuild-cache", action="store_true", dest="rebuildCache", help="Always fit the scurves and replace the result stored in the on-disk fit cache")
+scurveFitGroup.add_argument("--slim", action="store_true", help="Store the scurve histogram and fit of each channel as arrays of numbers rather than TH1/TF1 objects; the output file is smaller and faster to write and read, the objects are rebuilt by the plotting macros when needed")
+scurveFitGroup.add_argument("--fitBackend", type=str, default=fitBackendDefault, choices=fitBackends, help="Engine used to fit the scurves; 'root' fits each channel with TH1::Fit, 'numpy' fits all channels of a detector at once with a vectorized minimization")
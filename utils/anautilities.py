@@ -484,13 +484,28 @@ def dacAnalysis(args, dacScanTree, chamber_config, scandate='noscandate'):
     return dict_dacVals
 
 def filePathExists(searchPath, subPath=None, debug=False):
+    """
+    Returns True if searchPath/subPath (or searchPath if subPath is None)
+    exists.  If subPath is a scandate the scan catalog is queried first, see
+    gempython.gemplotting.utils.scancatalog.scanExists()
+
+    searchPath - path to test, e.g. as returned by getDirByAnaType()
+    subPath    - optional, path inside searchPath, e.g. a scandate
+    debug      - prints whether the path was found
+    """
     import os
     
     testPath = searchPath
     if subPath is not None:
         testPath = "{0}/{1}".format(searchPath, subPath)
 
-    if not os.path.exists(testPath):
+    if subPath is not None:
+        from gempython.gemplotting.utils.scancatalog import scanExists
+        pathExists = scanExists(searchPath, subPath)
+    else:
+        pathExists = os.path.exists(testPath)
+
+    if not pathExists:
         if debug:
             print("Unable to find location: {0}".format(testPath))
         return False
@@ -581,6 +596,9 @@ def first_index_gt(data_list, value):
     return the first index greater than value from a given list like object.
     If value is greater than all elements in the list like object, the length 
     of the list like object is returned instead
+
+    This is a linear scan, for sorted bin edges use findBin() or findBins()
+    from gempython.gemplotting.utils.binning instead
     """
     try:
         index = next(data[0] for data in enumerate(data_list) if data[1] > value)
@@ -604,8 +622,8 @@ def get2DMapOfDetector(vfatChanLUT, obsData, mapName, zLabel, gemType="ge11"):
     Generates a 2D map of the detector as a TH2D. Y-axis will be ieta. X-axis will be ROBstr (strip),
     vfat channel or panasonic pin number.  The z-axis will be the elements of obsData with label zLabel
 
-    vfatChanLUT - Nested dictionary specifying the VFAT channel to strip and PanPin mapping;
-                  see getMapping() for details on expected format
+    vfatChanLUT - ChannelMap (or nested dictionary) specifying the VFAT channel to strip and
+                  PanPin mapping; see getMapping() for details on expected format
     obsData     - Numpy array w/3072 entries storing, index goes as [vfat*128+chan]
     mapName     - Type of map to be produced, will be the x-axis.  See mappingNames of anaInfo
                   for possible options
@@ -810,17 +828,19 @@ def getGEBTypeFromFilename(filename, cName=None):
 
 def getMapping(mappingFileName, isVFAT2=True, gemType="ge11"):
     """
-    Returns a nested dictionary, the outer dictionary uses VFAT position as the has a key,
-    the inner most dict has keys from the list anaInfo.py mappingNames.
-    
-    The inner dict stores a list whose index is ordered by ASIC channel number, accessing
-    the i^th element of this list gives either the readout strip number, the readout connector
-    pin number, or the vfat channel number as shown in this example:
+    Returns a mapping.channelMapLUT.ChannelMap holding the vfatsPerGemVariant[gemType] VFATs
+    of gemType.  As the nested dictionary this function used to return it is indexed first
+    by VFAT position, then by a name from the list anaInfo.py mappingNames and last by ASIC
+    channel number, giving either the readout strip number, the readout connector pin number,
+    or the vfat channel number as shown in this example:
 
         ret_dict[vfatN]['Strip'][asic_chan] is the strip number
         ret_dict[vfatN]['PanPin'][asic_chan] is the pin number on the readout connector
         ret_dict[vfatN]['vfatCH'][asic_chan] is the vfat channel number
 
+    The same information is available as numpy arrays for vectorized lookups, e.g.
+    ret_dict.map(vfatN_array, chan_array, 'Strip'), see ChannelMap.
+
     mappingFile - physical filename of file which contains the mapping information, 
                   expected format:
 
@@ -836,53 +856,18 @@ def getMapping(mappingFileName, isVFAT2=True, gemType="ge11"):
                         strip - the anode strip on the readout board in an ieta row
                         channel - the channel on the ASIC
                         PanPin - the pin number on the panasonic connector
+
+                  The file is read with loadMapping(), i.e. only once per process
     """
-    from ...utils.nesteddict import nesteddict
-    
-    from anaInfo import mappingNames
-    import ROOT as r
-    
     from gempython.tools.hw_constants import vfatsPerGemVariant
     
-    # Try to get the mapping data
-    try:
-        mapFile = open(mappingFileName, 'r')
-    except IOError as e:
-        print("Exception:", e)
-        print("Failed to open: '{0}'".format(mappingFileName))
-    else:
-        listMapData = mapFile.readlines()
-    finally:
-        mapFile.close()
-
-    # strip trhe end of line character
-    listMapData = [x.strip('\n') for x in listMapData]
-
-        # setup the look up table
-    ret_mapDict = nesteddict()
-    for vfat in range(0,vfatsPerGemVariant[gemType]):
-        for name in mappingNames:
-            ret_mapDict[vfat][name] = [0] * 128
-
-    # Set the data in the loop up table
-    for idx, line in enumerate(listMapData):
-        if idx == 0: 
-            continue # skip the header line
-        mapping = line.rsplit('\t')
-        if isVFAT2: 
-            ret_mapDict[int(mapping[0])]['Strip'][int(mapping[2]) - 1] = int(mapping[1])
-            ret_mapDict[int(mapping[0])]['PanPin'][int(mapping[2]) -1] = int(mapping[3])
-            ret_mapDict[int(mapping[0])]['vfatCH'][int(mapping[2]) - 1] = int(mapping[2]) - 1
-        else: #EDMS document numbers VFAT3 channels from [0,127]
-            ret_mapDict[int(mapping[0])]['Strip'][int(mapping[2])] = int(mapping[1])
-            ret_mapDict[int(mapping[0])]['PanPin'][int(mapping[2])] = int(mapping[3])
-            ret_mapDict[int(mapping[0])]['vfatCH'][int(mapping[2])] = int(mapping[2])
-
-    return ret_mapDict
+    return loadMapping(mappingFileName, isVFAT2).resize(vfatsPerGemVariant[gemType])
 
 def getNumCores2Use(args):
     """
-    Determines the number of cpu cores to use for parallel processing
+    Determines the number of cpu cores to use for parallel processing, out of
+    the cores this process may use (see multiprocUtils.getAvailableCPUs()).
+    This is an upper bound, the pool is sized with multiprocUtils.planWorkers()
 
     args - object returned by argparse.ArgumentParser.parse_args() 
 
@@ -891,13 +876,16 @@ def getNumCores2Use(args):
         light - 25% of cores will be used; rounded down
         medium - 50% of cores will be used; rounded down
         heavy - 75% of cores will be used; rounded down
+
+    unless it has a workers attribute which is not None, giving explicitly the
+    number of cores to use
     """
-    from multiprocessing import cpu_count
-    try:
-        availableCores = cpu_count() # Docs say this may raise following exception: see https://docs.python.org/2/library/multiprocessing.html#miscellaneous
-    except NotImplementedError as err:
-        from gempython.utils.wrappers import runCommandWithOutput
-        availableCores = int(runCommandWithOutput('nproc').strip('\n'))
+
+    if getattr(args, "workers", None) is not None:
+        return args.workers
+
+    from gempython.gemplotting.utils.multiprocUtils import getAvailableCPUs
+    availableCores = getAvailableCPUs()
 
     # Don't bother catching the AttributeError that would be raised if args doesn't have these
     if args.light:
@@ -1279,12 +1267,61 @@ def isOutlierMADOneSided(arrayData, thresh=3.5, rejectHighTail=True):
         else:
             return modified_z_score < -1.0 * thresh
 
+#Row by row version of isOutlierMADOneSided() for a 2D array, e.g. one row per VFAT
+#Returns a boolean array of the same shape with True if points are outliers and False otherwise.
+def isOutlierMADOneSidedByRow(arrayData, thresh=3.5, rejectHighTail=True):
+    import numpy as np
+
+    median = np.median(arrayData, axis=1, keepdims=True)
+    diff = arrayData - median
+    med_abs_deviation = np.median(np.abs(diff), axis=1, keepdims=True)
+
+    # Rows where the MAD vanishes use the IQR instead, as isOutlierMADOneSided() does
+    q1,q3   = np.percentile(arrayData, [25,75], axis=1, keepdims=True)
+    IQR     = q3 - q1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        modified_z_score = 0.6745 * diff / med_abs_deviation
+
+        if rejectHighTail:
+            return np.where(med_abs_deviation == 0, arrayData > (q3 + 1.5 * IQR), modified_z_score > thresh)
+        else:
+            return np.where(med_abs_deviation == 0, arrayData < (q1 - 1.5 * IQR), modified_z_score < -1.0 * thresh)
+
+
+def loadMapping(mappingFileName, isVFAT2=True):
+    """
+    Returns the content of the channel mapping file mappingFileName, see
+    getMapping() for its format, as a mapping.channelMapLUT.ChannelMap holding
+    all the VFATs of the file.
+
+    The file is read once per process, see ChannelMap.fromFile() for its
+    on-disk cache; the ChannelMap is kept in multiprocUtils.sharedData so that
+    a file loaded before launching tasks with multiprocUtils.runTasks() is not
+    read again by the workers.
+
+    mappingFileName - physical filename of file which contains the mapping information
+    isVFAT2         - if True the ASIC channels of the file are numbered from 1
+                      instead of 0
+    """
+    import os
+    from gempython.gemplotting.mapping.channelMapLUT import ChannelMap
+    from gempython.gemplotting.utils.multiprocUtils import sharedData
+
+    key = ("mapping", os.path.abspath(mappingFileName), isVFAT2)
+    if key not in sharedData:
+        sharedData[key] = ChannelMap.fromFile(mappingFileName, isVFAT2)
+        pass
+
+    return sharedData[key]
 
 def makeListOfScanDatesFile(chamberName, anaType, startDate=None, endDate=None, delim='\t', ztrim=4):
     """
     Given a starting scandate startDate and an ending scandate endDate this
     will make a text file for chamberName which is a two-column list of 
-    scandates for anaType compatible with parseListOfScanDatesFile()
+    scandates for anaType compatible with parseListOfScanDatesFile().  The
+    scandates are taken from the scan catalog, see
+    gempython.gemplotting.utils.scancatalog.listScandates()
 
     chamberName - Chamber name, expected to be in chamber_config.values()
     startDate   - starting scandate in YYYY.MM.DD.hh.mm format, if None then
@@ -1311,8 +1348,9 @@ def makeListOfScanDatesFile(chamberName, anaType, startDate=None, endDate=None,
         pass
 
     import os
+    from gempython.gemplotting.utils.scancatalog import listScandates
     dirPath = getDirByAnaType(anaType, chamberName, ztrim)
-    listOfScanDates = os.listdir(dirPath)
+    listOfScanDates = listScandates(dirPath)
 
     try:
         listOfScanDatesFile = open('{0}/listOfScanDates.txt'.format(dirPath),'w+')
@@ -1375,6 +1413,9 @@ def parseCalFile(filename=None, gemType="ge11"):
 
     Inputing a slope (intercept) of 1.0 (0.0) will keep the numbers
     in DAC units
+
+    As for loadMapping() a file is only parsed once per process, see
+    multiprocUtils.sharedData
     """
 
     import numpy as np
@@ -1386,6 +1427,12 @@ def parseCalFile(filename=None, gemType="ge11"):
     calDAC2Q_b = np.zeros(vfatsPerGemVariant[gemType])
     calDAC2Q_m = np.zeros(vfatsPerGemVariant[gemType])
     if filename is not None:
+        import os
+        from gempython.gemplotting.utils.multiprocUtils import sharedData
+        key = ("calFile", os.path.abspath(filename), gemType)
+        if key in sharedData:
+            return (sharedData[key][0].copy(), sharedData[key][1].copy())
+
         list_bNames = ["vfatN","slope","intercept"]
         calTree = r.TTree('calTree','Tree holding VFAT Calibration Info')
         calTree.ReadFile(filename)
@@ -1395,6 +1442,7 @@ def parseCalFile(filename=None, gemType="ge11"):
             calDAC2Q_b[dataPt['vfatN']] = dataPt['intercept']
             calDAC2Q_m[dataPt['vfatN']] = dataPt['slope']
             pass
+        sharedData[key] = np.array([calDAC2Q_m, calDAC2Q_b])
     else:
         calDAC2Q_b = -0.8 * np.ones(vfatsPerGemVariant[gemType])
         calDAC2Q_m = 0.05 * np.ones(vfatsPerGemVariant[gemType])
@@ -0,0 +1,70 @@
+r"""
+``binning`` --- Bin lookup utilities
+====================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.utils.binning
+
+Utilities for finding the bin of a value, or of an array of values, in the
+fixed width binning of a ``TAxis``. Edge arrays are cached so that histograms
+sharing a binning (e.g. all channels of a VFAT) share one array.
+
+Documentation
+-------------
+"""
+
+import bisect
+import numpy as np
+
+#: Cache of the arrays returned by getUniformBinEdges(), keyed by (nBins, low, high)
+binEdgesCache = {}
+
+def findBin(binEdges, value):
+    """
+    Returns the index i of the interval binEdges[i] <= value < binEdges[i+1]
+    using a binary search; -1 is returned if value is below binEdges[0] and
+    len(binEdges)-1 if it is not below binEdges[-1].
+
+    This is the same as first_index_gt(binEdges, value)-1 from anautilities
+    for sorted binEdges.
+
+    binEdges - sorted list or numpy array of bin edges
+    value    - value to look up
+    """
+
+    return bisect.bisect_right(binEdges, value)-1
+
+def findBins(binEdges, values):
+    """
+    Array version of findBin(), returns a numpy array of int with the index of
+    the interval of each entry of values
+
+    binEdges - sorted numpy array of bin edges
+    values   - numpy array of values to look up
+    """
+
+    return np.searchsorted(binEdges, values, side='right')-1
+
+def getUniformBinEdges(nBins, low, high):
+    """
+    Returns a read-only numpy array holding the low edges of bins 1 to nBins+1
+    (i.e. including the overflow bin) of a TAxis with nBins bins between low
+    and high; the values are the same as TAxis::GetBinLowEdge().
+
+    The array is cached, further calls with the same arguments return the same
+    object.
+
+    nBins - number of bins
+    low   - low edge of the first bin
+    high  - high edge of the last bin
+    """
+
+    key = (int(nBins), float(low), float(high))
+    if key not in binEdgesCache:
+        binEdges = key[1] + np.arange(key[0]+1) * ((key[2] - key[1]) / key[0])
+        binEdges.flags.writeable = False
+        binEdgesCache[key] = binEdges
+        pass
+
+    return binEdgesCache[key]
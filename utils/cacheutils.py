@@ -0,0 +1,219 @@
+r"""
+``cacheutils`` --- On-disk cache utilities
+==========================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.utils.cacheutils
+
+Content addressed on-disk cache of numpy arrays. Entries are stored as ``.npz``
+files named after a hash of everything that determines their content, see
+:py:func:`getDigest`; the least recently used entries are removed when the
+cache grows beyond a given size.
+
+The cache is placed under ``$GEM_PLOTTING_CACHE`` if this environment variable
+is set and under ``~/.cache/gemplotting`` otherwise.
+
+Caches and catalogs kept in SQLite files are opened once per process with
+:py:func:`getProcessConnection`.
+
+Documentation
+-------------
+"""
+
+import hashlib
+import os
+import numpy as np
+
+#: Open connections of getProcessConnection(), keyed by (pid, path of the SQLite
+#: file); a connection must not be shared with a forked process
+processConnections = {}
+
+def getCacheDir(name):
+    """
+    Returns the path of the cache directory name, creating it if needed
+
+    name - name of the cache, e.g. "scurveFits"
+    """
+
+    cacheRoot = os.getenv("GEM_PLOTTING_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "gemplotting"))
+    cacheDir = os.path.join(cacheRoot, name)
+    if not os.path.isdir(cacheDir):
+        try:
+            os.makedirs(cacheDir)
+        except OSError:
+            if not os.path.isdir(cacheDir): # Someone else may have created it in the meantime
+                raise
+            pass
+        pass
+
+    return cacheDir
+
+def writeAtomically(path, writer, mode="wb"):
+    """
+    Writes path with writer(fileObject) through a temporary file in the same
+    directory, renamed to path once complete, so that concurrent readers never
+    see a partial file.  The file is readable by everyone and writable by the
+    group, as for a file created with the usual umask, since a cache or output
+    directory may be shared among users.
+
+    path   - path of the file to write
+    writer - function writing the content to the file object it is given
+    mode   - mode in which the temporary file is opened, e.g. "w" for text
+    """
+
+    import tempfile
+    fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as tmpFile:
+            writer(tmpFile)
+        os.chmod(tmpPath, 0o664) # mkstemp creates the file as 0600
+        os.rename(tmpPath, path)
+    except:
+        os.remove(tmpPath)
+        raise
+
+    return
+
+def getProcessConnection(path, init=None, description="the SQLite file"):
+    """
+    Returns the sqlite3 connection of this process to the SQLite file path, or
+    None if it cannot be opened.  The connection is opened on the first call
+    in each process, init(connection) is then called (e.g. to create tables)
+    and committed, and reused by the following calls.
+
+    path        - path of the SQLite file, created if needed
+    init        - optional function preparing a new connection
+    description - description of the file in the warning printed when it
+                  cannot be opened, e.g. "the scan catalog"
+    """
+
+    key = (os.getpid(), path)
+    if key not in processConnections:
+        import sqlite3
+        try:
+            connection = sqlite3.connect(path, timeout=60)
+            connection.text_factory = str
+            if init is not None:
+                init(connection)
+            connection.commit()
+        except sqlite3.Error as err:
+            from gempython.utils.gemlogger import printYellow
+            printYellow("Unable to open {0} {1}: {2}".format(description, path, err))
+            connection = None
+            pass
+        processConnections[key] = connection
+        pass
+
+    return processConnections[key]
+
+def getDigest(*items):
+    """
+    Returns the sha1 hex digest of items. numpy arrays are hashed through their
+    dtype, shape and raw content; other items through their repr()
+
+    items - objects to hash
+    """
+
+    digest = hashlib.sha1()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            item = np.ascontiguousarray(item)
+            digest.update("{0}{1}".format(item.dtype.str, item.shape))
+            digest.update(item.tobytes())
+        else:
+            digest.update(repr(item))
+            pass
+        digest.update("|")
+        pass
+
+    return digest.hexdigest()
+
+def getSourceVersion(listOfModules):
+    """
+    Returns a digest of the source files of the modules in listOfModules; any
+    change in their code gives a different version
+
+    listOfModules - list of imported python modules
+    """
+
+    listOfSources = []
+    for module in listOfModules:
+        sourceFile = module.__file__
+        if sourceFile.endswith((".pyc", ".pyo")):
+            sourceFile = sourceFile[:-1]
+        with open(sourceFile, "rb") as source:
+            listOfSources.append(source.read())
+        pass
+
+    return getDigest(*listOfSources)
+
+def loadFromCache(cacheDir, key):
+    """
+    Returns the dictionary of numpy arrays stored under key in cacheDir, or
+    None if there is no such entry.  The entry is marked as recently used.
+
+    cacheDir - path of the cache, see getCacheDir()
+    key      - key of the entry, see getDigest()
+    """
+
+    entryPath = os.path.join(cacheDir, "{0}.npz".format(key))
+    try:
+        with np.load(entryPath) as entry:
+            arrays = dict((name, entry[name]) for name in entry.files)
+        os.utime(entryPath, None)
+    except (IOError, OSError):
+        return None
+
+    return arrays
+
+def storeInCache(cacheDir, key, arrays, maxSizeMB):
+    """
+    Stores the dictionary of numpy arrays under key in cacheDir, then evicts
+    the least recently used entries until the cache is below maxSizeMB.  The
+    entry is written with writeAtomically().
+
+    cacheDir  - path of the cache, see getCacheDir()
+    key       - key of the entry, see getDigest()
+    arrays    - dictionary of numpy arrays
+    maxSizeMB - maximum size of the cache in MB
+    """
+
+    writeAtomically(os.path.join(cacheDir, "{0}.npz".format(key)), lambda entryFile: np.savez(entryFile, **arrays))
+
+    evictFromCache(cacheDir, maxSizeMB)
+
+    return
+
+def evictFromCache(cacheDir, maxSizeMB):
+    """
+    Removes the least recently used entries of cacheDir until its total size
+    is below maxSizeMB
+
+    cacheDir  - path of the cache, see getCacheDir()
+    maxSizeMB - maximum size of the cache in MB
+    """
+
+    listOfEntries = []
+    for fileName in os.listdir(cacheDir):
+        if not fileName.endswith(".npz"):
+            continue
+        try:
+            entryStat = os.stat(os.path.join(cacheDir, fileName))
+        except OSError: # Removed by someone else
+            continue
+        listOfEntries.append((entryStat.st_mtime, entryStat.st_size, fileName))
+        pass
+
+    totalSize = sum(entry[1] for entry in listOfEntries)
+    for mtime, size, fileName in sorted(listOfEntries):
+        if totalSize <= maxSizeMB * 1024 * 1024:
+            break
+        try:
+            os.remove(os.path.join(cacheDir, fileName))
+        except OSError: # Removed by someone else
+            pass
+        totalSize -= size
+        pass
+
+    return
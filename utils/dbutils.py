@@ -10,6 +10,24 @@ r"""
 
 Database utilities for gem-plotting-tools scripts/macros and vfatqc scans
 
+The calibration of the VFAT3 chips, see :py:func:`getVFAT3CalInfo`, is kept in
+a local SQLite cache keyed by ``vfat3_ser_num`` so that analyzing the same
+chips again does not query the DB.  Entries older than
+:py:data:`calCacheMaxAge` are retrieved again, or older than
+:py:data:`calCacheNotFoundMaxAge` for chips which were not in the DB, and stale
+entries are still used, with a warning, when the DB cannot be reached.  The cache is found at
+``$GEM_VFAT_CAL_CACHE`` or in the ``gemdb`` cache directory, see
+``cacheutils.getCacheDir()``, and ``ana_scans.py calCache`` fills it for all
+the chips found under ``$DATA_PATH``.
+
+Each process keeps a pool of connections to the GEM DB, see
+:py:func:`connectGEMDB`, and the VFATs are selected with bind variables, see
+:py:func:`getVFATFilter`.  The calibration of all the chambers of a batch is
+retrieved together by :py:func:`prefetchVFAT3CalInfo`.
+
+For running offline the GEM DB itself can be replaced by an SQLite file holding
+the views as tables, see :py:func:`connectGEMDB` and :py:func:`makeDBStandIn`.
+
 Documentation
 -------------
 """
@@ -17,6 +35,8 @@ Documentation
 from gempython.utils.gemlogger import colors, getGEMLogger, printYellow
 from gempython.utils.wrappers import envCheck
 
+from contextlib import contextmanager
+import os
 import pandas as pd
 
 knownViews = [
@@ -26,6 +46,99 @@ knownViews = [
         'GEM_VFAT3_PROD_SUMMARY_V_RH'
         ]
 
+#: Columns of GEM_VFAT3_PROD_SUMMARY_V_RH holding the VFAT calibration, they are
+#: the columns of the calibration cache
+vfat3CalColumns = ['vfat3_ser_num', 'vfat3_barcode', 'iref', 'adc0m', 'adc1m', 'adc0b', 'adc1b', 'cal_dacm', 'cal_dacb', 'vref_adc']
+
+#: Age in seconds after which an entry of the calibration cache is retrieved
+#: again from the DB
+calCacheMaxAge = 30*24*3600
+
+#: Age in seconds after which a VFAT recorded in the calibration cache as not
+#: found in the DB is looked up again, e.g. once its calibration was uploaded
+calCacheNotFoundMaxAge = 24*3600
+
+#: Pools of connections to the GEM DB, keyed by (pid, connection string); a
+#: connection must not be shared with a forked process
+dbPools = {}
+
+#: Maximum number of sessions of the pool of connections to the GEM DB of a process
+dbPoolSize = 4
+
+#: Maximum number of VFATs selected by one query; Oracle accepts at most 1000
+#: expressions in an IN list and older SQLite versions 999 bind variables
+maxVFATsPerQuery = 999
+
+def getCalCachePath():
+    """
+    Returns the path of the VFAT calibration cache, $GEM_VFAT_CAL_CACHE if it
+    is set
+    """
+
+    from gempython.gemplotting.utils.cacheutils import getCacheDir
+    return os.getenv("GEM_VFAT_CAL_CACHE", os.path.join(getCacheDir("gemdb"), "vfat3CalInfo.sqlite"))
+
+@contextmanager
+def connectGEMDB():
+    """
+    Context manager giving a connection to the GEM DB built from
+    $GEM_ONLINE_DB_CONN and $GEM_ONLINE_DB_NAME, e.g.
+
+        with connectGEMDB() as gemdb:
+            df = pd.read_sql(query, gemdb)
+
+    The connection is taken from a cx_Oracle session pool of at most
+    dbPoolSize sessions, created for each process on first use, and is given
+    back to the pool on exit, so the sessions are reused by later queries.  If
+    the connection string is not of the form user/password@dsn a new
+    connection is opened and closed instead.
+
+    If $GEM_ONLINE_DB_STANDIN is set it is instead the path of an SQLite file
+    holding the views as tables, see makeDBStandIn(), which is also attached
+    as CMS_GEM_MUON_VIEW so that the queries of getGEMDBView() are unchanged.
+    Its connection is kept open, see cacheutils.getProcessConnection().
+    """
+
+    standIn = os.getenv("GEM_ONLINE_DB_STANDIN")
+    if standIn:
+        from gempython.gemplotting.utils.cacheutils import getProcessConnection
+        if not os.path.isfile(standIn):
+            raise IOError("connectGEMDB(): GEM DB stand-in {0} does not exist".format(standIn))
+        gemdb = getProcessConnection(standIn,
+                lambda gemdb: gemdb.execute("ATTACH DATABASE ? AS CMS_GEM_MUON_VIEW", (standIn,)),
+                "the GEM DB stand-in")
+        if gemdb is None:
+            raise IOError("connectGEMDB(): unable to open the GEM DB stand-in {0}".format(standIn))
+        yield gemdb
+        return
+
+    # Check to make sure DB $ENV variables exist
+    envCheck("GEM_ONLINE_DB_NAME")
+    envCheck("GEM_ONLINE_DB_CONN")
+
+    import cx_Oracle
+    connectString = os.getenv("GEM_ONLINE_DB_CONN") + os.getenv("GEM_ONLINE_DB_NAME")
+    key = (os.getpid(), connectString)
+    if key not in dbPools:
+        credentials, atSign, dsn = connectString.rpartition("@")
+        user, slash, password = credentials.partition("/")
+        if atSign and slash:
+            dbPools[key] = cx_Oracle.SessionPool(user, password, dsn, min=1, max=dbPoolSize, increment=1, threaded=True)
+        else:
+            dbPools[key] = None
+        pass
+
+    pool = dbPools[key]
+    gemdb = cx_Oracle.connect(connectString) if pool is None else pool.acquire()
+    try:
+        yield gemdb
+    finally:
+        if pool is None:
+            gemdb.close()
+        else:
+            pool.release(gemdb)
+        pass
+
 def getGEMDBView(view, vfatList=None, debug=False):
     """
     Gets the GEM DB view defined by view for the list of vfats provided by vfatList, or
@@ -36,13 +149,10 @@ def getGEMDBView(view, vfatList=None, debug=False):
     view        - Name of View to retrieve from GEM DB 
     vfatList    - list of VFAT Chip ID's, if None the full view is retrieved
     debug       - Prints additional info if true
-    """
 
-    # Check to make sure DB $ENV variables exist
-    envCheck("GEM_ONLINE_DB_NAME")
-    envCheck("GEM_ONLINE_DB_CONN")
+    The VFATs are selected maxVFATsPerQuery at a time.
+    """
 
-    import os
     if view not in knownViews:
         from gempython.gemplotting.utils.exceptions import DBViewNotFound
         raise DBViewNotFound("{}View {} not in knownViews: {}{}".format(colors.RED,view,knownViews,colors.ENDC),os.EX_USAGE)
@@ -51,22 +161,30 @@ def getGEMDBView(view, vfatList=None, debug=False):
     query=('SELECT data.* FROM CMS_GEM_MUON_VIEW.{0} data '
             'INNER JOIN (SELECT vfat3_barcode, MAX(run_number) AS run_number FROM CMS_GEM_MUON_VIEW.{0} GROUP BY vfat3_barcode) data_select '
             'ON data.vfat3_barcode = data_select.vfat3_barcode AND data.run_number = data_select.run_number').format(view)
-    
+
     # Add a filter on VFAT serial number?
+    listOfQueries = [ (query, None) ]
     if vfatList is not None:
-        query += getVFATFilter(vfatList)
-        pass
-
-    if debug:
-        print("query = {0}{1}{2}".format(colors.YELLOW,query,colors.ENDC))
+        listOfIDs = sorted(set(vfatList))
+        listOfQueries = []
+        for first in range(0, len(listOfIDs), maxVFATsPerQuery):
+            vfatFilter, dictOfBinds = getVFATFilter(listOfIDs[first:first+maxVFATsPerQuery])
+            listOfQueries.append((query + vfatFilter, dictOfBinds))
+            pass
         pass
 
     # get a pandas data frame object containing the db query
-    import cx_Oracle
-    dbName = os.getenv("GEM_ONLINE_DB_NAME")
-    dbConn = os.getenv("GEM_ONLINE_DB_CONN")
-    gemdb = cx_Oracle.connect(dbConn+dbName)
-    dfGEMView = pd.read_sql(query,gemdb)
+    listOfDFs = []
+    with connectGEMDB() as gemdb:
+        for vfatQuery, dictOfBinds in listOfQueries:
+            if debug:
+                print("query = {0}{1}{2}".format(colors.YELLOW,vfatQuery,colors.ENDC))
+                print("binds = {0}".format(dictOfBinds))
+                pass
+            listOfDFs.append(pd.read_sql(vfatQuery,gemdb,params=dictOfBinds))
+            pass
+        pass
+    dfGEMView = pd.concat(listOfDFs, ignore_index=True) if len(listOfDFs) > 1 else listOfDFs[0]
     dfGEMView.columns = [ str.lower(col) for col in dfGEMView.columns ]
 
     if debug:
@@ -90,7 +208,7 @@ def getGEMDBView(view, vfatList=None, debug=False):
 
     return dfGEMView
 
-def getVFAT3CalInfo(vfatList, debug=False):
+def getVFAT3CalInfo(vfatList, debug=False, refresh=False, maxAge=None):
     """
     Gets from GEM_VFAT3_PROD_SUMMARY_V_RH view a subset of data that is necessary
     for VFAT calibration.  Specifically a pandas dataframe will be returned with
@@ -100,24 +218,79 @@ def getVFAT3CalInfo(vfatList, debug=False):
 
     vfatList    - list of VFAT Chip ID's.
     debug       - Prints additional info if true
+    refresh     - If true the calibration cache is ignored and updated with
+                  the content of the DB
+    maxAge      - Age in seconds after which cached entries are retrieved
+                  again, calCacheMaxAge if None; VFATs cached as not found in
+                  the DB are looked up again after at most calCacheNotFoundMaxAge
+
+    The DB is not queried if all VFATs of vfatList were retrieved before by
+    prefetchVFAT3CalInfo(), in this process or in the process which launched
+    it with multiprocUtils.runTasks().  Otherwise the VFATs are looked up in
+    the calibration cache, see getCalCachePath(), and only those missing or
+    older than maxAge are retrieved from the DB and stored in the cache.  VFATs
+    which are not in the DB are cached as well, for a shorter time.  If the DB
+    cannot be reached stale cache entries are used.
     """
 
-    #When using multithreading, the threads pass information back in pickled format. Some exceptions in cx_Oracle cannot be pickled.
-    #Thus, we check here whether the exception can be pickled, and if not rethrow it as an exception that can be.
-    try:
-        df_vfatCalInfo = getVFAT3ProdSumView(vfatList, debug)
-    except Exception as err:
-        import pickle
+    listOfColumns = ['vfatN'] + vfat3CalColumns
+
+    from gempython.gemplotting.utils.multiprocUtils import sharedData
+    if ("vfat3CalInfo",) in sharedData:
+        import numpy as np
+        prefetchedIDs, calInfo = sharedData[("vfat3CalInfo",)]
+        if np.all(np.in1d(vfatList, prefetchedIDs)):
+            df_vfatCalInfo = pd.DataFrame.from_records(calInfo)
+            df_vfatCalInfo = df_vfatCalInfo[df_vfatCalInfo['vfat3_ser_num'].isin([ "0x{:x}".format(chipId) for chipId in vfatList ])]
+            return joinOnVFATSerNum(vfatList, df_vfatCalInfo)[listOfColumns]
+        pass
+
+    import time
+    if maxAge is None:
+        maxAge = calCacheMaxAge
+    notFoundMaxAge = min(maxAge, calCacheNotFoundMaxAge)
+    setOfSerNums = set("0x{:x}".format(chipId) for chipId in vfatList)
+    calCache = openCalCache()
+    dictOfCalInfo = {} if calCache is None else loadCachedCalInfo(calCache, setOfSerNums)
+    now = time.time()
+    def isStale(entry):
+        return now - entry["fetched"] > (maxAge if entry["found"] else notFoundMaxAge)
+    listOfMissingIDs = sorted(set(
+            chipId for chipId in vfatList if refresh
+            or "0x{:x}".format(chipId) not in dictOfCalInfo
+            or isStale(dictOfCalInfo["0x{:x}".format(chipId)])))
+
+    if len(listOfMissingIDs) > 0:
+        #When using multithreading, the threads pass information back in pickled format. Some exceptions in cx_Oracle cannot be pickled.
+        #Thus, we check here whether the exception can be pickled, and if not rethrow it as an exception that can be.
         try:
-            pickle.dumps(err)
-        except TypeError:
-            raise Exception("This is a rethrown exception. The original exception type was: "+str(type(err)) +". The original exception message was: "+str(err.message))
+            df_vfatCalInfo = getVFAT3ProdSumView(listOfMissingIDs, debug)
+        except Exception as err:
+            if not refresh and setOfSerNums.issubset(dictOfCalInfo):
+                printYellow("Unable to query the GEM DB ({0}), using the stale cached calibration of {1} VFATs".format(
+                    err, len(listOfMissingIDs)))
+            else:
+                import pickle
+                try:
+                    pickle.dumps(err)
+                except TypeError:
+                    raise Exception("This is a rethrown exception. The original exception type was: "+str(type(err)) +". The original exception message was: "+str(err.message))
+                else:
+                    raise err
+                pass
         else:
-            raise err
-            
-            
-        
-    return df_vfatCalInfo[['vfatN','vfat3_ser_num', 'vfat3_barcode', 'iref', 'adc0m', 'adc1m', 'adc0b', 'adc1b', 'cal_dacm', 'cal_dacb', 'vref_adc']]
+            df_vfatCalInfo = df_vfatCalInfo[df_vfatCalInfo['vfat3_barcode'].notnull()]
+            listOfMissingSerNums = [ "0x{:x}".format(chipId) for chipId in listOfMissingIDs ]
+            dictOfFetched = storeCalInfo(calCache, listOfMissingSerNums, df_vfatCalInfo, now)
+            dictOfCalInfo.update(dictOfFetched)
+            pass
+        pass
+
+    listOfRecords = [ dictOfCalInfo[serNum]["calInfo"] for serNum in sorted(setOfSerNums)
+            if serNum in dictOfCalInfo and dictOfCalInfo[serNum]["found"] ]
+    df_vfatCalInfo = pd.DataFrame(listOfRecords, columns=vfat3CalColumns)
+
+    return joinOnVFATSerNum(vfatList, df_vfatCalInfo)[listOfColumns]
 
 def getVFAT3ConfView(vfatList, debug=False):
     """
@@ -145,22 +318,167 @@ def getVFAT3ProdSumView(vfatList, debug=False):
 
 def getVFATFilter(vfatList):
     """
-    Returns a string that can be used as a filter in an SQL query.
+    Returns a tuple (filter, binds) where filter is a string that can be used
+    as a filter in an SQL query, selecting the VFATs with an IN list of bind
+    variables, and binds the dictionary of the values of these variables to
+    pass with the query.  Oracle accepts at most 1000 entries in vfatList.
 
     vfatList - list of VFAT Chip ID's
     """
 
-    strRetFilter = " AND ("
-    for idx, vfatID in enumerate(vfatList):
-        if idx == 0:
-            strRetFilter += " data.VFAT3_SER_NUM='0x{:x}'".format(vfatID)
-        else:
-            strRetFilter += " OR data.VFAT3_SER_NUM='0x{:x}'".format(vfatID)
+    dictOfBinds = dict(("vfat{0}".format(idx), "0x{:x}".format(vfatID)) for idx, vfatID in enumerate(vfatList))
+    strRetFilter = " AND data.VFAT3_SER_NUM IN ({0})\n".format(", ".join(":vfat{0}".format(idx) for idx in range(len(vfatList))))
+
+    return (strRetFilter, dictOfBinds)
+
+def prefetchVFAT3CalInfo(vfatList, debug=False):
+    """
+    Retrieves with a single query the calibration info of all VFATs of
+    vfatList, e.g. of all the input files of a set of tasks, and stores it as
+    a numpy record array in multiprocUtils.sharedData.  getVFAT3CalInfo()
+    then uses it instead of querying the DB, including in the worker
+    processes of multiprocUtils.runTasks() launched afterwards.
+
+    vfatList    - list of VFAT Chip ID's, duplicates are ignored
+    debug       - Prints additional info if true
+    """
+
+    import numpy as np
+    from gempython.gemplotting.utils.multiprocUtils import sharedData
+
+    listOfIDs = sorted(set(vfatList))
+    df_vfatCalInfo = getVFAT3CalInfo(listOfIDs, debug)
+    sharedData[("vfat3CalInfo",)] = (
+            np.array(listOfIDs),
+            df_vfatCalInfo.drop('vfatN', axis=1).to_records(index=False))
+
+    return
+
+def loadCachedCalInfo(calCache, setOfSerNums):
+    """
+    Returns a dictionary of the entries of the calibration cache for the VFATs
+    of setOfSerNums, keyed by serial number; see storeCalInfo() for the format
+    of the entries
+
+    calCache     - connection returned by openCalCache()
+    setOfSerNums - set of VFAT serial numbers, e.g. '0x1a2b'
+    """
+
+    import sqlite3
+    listOfSerNums = sorted(setOfSerNums)
+    dictOfCalInfo = {}
+    try:
+        for first in range(0, len(listOfSerNums), 500): # SQLite allows 999 parameters per statement
+            chunk = listOfSerNums[first:first+500]
+            for row in calCache.execute("SELECT found, fetched, {0} FROM vfat3CalInfo WHERE vfat3_ser_num IN ({1})".format(
+                    ", ".join(vfat3CalColumns), ", ".join("?"*len(chunk))), chunk):
+                dictOfCalInfo[row[2]] = { "found":bool(row[0]), "fetched":row[1], "calInfo":tuple(row[2:]) if row[0] else None }
+                pass
+            pass
+    except sqlite3.Error as err:
+        printYellow("Unable to read the VFAT calibration cache {0}: {1}".format(getCalCachePath(), err))
+        pass
+
+    return dictOfCalInfo
+
+def makeDBStandIn(filename, view, dfGEMView):
+    """
+    Stores dfGEMView as the table view of the SQLite file filename, which can
+    then replace the GEM DB, see connectGEMDB().  Typically dfGEMView is a
+    full view retrieved with getGEMDBView().
+
+    filename  - path of the SQLite file, created if needed
+    view      - name of the view, one of knownViews
+    dfGEMView - pandas dataframe holding the view
+    """
+
+    import sqlite3
+    gemdb = sqlite3.connect(filename)
+    try:
+        dfGEMView.to_sql(view, gemdb, if_exists="replace", index=False)
+        gemdb.commit()
+    finally:
+        gemdb.close()
+
+    return
+
+def makeVFAT3ProdSummaryStandIn(listOfIDs, calDACm=None):
+    """
+    Returns a pandas dataframe standing in for GEM_VFAT3_PROD_SUMMARY_V_RH, to
+    be stored with makeDBStandIn(), holding one run of each VFAT of listOfIDs.
+    The calibration of the n-th VFAT is n in every column so that the VFATs
+    can be told apart, e.g. in tests and benchmarks.
+
+    listOfIDs - list of VFAT Chip ID's
+    calDACm   - if not None, the CAL_DAC slope given to every VFAT
+    """
+
+    import numpy as np
+    nVFATs = len(listOfIDs)
+    dfView = pd.DataFrame({
+        "VFAT3_SER_NUM":[ "0x{:x}".format(chipId) for chipId in listOfIDs ],
+        "VFAT3_BARCODE":[ 10000 + chipId for chipId in listOfIDs ],
+        "RUN_NUMBER":np.ones(nVFATs, dtype=int) })
+    for column in vfat3CalColumns[2:]:
+        dfView[column.upper()] = np.arange(nVFATs, dtype=float)
+        pass
+    if calDACm is not None:
+        dfView["CAL_DACM"] = calDACm
+        pass
+
+    return dfView
+
+def openCalCache():
+    """
+    Returns the sqlite3 connection of this process to the calibration cache,
+    creating the cache if needed, or None if it cannot be opened, see
+    cacheutils.getProcessConnection()
+    """
+
+    from gempython.gemplotting.utils.cacheutils import getProcessConnection
+    return getProcessConnection(getCalCachePath(),
+            lambda calCache: calCache.execute("CREATE TABLE IF NOT EXISTS vfat3CalInfo ("
+                "vfat3_ser_num TEXT PRIMARY KEY, found INTEGER, fetched REAL, vfat3_barcode, "
+                "{0})".format(", ".join("{0} REAL".format(col) for col in vfat3CalColumns[2:]))),
+            "the VFAT calibration cache")
+
+def storeCalInfo(calCache, listOfSerNums, dfCalInfo, fetched):
+    """
+    Stores the calibration of the VFATs of listOfSerNums in the calibration
+    cache, those missing from dfCalInfo are recorded as not found.  Returns
+    the stored entries as a dictionary keyed by serial number, each entry being
+    a dictionary holding:
+
+        "found"   - True if the VFAT is in the DB
+        "fetched" - time at which it was retrieved from the DB
+        "calInfo" - tuple of the values of vfat3CalColumns, None if not found
+
+    calCache      - connection returned by openCalCache(), if None nothing is stored
+    listOfSerNums - list of VFAT serial numbers retrieved from the DB
+    dfCalInfo     - pandas dataframe holding the vfat3CalColumns of the VFATs found
+    fetched       - time at which dfCalInfo was retrieved
+    """
+
+    dictOfCalInfo = dict((serNum, { "found":False, "fetched":fetched, "calInfo":None }) for serNum in listOfSerNums)
+    for calInfo in dfCalInfo[vfat3CalColumns].itertuples(index=False):
+        calInfo = tuple(None if pd.isnull(value) else value for value in calInfo)
+        dictOfCalInfo[calInfo[0]] = { "found":True, "fetched":fetched, "calInfo":calInfo }
+        pass
+
+    if calCache is not None:
+        import sqlite3
+        listOfRows = [ (serNum, int(entry["found"]), entry["fetched"]) + (entry["calInfo"][1:] if entry["found"] else (None,)*(len(vfat3CalColumns)-1))
+                for serNum, entry in dictOfCalInfo.iteritems() ]
+        try:
+            calCache.executemany("INSERT OR REPLACE INTO vfat3CalInfo (vfat3_ser_num, found, fetched, {0}) VALUES ({1})".format(
+                ", ".join(vfat3CalColumns[1:]), ", ".join("?"*(len(vfat3CalColumns)+2))), listOfRows)
+            calCache.commit()
+        except sqlite3.Error as err:
+            printYellow("Unable to update the VFAT calibration cache {0}: {1}".format(getCalCachePath(), err))
             pass
         pass
-    strRetFilter += " )\n"
 
-    return strRetFilter
+    return dictOfCalInfo
 
 def joinOnVFATSerNum(vfatList, dfGEMView):
     """
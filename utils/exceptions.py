@@ -39,3 +39,15 @@ class DBViewNotFound(KeyError):
 
         self.errors = errors
         return
+
+class TaskTimeout(RuntimeError):
+    """
+    Raised in a worker process when a task scheduled with
+    ``gempython.gemplotting.utils.multiprocUtils.runTasks`` takes longer than
+    its timeout
+    """
+    def __init__(self, message, errors):
+        super(TaskTimeout, self).__init__(message)
+
+        self.errors = errors
+        return
@@ -402,3 +402,6 @@ def anaUltraLatency(infilename, debug=False, latSigMaskRange=None, latSigRange=N
         grVFATNSignalNoBkg.Write()
     myT.Write()
     outF.Close()
+
+    from gempython.gemplotting.utils.scanresults import makeColumnarFile
+    makeColumnarFile(outputDir+"/"+outfilename, "latFitTree")
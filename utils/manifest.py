@@ -0,0 +1,248 @@
+r"""
+``manifest`` --- Records of completed analysis tasks
+====================================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.utils.manifest
+
+Each output directory of ``ana_scans.py`` holds a manifest, ``anaManifest.json``,
+with one entry per output file recording the input files of the task which
+produced it (the raw data and e.g. calibration files, each with its size,
+modification time and sha1 digest), a signature of the code and options of the
+task, its status and when it completed.
+
+As for ``make`` an output is up to date if none of this changed since it was
+produced, see :py:func:`isTaskDone`, so a batch only needs to run the tasks of
+new or modified inputs.  Outputs produced before manifests existed are judged by
+comparing their modification time to the one of their inputs.
+
+Documentation
+-------------
+"""
+
+import json
+import os
+
+#: Name of the manifest file inside an output directory
+manifestName = "anaManifest.json"
+
+#: Modules whose source enters every task signature besides the module
+#: defining the task function: the scurve fitting code and the utilities the
+#: analyses share, see getTaskSignature()
+analysisModules = (
+        "gempython.gemplotting.fitting.batchFit",
+        "gempython.gemplotting.fitting.fitScanData",
+        "gempython.gemplotting.mapping.chamberInfo",
+        "gempython.gemplotting.mapping.channelMapLUT",
+        "gempython.gemplotting.utils.anaInfo",
+        "gempython.gemplotting.utils.anautilities",
+        "gempython.gemplotting.utils.binning",
+        "gempython.gemplotting.utils.scanresults")
+
+def getFileDigest(filename, blockSize=1<<20):
+    """
+    Returns the sha1 hex digest of the content of filename
+
+    filename  - path of the file
+    blockSize - number of bytes read at a time
+    """
+
+    import hashlib
+    digest = hashlib.sha1()
+    with open(filename, "rb") as inputFile:
+        for block in iter(lambda: inputFile.read(blockSize), b""):
+            digest.update(block)
+            pass
+        pass
+
+    return digest.hexdigest()
+
+def getFileInfo(filename):
+    """
+    Returns a dictionary holding the size, modification time and sha1 digest
+    of filename
+
+    filename - path of the file
+    """
+
+    fileStat = os.stat(filename)
+    return { "size":fileStat.st_size, "mtime":fileStat.st_mtime, "hash":getFileDigest(filename) }
+
+def getManifestFilename(outputFile):
+    """
+    Returns the path of the manifest holding the entry of outputFile
+
+    outputFile - path of an output file
+    """
+
+    return os.path.join(os.path.dirname(os.path.abspath(outputFile)), manifestName)
+
+def loadManifest(outputFile):
+    """
+    Returns the manifest holding the entry of outputFile as a dictionary whose
+    keys are output file names, an empty dictionary if there is no (readable)
+    manifest
+
+    outputFile - path of an output file
+    """
+
+    try:
+        with open(getManifestFilename(outputFile), "r") as manifestFile:
+            return json.load(manifestFile)
+    except (IOError, ValueError):
+        return {}
+
+def getManifestEntry(outputFile):
+    """
+    Returns the manifest entry of outputFile, None if there is none
+
+    outputFile - path of an output file
+    """
+
+    return loadManifest(outputFile).get(os.path.basename(outputFile))
+
+def getTaskSignature(func, taskArgs, resultOptions=None, extraItems=()):
+    """
+    Returns a digest of the source code of the module defining func and of
+    the analysisModules, of the arguments func is called with and of
+    extraItems; any change in either gives a different signature.
+
+    Arguments holding options (e.g. an argparse namespace) are hashed through
+    the options of resultOptions only, an option missing from the namespace
+    taking its default value there; the same analysis requested by different
+    commands, whose namespaces hold different sets of options, then has the
+    same signature.  If resultOptions is None all options are hashed.
+
+    func          - function performing the task
+    taskArgs      - tuple of the arguments passed to func
+    resultOptions - dictionary of the names of the options which change the
+                    output of func and of the default func assumes for each
+    extraItems    - tuple of further inputs of the task which are not files,
+                    e.g. a digest of the calibration retrieved from the DB
+    """
+
+    import sys
+    from importlib import import_module
+    from gempython.gemplotting.utils.cacheutils import getDigest, getSourceVersion
+
+    listOfModules = [ sys.modules[func.__module__] ] + [ import_module(name) for name in analysisModules ]
+    listOfItems = [ func.__name__, getSourceVersion(listOfModules) ]
+    for arg in taskArgs:
+        if hasattr(arg, "__dict__"):
+            if resultOptions is None:
+                arg = sorted(vars(arg).iteritems())
+            else:
+                arg = sorted((key, getattr(arg, key, default)) for key, default in resultOptions.iteritems())
+        listOfItems.append(arg)
+        pass
+    listOfItems.extend(extraItems)
+
+    return getDigest(*listOfItems)
+
+def recordTask(inputFile, outputFile, status, elapsed=0., dependencies=(), signature=None, extraInfo=None):
+    """
+    Stores the entry of outputFile in its manifest, written with
+    cacheutils.writeAtomically().
+
+    inputFile    - path of the input file of the task
+    outputFile   - path of the output file of the task
+    status       - status of the task, e.g. "done" or "failed"
+    elapsed      - run time of the task in seconds
+    dependencies - paths of further files the output depends on, e.g. a
+                   calibration file; as for inputFile their digest is stored if
+                   status is "done"
+    signature    - signature of the task, see getTaskSignature()
+    extraInfo    - optional dictionary of additional (json serializable)
+                   information to store in the entry
+    """
+
+    import time
+    from gempython.gemplotting.utils.cacheutils import writeAtomically
+    entry = {
+            "input":os.path.abspath(inputFile),
+            "output":os.path.abspath(outputFile),
+            "status":status,
+            "elapsed":elapsed,
+            "completed":time.strftime("%Y.%m.%d.%H.%M.%S"),
+            "signature":signature,
+            "inputs":{}
+            }
+    if status == "done":
+        for filename in [inputFile] + list(dependencies):
+            try:
+                entry["inputs"][os.path.abspath(filename)] = getFileInfo(filename)
+            except (IOError, OSError):
+                pass
+            pass
+        pass
+    if extraInfo is not None:
+        entry.update(extraInfo)
+        pass
+
+    manifest = loadManifest(outputFile)
+    manifest[os.path.basename(outputFile)] = entry
+
+    manifestFilename = getManifestFilename(outputFile)
+    writeAtomically(manifestFilename, lambda manifestFile: json.dump(manifest, manifestFile, indent=1, sort_keys=True), mode="w")
+
+    return
+
+def isFileUnchanged(fileInfo, filename):
+    """
+    Returns True if filename is the same as the file described by fileInfo:
+    its size and modification time are compared first and the digest of its
+    content only if the modification time differs
+
+    fileInfo - dictionary returned by getFileInfo()
+    filename - path of the file
+    """
+
+    try:
+        fileStat = os.stat(filename)
+    except OSError:
+        return False
+
+    if fileInfo.get("size") != fileStat.st_size:
+        return False
+    elif fileInfo.get("mtime") == fileStat.st_mtime:
+        return True
+
+    return fileInfo.get("hash") == getFileDigest(filename)
+
+def isTaskDone(inputFile, outputFile, dependencies=(), signature=None):
+    """
+    Returns True if outputFile exists and is up to date: its manifest entry
+    records that it was successfully produced from inputFile and dependencies
+    as they are now, by a task with the same signature.  If outputFile has no
+    manifest entry it is up to date when it is more recent than all of its
+    inputs, as for make.
+
+    inputFile    - path of the input file of the task
+    outputFile   - path of the output file of the task
+    dependencies - paths of further files the output depends on
+    signature    - signature of the task, see getTaskSignature(), if None
+                   the signature is not compared
+    """
+
+    if not os.path.isfile(outputFile):
+        return False
+
+    listOfInputs = [ os.path.abspath(filename) for filename in [inputFile] + list(dependencies) ]
+    entry = getManifestEntry(outputFile)
+    if entry is None:
+        try:
+            outputMtime = os.path.getmtime(outputFile)
+            return all(os.path.getmtime(filename) <= outputMtime for filename in listOfInputs)
+        except OSError:
+            return False
+    elif entry.get("status") != "done" or entry.get("input") != listOfInputs[0]:
+        return False
+    elif signature is not None and entry.get("signature") != signature:
+        return False
+
+    dictOfInputs = entry.get("inputs", {})
+    if sorted(dictOfInputs.keys()) != sorted(listOfInputs):
+        return False
+
+    return all(isFileUnchanged(dictOfInputs[filename], filename) for filename in listOfInputs)
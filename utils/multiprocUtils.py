@@ -14,6 +14,38 @@ Documentation
 -------------
 """
 
+from collections import namedtuple
+
+#: Peak memory in MB assumed for a task whose peak memory has never been
+#: measured, see planWorkers()
+defaultTaskMemoryMB = 1500
+
+#: Name of the file, in the cache directory "multiprocUtils", holding the peak
+#: memory measured for the tasks of each analysis function
+peakMemoryFilename = "peakMemory.json"
+
+#: Data common to many tasks, e.g. channel mappings or calibrations as numpy
+#: arrays, loaded once by the process launching the tasks and handed to each
+#: worker process by the pool initializer of runTasks(), see initWorker().
+#: Keys are tuples whose first element names the kind of data, e.g.
+#: ("mapping", filename, isVFAT2), see anautilities.loadMapping()
+sharedData = {}
+
+#: Seconds a task of runTasks() may run beyond its timeout before its worker
+#: process is killed, e.g. when it is stuck in compiled code (such as ROOT)
+#: where the SIGALRM of runTask() is not delivered; also the time after which
+#: tasks which never started while no task is running are declared lost
+taskTimeoutGrace = 60
+
+#: Seconds between two checks of the running tasks by runTasks()
+taskPollInterval = 0.5
+
+#: multiprocessing SimpleQueue on which a worker of runTasks() announces the
+#: start of each task as (name, pid, start time), set by initWorker().  Unlike
+#: a Queue it has no feeder thread, the announcement is written before the
+#: task runs so that it is not lost if the worker dies
+taskStartQueue = None
+
 def redirectStdOutAndErr(callingFunc, outputDir):
     """
     If not the main porcess is not the process that is calling callingFunc
@@ -35,3 +67,473 @@ def redirectStdOutAndErr(callingFunc, outputDir):
         pass
 
     return
+
+#: A unit of work for runTasks(): func(*args) is called in a worker process.
+#: name identifies the task in the printout (e.g. the input file), func must
+#: be a module level function so that it can be pickled, and cost is an
+#: estimate of the run time in arbitrary units (e.g. the input file size);
+#: the tasks with the largest cost are started first.  inputFile and
+#: outputFile are the main input and output of the task and dependencies a
+#: list of further files the output depends on (e.g. a calibration file), used
+#: to record its completion, see gempython.gemplotting.utils.manifest
+AnalysisTask = namedtuple("AnalysisTask", ["name", "func", "args", "cost", "inputFile", "outputFile", "dependencies"])
+
+#: Outcome of an AnalysisTask as returned by runTasks(); status is one of
+#: "done", "failed", "timeout", "lost" (the worker died) or "interrupted", or
+#: "skipped" for a task which did not need to run, message is the traceback of
+#: a failed task, elapsed is its run time in s and peakMemory the peak resident
+#: memory of the worker process which ran it in MB (0 if it did not run)
+TaskResult = namedtuple("TaskResult", ["name", "status", "message", "elapsed", "peakMemory"])
+
+def getFileCost(filename):
+    """
+    Returns the size of filename in bytes to be used as the cost of an
+    AnalysisTask, or 0 if filename cannot be stat'ed
+
+    filename - path of the input file of the task
+    """
+
+    import os
+    try:
+        return os.path.getsize(filename)
+    except (OSError, TypeError):
+        return 0
+
+def readFirstLine(filename):
+    """
+    Returns the first line of filename stripped of whitespace, None if it
+    cannot be read; used for the files of /proc and /sys
+
+    filename - path of the file
+    """
+
+    try:
+        with open(filename, "r") as inputFile:
+            return inputFile.readline().strip()
+    except IOError:
+        return None
+
+def getAvailableCPUs():
+    """
+    Returns the number of CPUs this process may use: the number of CPUs of
+    the machine, limited to those of its CPU affinity mask and to its cgroup
+    CPU quota (cgroup v2 cpu.max or v1 cpu.cfs_quota_us), if any
+    """
+
+    from multiprocessing import cpu_count
+    try:
+        availableCPUs = cpu_count() # Docs say this may raise following exception: see https://docs.python.org/2/library/multiprocessing.html#miscellaneous
+    except NotImplementedError as err:
+        from gempython.utils.wrappers import runCommandWithOutput
+        availableCPUs = int(runCommandWithOutput('nproc').strip('\n'))
+
+    # CPU affinity, e.g. "Cpus_allowed_list:\t0-3,8"
+    try:
+        with open("/proc/self/status", "r") as statusFile:
+            for line in statusFile:
+                if line.startswith("Cpus_allowed_list:"):
+                    nAllowed = 0
+                    for cpuRange in line.split(":")[1].strip().split(","):
+                        bounds = cpuRange.split("-")
+                        nAllowed += int(bounds[-1]) - int(bounds[0]) + 1
+                        pass
+                    availableCPUs = min(availableCPUs, nAllowed)
+                    break
+                pass
+            pass
+    except (IOError, ValueError):
+        pass
+
+    # cgroup CPU quota, e.g. "200000 100000" for 2 CPUs or "max 100000" for no limit
+    cpuMax = readFirstLine("/sys/fs/cgroup/cpu.max")
+    if cpuMax is not None:
+        quota, period = (cpuMax.split() + [None])[:2]
+    else:
+        quota = readFirstLine("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        period = readFirstLine("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        pass
+    try:
+        if int(quota) > 0 and int(period) > 0:
+            availableCPUs = min(availableCPUs, max(1, int(quota) // int(period)))
+    except (TypeError, ValueError): # no quota
+        pass
+
+    return availableCPUs
+
+def getAvailableMemory():
+    """
+    Returns the memory in MB which can be allocated without swapping: the
+    MemAvailable of /proc/meminfo, limited to the room left below the cgroup
+    memory limit (cgroup v2 memory.max or v1 memory.limit_in_bytes), if any.
+    Returns None if it cannot be determined.
+    """
+
+    availableMemory = None
+    try:
+        with open("/proc/meminfo", "r") as meminfoFile:
+            for line in meminfoFile:
+                if line.startswith("MemAvailable:"):
+                    availableMemory = int(line.split()[1]) / 1024. # kB
+                    break
+                pass
+            pass
+    except (IOError, ValueError):
+        pass
+
+    memLimit = readFirstLine("/sys/fs/cgroup/memory.max")
+    if memLimit is not None:
+        memUsage = readFirstLine("/sys/fs/cgroup/memory.current")
+    else:
+        memLimit = readFirstLine("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+        memUsage = readFirstLine("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+        pass
+    try:
+        cgroupMemory = (int(memLimit) - int(memUsage)) / (1024. * 1024.)
+        if cgroupMemory > 0 and (availableMemory is None or cgroupMemory < availableMemory):
+            availableMemory = cgroupMemory
+    except (TypeError, ValueError): # no limit
+        pass
+
+    return availableMemory
+
+def getFuncName(func):
+    """
+    Returns the full name of func, e.g. "gempython.gemplotting.utils.scurveAlgos.anaUltraScurve"
+
+    func - module level function
+    """
+
+    return "{0}.{1}".format(func.__module__, func.__name__)
+
+def loadPeakMemory():
+    """
+    Returns the dictionary of the peak memory in MB measured for the tasks of
+    each analysis function, see getFuncName() for the keys and
+    recordPeakMemory().  Returns an empty dictionary if nothing was recorded.
+    """
+
+    import json, os
+    from gempython.gemplotting.utils.cacheutils import getCacheDir
+    try:
+        with open(os.path.join(getCacheDir("multiprocUtils"), peakMemoryFilename), "r") as peakMemoryFile:
+            return json.load(peakMemoryFile)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def recordPeakMemory(listOfTasks, listOfResults):
+    """
+    Stores, for each analysis function of listOfTasks, the largest peak memory
+    of its completed tasks in listOfResults; it is used by planWorkers() to
+    size the next pool.  The previous value is replaced so that it follows
+    changes of the analysis code.
+
+    listOfTasks   - list of AnalysisTask
+    listOfResults - list of TaskResult returned by runTasks()
+    """
+
+    dictOfFuncNames = dict((task.name, getFuncName(task.func)) for task in listOfTasks)
+    dictOfPeaks = {}
+    for result in listOfResults:
+        if result.status == "done" and result.peakMemory > 0:
+            funcName = dictOfFuncNames[result.name]
+            dictOfPeaks[funcName] = max(dictOfPeaks.get(funcName, 0), result.peakMemory)
+            pass
+        pass
+    if len(dictOfPeaks) == 0:
+        return
+
+    import json, os
+    from gempython.gemplotting.utils.cacheutils import getCacheDir, writeAtomically
+    peakMemory = loadPeakMemory()
+    peakMemory.update(dictOfPeaks)
+
+    peakMemoryPath = os.path.join(getCacheDir("multiprocUtils"), peakMemoryFilename)
+    writeAtomically(peakMemoryPath, lambda peakMemoryFile: json.dump(peakMemory, peakMemoryFile, indent=1, sort_keys=True), mode="w")
+
+    return
+
+def initWorker(dictOfSharedData, startQueue=None):
+    """
+    Initializer of the worker processes of runTasks(): makes the worker
+    ignore KeyboardInterrupt, see anautilities.init_worker(), and stores
+    dictOfSharedData in its sharedData
+
+    dictOfSharedData - sharedData of the process launching the tasks
+    startQueue       - multiprocessing SimpleQueue on which runTask() announces
+                       the start of each task, see taskStartQueue
+    """
+
+    global taskStartQueue
+    from gempython.gemplotting.utils.anautilities import init_worker
+    init_worker()
+    sharedData.update(dictOfSharedData)
+    taskStartQueue = startQueue
+
+    return
+
+def planWorkers(listOfTasks, maxWorkers, explicit=False):
+    """
+    Returns the number of worker processes to run listOfTasks with, and
+    prints how it was chosen.  This is the smallest of:
+
+        - maxWorkers, e.g. returned by anautilities.getNumCores2Use(),
+        - the number of CPUs not busy with other work, see getAvailableCPUs()
+          and os.getloadavg(),
+        - the number of tasks, and
+        - the available memory divided by the peak memory of one task, as
+          measured by the previous run of the same analysis, see
+          recordPeakMemory(), or defaultTaskMemoryMB if it was never measured.
+
+    If explicit is True maxWorkers was requested by the user; only the number
+    of tasks then limits it, and a warning is printed if the memory seems
+    too small.
+
+    listOfTasks - list of AnalysisTask
+    maxWorkers  - largest number of worker processes to use
+    explicit    - True if maxWorkers must be used even if the load or the
+                  available memory suggest fewer workers
+    """
+
+    import os
+    from gempython.utils.gemlogger import printYellow
+
+    dictOfLimits = { "requested" if explicit else "cpu usage":maxWorkers, "tasks":len(listOfTasks) }
+
+    if not explicit:
+        availableCPUs = getAvailableCPUs()
+        try:
+            dictOfLimits["idle cpus"] = max(1, availableCPUs - int(round(os.getloadavg()[0])))
+        except OSError:
+            dictOfLimits["idle cpus"] = availableCPUs
+        pass
+
+    availableMemory = getAvailableMemory()
+    memoryLimit = None
+    if availableMemory is not None and len(listOfTasks) > 0:
+        peakMemory = loadPeakMemory()
+        taskMemory = max(peakMemory.get(getFuncName(task.func), defaultTaskMemoryMB) for task in listOfTasks)
+        memoryLimit = max(1, int(availableMemory // taskMemory))
+        memoryInfo = "{0:.0f} MB available / {1:.0f} MB per task".format(availableMemory, taskMemory)
+        pass
+
+    nWorkers = max(1, min(dictOfLimits.values()))
+    if memoryLimit is not None:
+        dictOfLimits["memory"] = memoryLimit
+        if explicit and memoryLimit < nWorkers:
+            printYellow("{0} workers requested but the memory ({1}) only allows {2}".format(nWorkers, memoryInfo, memoryLimit))
+        elif not explicit:
+            nWorkers = max(1, min(nWorkers, memoryLimit))
+        pass
+
+    print("Running {0} tasks on {1} worker processes, limits: {2}{3}".format(
+        len(listOfTasks),
+        nWorkers,
+        ", ".join("{0} {1}".format(key, value) for key, value in sorted(dictOfLimits.iteritems())),
+        "" if memoryLimit is None else " ({0})".format(memoryInfo)))
+
+    return nWorkers
+
+def runTask(inputs):
+    """
+    Runs the AnalysisTask inputs[0] in a worker process, with a timeout of
+    inputs[1] seconds (None for no timeout).  Exceptions are caught so that
+    they never reach the pool; returns a TaskResult.
+
+    Note the timeout is implemented with SIGALRM, code running in a compiled
+    library is only interrupted once it returns to python; runTasks() kills
+    the worker if it is still busy taskTimeoutGrace seconds later.
+    """
+
+    task, timeout = inputs
+
+    import os, resource, signal, time, traceback
+    from gempython.gemplotting.utils.exceptions import TaskTimeout
+    def onTimeout(signum, frame):
+        raise TaskTimeout("Task {0} did not finish within {1} s".format(task.name, timeout), os.EX_SOFTWARE)
+
+    def getPeakMemory():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024. # kB on linux
+
+    startTime = time.time()
+    if taskStartQueue is not None:
+        taskStartQueue.put((task.name, os.getpid(), startTime))
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, onTimeout)
+        signal.alarm(int(timeout))
+        pass
+    try:
+        task.func(*task.args)
+    except TaskTimeout:
+        return TaskResult(task.name, "timeout", traceback.format_exc(), time.time()-startTime, getPeakMemory())
+    except: # catch *all* exceptions, including sys.exit() from the analysis
+        return TaskResult(task.name, "failed", traceback.format_exc(), time.time()-startTime, getPeakMemory())
+    finally:
+        if timeout is not None:
+            signal.alarm(0)
+            pass
+        pass
+
+    return TaskResult(task.name, "done", "", time.time()-startTime, getPeakMemory())
+
+def runTasks(listOfTasks, nWorkers, timeout=None, debug=False, onResult=None):
+    """
+    Runs the AnalysisTask's of listOfTasks on a pool of nWorkers processes and
+    returns the list of their TaskResult's, in order of completion.
+
+    Tasks are submitted one per apply_async, largest cost first, so that a
+    long task does not hold back the others.  A task which raises an exception
+    or exceeds timeout is recorded as such while the others keep running.
+    Each worker announces when it starts a task, see runTask(), so the
+    deadline of every task runs from its own start: a task still running
+    taskTimeoutGrace seconds after its timeout (e.g. stuck in ROOT, where
+    SIGALRM is not delivered) has its worker killed and is recorded as a
+    timeout, and a task whose worker died is recorded as lost.  The pool
+    replaces such workers and the other tasks are not affected.
+
+    A worker may also die before announcing its task, e.g. while receiving
+    it.  As a fallback the tasks which did not start are recorded as lost
+    when no task has been running nor started for taskTimeoutGrace seconds,
+    and, with a timeout, all remaining tasks are recorded as lost once the
+    time to run every task one after the other at its maximum has elapsed.
+
+    The peak memory of the completed tasks is recorded for the next call of
+    planWorkers().  The workers receive the content of sharedData, see
+    initWorker().
+
+    listOfTasks - list of AnalysisTask
+    nWorkers    - number of worker processes, see planWorkers()
+    timeout     - maximum run time of each task in seconds, None or 0 for no limit
+    debug       - prints the traceback of each failed task
+    onResult    - optional function called in the calling process as
+                  onResult(task, result) as soon as each task completes,
+                  e.g. to record its completion
+    """
+
+    import os, signal, time
+    from gempython.utils.gemlogger import printGreen, printRed
+    from multiprocessing import Pool
+    from multiprocessing.queues import SimpleQueue
+
+    if not timeout:
+        timeout = None
+    listOfTasks = sorted(listOfTasks, key=lambda task: task.cost, reverse=True)
+    dictOfTasks = dict((task.name, task) for task in listOfTasks)
+    nWorkers = max(1, min(nWorkers, len(listOfTasks)))
+    startQueue = SimpleQueue()
+    pool = Pool(nWorkers, initializer=initWorker, initargs=(sharedData, startQueue))
+
+    runStart = time.time()
+    runDeadline = None if timeout is None else runStart + len(listOfTasks) * (timeout + taskTimeoutGrace)
+    listOfResults = []
+    nAbandoned = 0 # tasks whose result will never reach the pool
+    try:
+        dictOfPending = dict((task.name, pool.apply_async(runTask, [ (task, timeout) ])) for task in listOfTasks)
+        dictOfStarts = {} # name: (pid, start time)
+        dictOfCurrent = {} # pid: name of the last task started by this worker
+        lastActivity = runStart
+        while len(dictOfPending) > 0:
+            # Workers seen dead here announced all their tasks before the queue is drained
+            listOfAlivePIDs = [ worker.pid for worker in pool._pool if worker.is_alive() ]
+            while not startQueue.empty():
+                name, pid, startTime = startQueue.get()
+                dictOfStarts[name] = (pid, startTime)
+                dictOfCurrent[pid] = name
+                lastActivity = time.time()
+                pass
+
+            now = time.time()
+            isIdle = not any(name in dictOfStarts and dictOfStarts[name][0] in listOfAlivePIDs for name in dictOfPending)
+            isLate = (runDeadline is not None) and (now > runDeadline)
+            for name in sorted(dictOfPending, key=lambda name: dictOfTasks[name].cost, reverse=True):
+                asyncResult = dictOfPending[name]
+                if asyncResult.ready():
+                    result = asyncResult.get()
+                elif name not in dictOfStarts:
+                    if not (isLate or (isIdle and now - lastActivity > taskTimeoutGrace)):
+                        continue
+                    result = TaskResult(name, "lost", "Task never started, its worker died before announcing it", 0., 0.)
+                    nAbandoned += 1
+                else:
+                    pid, startTime = dictOfStarts[name]
+                    elapsed = now - startTime
+                    if dictOfCurrent[pid] != name or asyncResult.ready():
+                        continue # completed, its result is on its way
+                    elif pid not in listOfAlivePIDs:
+                        result = TaskResult(name, "lost", "Worker process {0} died".format(pid), elapsed, 0.)
+                    elif isLate or ((timeout is not None) and (elapsed > timeout + taskTimeoutGrace)):
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except OSError:
+                            pass
+                        result = TaskResult(name, "timeout", "Worker process {0} killed after {1:.0f} s".format(pid, elapsed), elapsed, 0.)
+                    else:
+                        continue
+                    nAbandoned += 1
+                    pass
+                del dictOfPending[name]
+                lastActivity = now
+
+                listOfResults.append(result)
+                if onResult is not None:
+                    onResult(dictOfTasks[result.name], result)
+
+                msg = "[{0}/{1}] {2}: {3} after {4:.0f} s".format(len(listOfResults), len(listOfTasks), result.name, result.status, result.elapsed)
+                if result.status == "done":
+                    printGreen(msg)
+                else:
+                    printRed(msg)
+                    if debug:
+                        print(result.message)
+                    pass
+                pass
+
+            if len(dictOfPending) > 0:
+                time.sleep(taskPollInterval)
+            pass
+    except KeyboardInterrupt:
+        printRed("Caught KeyboardInterrupt, terminating workers")
+        pool.terminate()
+        status = "interrupted"
+    else:
+        # The pool waits forever for the results of killed or dead workers, all other tasks are done
+        if nAbandoned > 0:
+            pool.terminate()
+        else:
+            pool.close()
+        status = None
+    pool.join()
+
+    if status is not None:
+        listOfDoneNames = set(result.name for result in listOfResults)
+        listOfResults.extend(TaskResult(task.name, status, "", 0., 0.) for task in listOfTasks if task.name not in listOfDoneNames)
+        pass
+
+    try:
+        recordPeakMemory(listOfTasks, listOfResults)
+    except (IOError, OSError) as err:
+        printRed("Unable to record the peak memory of the tasks: {0}".format(err))
+        pass
+
+    return listOfResults
+
+def printTaskSummary(listOfResults):
+    """
+    Prints the number of tasks of listOfResults per status, and the name of
+    those that did not complete.  Returns True if all tasks completed.
+
+    listOfResults - list of TaskResult, e.g. returned by runTasks()
+    """
+
+    from gempython.utils.gemlogger import printGreen, printRed
+
+    listOfFailed = [ result for result in listOfResults if result.status not in ("done", "skipped") ]
+    if len(listOfFailed) == 0:
+        printGreen("Analysis Completed Successfully ({0} tasks)".format(len(listOfResults)))
+        return True
+
+    printRed("Analysis Failed for {0} of {1} tasks:".format(len(listOfFailed), len(listOfResults)))
+    for result in listOfFailed:
+        printRed("\t{0}: {1}".format(result.name, result.status))
+        pass
+
+    return False
@@ -0,0 +1,391 @@
+r"""
+``scancatalog`` --- Catalog of the scans stored under $DATA_PATH
+================================================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.utils.scancatalog
+
+Keeps an SQLite catalog of the scandate directories found under
+:envvar:`DATA_PATH`, so that finding the scandates of a chamber, or checking
+that a scan exists, does not require listing the directory and probing every
+scandate.  Each entry records the chamber, the analysis type (a key of
+``ana_config`` from :py:mod:`gempython.gemplotting.utils.anaInfo`), the
+scandate, the raw and analyzed files with their size and modification time and
+the analysis status, see :py:func:`getScanStatus`.
+
+The catalog is stored in ``$DATA_PATH/.scanCatalog.sqlite`` unless the
+environment variable ``GEM_SCAN_CATALOG`` points somewhere else.
+
+The catalog is kept up to date in three ways:
+
+    - every query first compares the modification time of the directory
+      holding the scandates to the one recorded, and only lists it again when
+      a scandate was added or removed; this is done once per directory and
+      process,
+    - ``ana_scans.py`` updates the entries of the scans it analyzed, see
+      :py:func:`updateScan`,
+    - ``ana_scans.py rescan`` refreshes all entries, see
+      :py:func:`rescanCatalog`.
+
+Answers that are negative according to the catalog are always cross-checked
+on the filesystem, a file written since the last update is therefore never
+missed.  If the catalog cannot be opened (e.g. $DATA_PATH is read-only) all
+queries fall back to the filesystem.
+
+Documentation
+-------------
+"""
+
+from gempython.utils.gemlogger import printYellow
+
+import os
+import sqlite3
+
+#: Keys of ``tree_names`` from :py:mod:`gempython.gemplotting.utils.anaInfo`
+#: giving the raw and analyzed file of each cataloged analysis type; None if
+#: the scandate directory has no single such file
+scanFileTypes = {
+        "latency":("latency","latencyAna"),
+        "sbitRatech":("sbitRatech",None),
+        "sbitRateor":("sbitRateor",None),
+        "scurve":("scurve","scurveAna"),
+        "thresholdch":("thresholdch","thresholdAna"),
+        "thresholdvftrig":("thresholdvftrig","thresholdAna"),
+        "thresholdvftrk":("thresholdvftrk","thresholdAna"),
+        "trim":("trim","trimAna"),
+        "trimV3":(None,None),
+        "iterTrim":(None,None)
+        }
+
+#: Directories validated by syncDirectory() in this process
+validatedDirs = set()
+
+def getCatalogPath():
+    """
+    Returns the path of the catalog file
+    """
+
+    from gempython.gemplotting.utils.anautilities import getDataPath
+    return os.getenv("GEM_SCAN_CATALOG", os.path.join(getDataPath(), ".scanCatalog.sqlite"))
+
+def openCatalog():
+    """
+    Returns the sqlite3 connection of this process to the catalog, creating
+    the catalog if needed, or None if it cannot be opened, see
+    cacheutils.getProcessConnection()
+    """
+
+    def initCatalog(db):
+        db.row_factory = sqlite3.Row
+        db.execute("CREATE TABLE IF NOT EXISTS scanDirs (parentDir TEXT PRIMARY KEY, mtime REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS scans ("
+                "parentDir TEXT, scandate TEXT, chamber TEXT, anaType TEXT, "
+                "rawFile TEXT, rawSize INTEGER, rawMtime REAL, "
+                "anaFile TEXT, anaSize INTEGER, anaMtime REAL, "
+                "status TEXT, PRIMARY KEY (parentDir, scandate))")
+
+    from gempython.gemplotting.utils.cacheutils import getProcessConnection
+    return getProcessConnection(getCatalogPath(), initCatalog, "the scan catalog")
+
+def isScandate(name):
+    """
+    Returns True if name looks like a scandate, i.e. YYYY.MM.DD.hh.mm
+
+    name - name of a directory
+    """
+
+    fields = name.split(".")
+    return len(fields) == 5 and all(field.isdigit() for field in fields)
+
+def identifyDirectory(parentDir):
+    """
+    Returns a tuple (chamber, anaType) such that getDirByAnaType(anaType, chamber)
+    is parentDir; either entry is None if it cannot be determined
+
+    parentDir - directory holding scandate directories
+    """
+
+    from gempython.gemplotting.utils.anautilities import getDataPath, getDirByAnaType
+    parentDir = os.path.normpath(parentDir)
+    relPath = os.path.relpath(parentDir, os.path.normpath(getDataPath()))
+    if relPath.startswith(os.pardir):
+        return (None, None)
+
+    chamber = relPath.split(os.sep)[0]
+    for anaType in scanFileTypes:
+        if os.path.normpath(getDirByAnaType(anaType, chamber)) == parentDir:
+            return (chamber, anaType)
+        pass
+
+    return (chamber, None)
+
+def getScanFileNames(anaType):
+    """
+    Returns a tuple (rawFile, anaFile) of the names of the raw and analyzed
+    files inside a scandate directory of anaType; either entry is None if
+    unknown
+
+    anaType - key of scanFileTypes
+    """
+
+    from gempython.gemplotting.utils.anaInfo import tree_names
+    if anaType not in scanFileTypes:
+        return (None, None)
+
+    return tuple(tree_names[fileType][0] if fileType is not None else None for fileType in scanFileTypes[anaType])
+
+def getScanStatus(rawMtime, anaMtime):
+    """
+    Returns the analysis status of a scan given the modification times of its
+    raw and analyzed files (None if missing): "analyzed", "outdated" if the
+    analyzed file is older than the raw file, "raw" if there is no analyzed
+    file, or "unknown"
+    """
+
+    if anaMtime is not None and rawMtime is not None:
+        return "analyzed" if anaMtime >= rawMtime else "outdated"
+    elif anaMtime is not None:
+        return "analyzed"
+    elif rawMtime is not None:
+        return "raw"
+    return "unknown"
+
+def recordScan(db, parentDir, scandate, chamber=None, anaType=None):
+    """
+    Stats the files of parentDir/scandate and stores them in the catalog, the
+    entry is removed if the directory does not exist.  Nothing is committed.
+
+    db        - connection returned by openCatalog()
+    parentDir - directory holding scandate directories
+    scandate  - name of the scandate directory
+    chamber   - detector serial number, see identifyDirectory()
+    anaType   - key of scanFileTypes, see identifyDirectory()
+    """
+
+    scanDir = os.path.join(parentDir, scandate)
+    if not os.path.isdir(scanDir):
+        db.execute("DELETE FROM scans WHERE parentDir=? AND scandate=?", (parentDir, scandate))
+        return
+
+    def statFile(fileName):
+        if fileName is None:
+            return (None, None)
+        try:
+            fileStat = os.stat(os.path.join(scanDir, fileName))
+        except OSError:
+            return (None, None)
+        return (fileStat.st_size, fileStat.st_mtime)
+
+    rawFile, anaFile = getScanFileNames(anaType)
+    rawSize, rawMtime = statFile(rawFile)
+    anaSize, anaMtime = statFile(anaFile)
+    db.execute("INSERT OR REPLACE INTO scans VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            (parentDir, scandate, chamber, anaType,
+                rawFile, rawSize, rawMtime, anaFile, anaSize, anaMtime,
+                getScanStatus(rawMtime, anaMtime)))
+
+    return
+
+def rescanDirectory(db, parentDir, refresh=False):
+    """
+    Lists parentDir and updates the catalog entries of its scandates.  Entries
+    of scandates that disappeared are removed; existing entries are only
+    updated if refresh is True.  Nothing is committed.
+
+    db        - connection returned by openCatalog()
+    parentDir - normalized path of a directory holding scandate directories
+    refresh   - if True the files of all scandates are stat'ed again
+    """
+
+    try:
+        dirMtime = os.stat(parentDir).st_mtime
+        listOfScandates = [ name for name in os.listdir(parentDir) if isScandate(name) ]
+    except OSError:
+        db.execute("DELETE FROM scans WHERE parentDir=?", (parentDir,))
+        db.execute("DELETE FROM scanDirs WHERE parentDir=?", (parentDir,))
+        return
+
+    chamber, anaType = identifyDirectory(parentDir)
+    knownScandates = set(row["scandate"] for row in db.execute("SELECT scandate FROM scans WHERE parentDir=?", (parentDir,)))
+    for scandate in knownScandates.difference(listOfScandates):
+        db.execute("DELETE FROM scans WHERE parentDir=? AND scandate=?", (parentDir, scandate))
+        pass
+    for scandate in listOfScandates:
+        if refresh or scandate not in knownScandates:
+            recordScan(db, parentDir, scandate, chamber, anaType)
+        pass
+    db.execute("INSERT OR REPLACE INTO scanDirs VALUES (?,?)", (parentDir, dirMtime))
+
+    return
+
+def syncDirectory(parentDir):
+    """
+    Makes sure the catalog entries of parentDir are up to date and returns the
+    catalog connection, or None if the catalog is not available.  parentDir is
+    listed again only if its modification time changed since it was last
+    cataloged; this check is done once per process.
+
+    parentDir - normalized path of a directory holding scandate directories
+    """
+
+    db = openCatalog()
+    if db is None or parentDir in validatedDirs:
+        return db
+
+    try:
+        try:
+            dirMtime = os.stat(parentDir).st_mtime
+        except OSError:
+            dirMtime = None
+        row = db.execute("SELECT mtime FROM scanDirs WHERE parentDir=?", (parentDir,)).fetchone()
+        if row is None or row["mtime"] != dirMtime:
+            rescanDirectory(db, parentDir)
+            db.commit()
+            pass
+    except sqlite3.Error as err:
+        printYellow("Unable to update the scan catalog for {0}: {1}; falling back to the filesystem".format(parentDir, err))
+        return None
+
+    validatedDirs.add(parentDir)
+    return db
+
+def listScandates(parentDir):
+    """
+    Returns the sorted list of scandates found in parentDir
+
+    parentDir - directory holding scandate directories, e.g. as returned by
+                getDirByAnaType()
+    """
+
+    parentDir = os.path.normpath(parentDir)
+    db = syncDirectory(parentDir)
+    if db is None:
+        return sorted(name for name in os.listdir(parentDir) if isScandate(name))
+
+    return [ row["scandate"] for row in db.execute("SELECT scandate FROM scans WHERE parentDir=? ORDER BY scandate", (parentDir,)) ]
+
+def getScan(parentDir, scandate):
+    """
+    Returns the catalog entry of parentDir/scandate as a dictionary with the
+    columns of the catalog as keys, or None if there is no such entry
+
+    parentDir - directory holding scandate directories
+    scandate  - name of the scandate directory
+    """
+
+    parentDir = os.path.normpath(parentDir)
+    db = syncDirectory(parentDir)
+    if db is None:
+        return None
+
+    row = db.execute("SELECT * FROM scans WHERE parentDir=? AND scandate=?", (parentDir, scandate)).fetchone()
+    return dict(zip(row.keys(), row)) if row is not None else None
+
+def scanExists(parentDir, scandate):
+    """
+    Returns True if parentDir/scandate exists, looking it up in the catalog
+    first when scandate is a scandate
+
+    parentDir - directory holding scandate directories
+    scandate  - name of the scandate directory (or of any other path inside
+                parentDir, which is then checked on the filesystem)
+    """
+
+    if isScandate(scandate) and getScan(parentDir, scandate) is not None:
+        return True
+
+    return os.path.exists(os.path.join(parentDir, scandate))
+
+def scanFileExists(parentDir, scandate, fileName):
+    """
+    Returns True if parentDir/scandate/fileName is a file, looking it up in the
+    catalog first if fileName is the raw or analyzed file of the scan.  A file
+    found on the filesystem but missing from the catalog updates the catalog.
+
+    parentDir - directory holding scandate directories
+    scandate  - name of the scandate directory
+    fileName  - path of the file inside the scandate directory
+    """
+
+    entry = getScan(parentDir, scandate) if isScandate(scandate) else None
+    if entry is not None:
+        if fileName == entry["rawFile"] and entry["rawSize"] is not None:
+            return True
+        elif fileName == entry["anaFile"] and entry["anaSize"] is not None:
+            return True
+        pass
+
+    if not os.path.isfile(os.path.join(parentDir, scandate, fileName)):
+        return False
+
+    if entry is not None and fileName in (entry["rawFile"], entry["anaFile"]):
+        updateScan(os.path.join(parentDir, scandate))
+    return True
+
+def updateScan(scanDir):
+    """
+    Updates the catalog entry of the scandate directory scanDir, e.g. once it
+    has been analyzed.  Nothing is done if scanDir is not a scandate directory.
+
+    scanDir - path of the scandate directory
+    """
+
+    scanDir = os.path.normpath(scanDir)
+    parentDir, scandate = os.path.split(scanDir)
+    if not isScandate(scandate):
+        return
+
+    db = syncDirectory(parentDir)
+    if db is None:
+        return
+
+    try:
+        chamber, anaType = identifyDirectory(parentDir)
+        recordScan(db, parentDir, scandate, chamber, anaType)
+        db.commit()
+    except sqlite3.Error as err:
+        printYellow("Unable to update the scan catalog for {0}: {1}".format(scanDir, err))
+        pass
+
+    return
+
+def rescanCatalog(listOfChambers=None, listOfAnaTypes=None, debug=False):
+    """
+    Lists the scandate directories of each chamber and analysis type under
+    $DATA_PATH and refreshes all their catalog entries.  Returns the number of
+    scans in the catalog for these directories.
+
+    listOfChambers - list of detector serial numbers, if None all directories
+                     of $DATA_PATH are considered
+    listOfAnaTypes - list of keys of scanFileTypes, if None all are considered
+    debug          - prints each directory that is cataloged
+    """
+
+    from gempython.gemplotting.utils.anautilities import getDataPath, getDirByAnaType
+    dataPath = getDataPath()
+    if listOfChambers is None:
+        listOfChambers = sorted(name for name in os.listdir(dataPath) if os.path.isdir(os.path.join(dataPath, name)))
+    if listOfAnaTypes is None:
+        listOfAnaTypes = sorted(scanFileTypes.keys())
+
+    db = openCatalog()
+    if db is None:
+        raise IOError("rescanCatalog(): Unable to open the scan catalog {0}".format(getCatalogPath()))
+
+    nScans = 0
+    for chamber in listOfChambers:
+        for anaType in listOfAnaTypes:
+            parentDir = os.path.normpath(getDirByAnaType(anaType, chamber))
+            if not os.path.isdir(parentDir):
+                continue
+            if debug:
+                print("Cataloging {0}".format(parentDir))
+            rescanDirectory(db, parentDir, refresh=True)
+            db.commit()
+            validatedDirs.add(parentDir)
+            nScans += db.execute("SELECT COUNT(*) FROM scans WHERE parentDir=?", (parentDir,)).fetchone()[0]
+            pass
+        pass
+
+    return nScans
@@ -0,0 +1,122 @@
+r"""
+``scanresults`` --- Columnar copies of analysis results
+=======================================================
+
+.. code-block:: python
+
+    import gempython.gemplotting.utils.scanresults
+
+The analysis tools store their per channel (or per VFAT) results in a ``TTree``
+of the output ``TFile``.  Next to each of these a columnar copy of the scalar
+branches is written as a ``.npy`` file holding a numpy structured array, see
+:py:func:`getColumnarFilename`.  Such a file can be memory mapped, so reading a
+few columns from many scandates does not require opening every ``TFile``.
+
+Readers should use :py:func:`readScanResults` which prefers the columnar copy
+and falls back to the ``TTree`` when the copy is missing, older than the
+``TFile`` or lacks one of the requested branches.  As the copy never holds the
+branches storing python objects, reading all branches always uses the
+``TTree``.
+
+Documentation
+-------------
+"""
+
+import os
+import numpy as np
+
+def getColumnarFilename(rootFilename, treeName):
+    """
+    Returns the path of the columnar copy of treeName in rootFilename, e.g.
+    "/path/SCurveFitData_scurveFitTree.npy" for "/path/SCurveFitData.root"
+
+    rootFilename - path of the TFile
+    treeName     - name of the TTree inside rootFilename
+    """
+
+    baseName = rootFilename[:-len(".root")] if rootFilename.endswith(".root") else rootFilename
+    return "{0}_{1}.npy".format(baseName, treeName)
+
+def writeColumnarFile(rootFilename, treeName, array):
+    """
+    Writes the fields of the numpy structured array which do not hold python
+    objects (e.g. detName) as the columnar copy of treeName in rootFilename.
+    The file is written with cacheutils.writeAtomically().  Returns the path
+    of the written file.
+
+    This should be called once rootFilename has been closed, the copy is only
+    used while it is at least as recent as rootFilename.
+
+    rootFilename - path of the TFile
+    treeName     - name of the TTree inside rootFilename
+    array        - numpy structured array, e.g. as returned by root_numpy.tree2array
+    """
+
+    listOfFields = [ name for name in array.dtype.names if not array.dtype[name].hasobject ]
+    columns = np.zeros(len(array), dtype=[ (name, array.dtype[name]) for name in listOfFields ])
+    for name in listOfFields:
+        columns[name] = array[name]
+        pass
+
+    from gempython.gemplotting.utils.cacheutils import writeAtomically
+    columnarFilename = getColumnarFilename(rootFilename, treeName)
+    writeAtomically(columnarFilename, lambda columnarFile: np.save(columnarFile, columns))
+
+    return columnarFilename
+
+def makeColumnarFile(rootFilename, treeName):
+    """
+    Reads treeName from rootFilename and writes its columnar copy, see
+    writeColumnarFile().  Returns the path of the written file.
+
+    rootFilename - path of the TFile
+    treeName     - name of the TTree inside rootFilename
+    """
+
+    import root_numpy as rp
+    return writeColumnarFile(rootFilename, treeName, rp.root2array(rootFilename, treename=treeName))
+
+def hasColumnarFile(rootFilename, treeName):
+    """
+    Returns True if the columnar copy of treeName in rootFilename exists and is
+    at least as recent as rootFilename
+
+    rootFilename - path of the TFile
+    treeName     - name of the TTree inside rootFilename
+    """
+
+    try:
+        return os.path.getmtime(getColumnarFilename(rootFilename, treeName)) >= os.path.getmtime(rootFilename)
+    except OSError:
+        return False
+
+def readScanResults(rootFilename, treeName, branches=None):
+    """
+    Returns a numpy structured array holding branches of treeName in
+    rootFilename.  The columnar copy is used, memory mapped, if it is up to
+    date and holds all requested branches, see hasColumnarFile(); otherwise the
+    TTree is read with root_numpy.root2array.  Either way the returned array
+    has exactly the requested fields.
+
+    Raises IOError if rootFilename (or treeName inside it) cannot be read and
+    ValueError if one of the branches does not exist, as root_numpy does.
+
+    rootFilename - path of the TFile
+    treeName     - name of the TTree inside rootFilename
+    branches     - list of branch names to read, if None all branches are read
+                   from the TTree since the columnar copy lacks the branches
+                   holding python objects, e.g. detName
+    """
+
+    if (branches is not None) and hasColumnarFile(rootFilename, treeName):
+        columns = np.load(getColumnarFilename(rootFilename, treeName), mmap_mode='r')
+        if all(name in columns.dtype.names for name in branches):
+            array = np.zeros(len(columns), dtype=[ (name, columns.dtype[name]) for name in branches ])
+            for name in branches:
+                array[name] = columns[name]
+                pass
+            return array
+        pass
+
+    import root_numpy as rp
+    return rp.root2array(rootFilename, treename=treeName, branches=branches)
@@ -36,11 +36,18 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
     debug - If true additional debugging information will be printed
     doNotFit - If true the scurves will not be fit; this will reduce the analysis tiem and output information
     maxChi2 - Max acceptable chi2 in scurve fits
+    fitBackend - Engine used to fit the scurves, one of anaInfo.fitBackends
+    fitWorkers - Number of processes used to fit the scurves, 0 uses all available cores
+    seed - Seed of the scurve fits, if None a time based seed is used and results are not reproducible
+    noCache - If true fit results are neither taken from nor stored in the on-disk fit cache
+    rebuildCache - If true the scurves are always fit and the fit cache entry is replaced
     drawbad - If true scurve fits with chi2 values less than 1 or greater than 1000 will be drawn on a separate TCanvas
     extChanMapping - Name of externally supplied file that specifies the ROBstr:PanPin:vfatCH mapping
     isVFAT2 - If true the data is understood as coming from VFAT2
     PanPin - If true output plots are made vs. PanPin
     outfilename - Name of outputfilename that will be used
+    slim - If true the scurve histograms and fits are stored as arrays rather than TObjects, see writeScurveFitTree()
+    remaskOnly - If true the scurves are not analyzed, instead the channel masks of the existing output file outputDir/outfilename are recomputed with the current cuts, see remaskUltraScurve()
 
     Returns a structured numpy array with the following dnames
 
@@ -54,7 +61,7 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
     vfatList - List of VFAT positions to consider in the analysis, if None analyzes all (default). Useful for debugging
     """
 
-    from gempython.gemplotting.utils.anaInfo import maxChi2Default, maxEffPedPercentDefault, highNoiseCutDefault, deadChanCutLowDefault, deadChanCutHighDefault
+    from gempython.gemplotting.utils.anaInfo import fitBackendDefault, maxChi2Default, maxEffPedPercentDefault, highNoiseCutDefault, deadChanCutLowDefault, deadChanCutHighDefault
 
     # Check attributes of input args
     # If not present assign appropriate default arguments
@@ -74,6 +81,16 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
         args.doNotFit = False
     if hasattr(args,'maxChi2') is False:
         args.maxChi2 = maxChi2Default
+    if hasattr(args,'fitBackend') is False:
+        args.fitBackend = fitBackendDefault
+    if hasattr(args,'fitWorkers') is False:
+        args.fitWorkers = 1
+    if hasattr(args,'seed') is False:
+        args.seed = None
+    if hasattr(args,'noCache') is False:
+        args.noCache = False
+    if hasattr(args,'rebuildCache') is False:
+        args.rebuildCache = False
     if hasattr(args,'drawbad') is False:
         args.drawbad = False
     if hasattr(args,'extChanMapping') is False:
@@ -86,6 +103,10 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
         args.outfilename = "SCurveFitData.root"
     if hasattr(args, 'zscore') is False:
         args.zscore = 3.5
+    if hasattr(args, 'remaskOnly') is False:
+        args.remaskOnly = False
+    if hasattr(args, 'slim') is False:
+        args.slim = False
 
     #Get Defaults
     isVFAT3 = (not args.isVFAT2)
@@ -117,6 +138,10 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
             #args.deadChanCutHigh = 5.0E-01
             args.deadChanCutHigh = 0
 
+    # Only reapply the channel mask decisions to an existing output?
+    if args.remaskOnly:
+        return remaskUltraScurve(args, outputDir+'/'+outfilename, outputDir, vfatList)
+
     # Create the output File and TTree
     import ROOT as r
     outF = r.TFile(outputDir+'/'+outfilename, 'recreate')
@@ -126,7 +151,6 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
     if outF.IsZombie():
         outF.Close()
         raise IOError("Output file {1} is a Zombie, check to make sure you have write permissions under {0}".format(outputDir,outfilename))
-    scurveFitTree = r.TTree('scurveFitTree','Tree Holding FitData')
 
     # Attempt to open input TFile
     inFile = r.TFile(scurveFilename,'read')
@@ -158,9 +182,11 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
     if ((vfatList is not None) and ((min(vfatList) < 0) or (max(vfatList) > nVFATS-1))):
         raise ValueError("anaUltraScurve(): Either vfatList=None or entries in vfatList must be in [0,{0}]".format(nVFATS-1))
 
+    # Read the input data once, everything below is derived from this table
     listOfBranches = scurveTree.GetListOfBranches()
+    scanTable = readScurveTree(scurveTree)
     if 'vfatID' in listOfBranches:
-        array_chipID = np.unique(rp.tree2array(scurveTree, branches = [ 'vfatID','vfatN' ] ))
+        array_chipID = np.unique(scanTable[ [ 'vfatID','vfatN' ] ])
         dict_chipID = {}
         for entry in array_chipID:
             dict_chipID[entry['vfatN']]=entry['vfatID']
@@ -175,7 +201,7 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
             print(vfat,vfatID)
 
     # Get Nevts
-    nevts = np.asscalar(np.unique(rp.tree2array(scurveTree, branches = [ 'Nev' ] )))[0] # for some reason numpy returns this as a tuple...
+    nevts = np.asscalar(np.unique(scanTable['Nev']))
 
     # Determine CAL DAC calibration
     from gempython.utils.gemlogger import printYellow
@@ -204,11 +230,10 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
     vSummaryPlotsNoMaskedChan = ndict()
     vSummaryPlotsNoMaskedChanPanPin2 = ndict()
 
-    from gempython.gemplotting.utils.anautilities import getEmptyPerVFATList
-    vthr_list = getEmptyPerVFATList(nVFATS)
-    trim_list = getEmptyPerVFATList(nVFATS)
-    trimRange_list = getEmptyPerVFATList(nVFATS)
-    trimPolarity_list = getEmptyPerVFATList(nVFATS)
+    vthr_list = np.zeros((nVFATS, maxChans), dtype=int)
+    trim_list = np.zeros((nVFATS, maxChans), dtype=int)
+    trimRange_list = np.zeros((nVFATS, maxChans), dtype=int)
+    trimPolarity_list = np.zeros((nVFATS, maxChans), dtype=int)
 
     # Set default histogram behavior
     r.TH1.SetDefaultSumw2(False)
@@ -280,14 +305,6 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
                     256, yMin_Charge, yMax_Charge)
             vSummaryPlotsNoMaskedChanPanPin2[vfat].GetYaxis().SetTitleOffset(1.5)
             pass
-        for chan in range (0,maxChans):
-            vthr_list[vfat].append(0)
-            trim_list[vfat].append(0)
-            if isVFAT3:
-                trimPolarity_list[vfat].append(0)
-            else:
-                trimRange_list[vfat].append(0)
-            pass
         pass
 
     # Build the channel to strip mapping from the text file
@@ -320,45 +337,51 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
         pass
 
     # Get some of the operational settings of the ASIC
-    # Refactor this using root_numpy???
-    dict_vfatID = dict((vfat, 0) for vfat in range(nVFATS))
-    listOfBranches = scurveTree.GetListOfBranches()
-    nPulses = -1
-    for event in scurveTree:
-        # If provided, skip all VFATs but the requested one
-        if ((vfatList is not None) and (event.vfatN not in vfatList)):
-            continue
-
-        if "vthr" in listOfBranches: #v3 electronics behavior
-            vthr_list[event.vfatN][event.vfatCH] = event.vthr
-        else: #v2b electronics behavior
-            vthr_list[event.vfatN][event.vfatCH] = abs(event.vth2 - event.vth1)
-            pass
-        trim_list[event.vfatN][event.vfatCH] = event.trimDAC
-        if isVFAT3:
-            trimPolarity_list[event.vfatN][event.vfatCH] = event.trimPolarity
-        else:
-            trimRange_list[event.vfatN][event.vfatCH] = event.trimRange
+    # If provided, skip all VFATs but the requested one
+    if vfatList is not None:
+        scanTable = scanTable[np.in1d(scanTable['vfatN'], vfatList)]
+    tableVFATs = scanTable['vfatN']
+    tableChans = scanTable['vfatCH']
+
+    if "vthr" in listOfBranches: #v3 electronics behavior
+        vthr_list[tableVFATs, tableChans] = scanTable['vthr']
+    else: #v2b electronics behavior
+        vthr_list[tableVFATs, tableChans] = np.abs(scanTable['vth2'] - scanTable['vth1'])
+        pass
+    trim_list[tableVFATs, tableChans] = scanTable['trimDAC']
+    if isVFAT3:
+        trimPolarity_list[tableVFATs, tableChans] = scanTable['trimPolarity']
+    else:
+        trimRange_list[tableVFATs, tableChans] = scanTable['trimRange']
 
-        # store event count
-        if nPulses < 0:
-            nPulses = event.Nev
+    # store event count
+    nPulses = scanTable['Nev'][0] if len(scanTable) > 0 else -1
 
-        # Store vfatID
-        if not (dict_vfatID[event.vfatN] > 0):
-            if 'vfatID' in listOfBranches:
-                dict_vfatID[event.vfatN] = event.vfatID
-            else:
-                dict_vfatID[event.vfatN] = 0
+    # Store vfatID, the first non-zero value found for each VFAT
+    dict_vfatID = dict((vfat, 0) for vfat in range(nVFATS))
+    if 'vfatID' in listOfBranches:
+        for vfat in np.unique(tableVFATs):
+            listOfIDs = scanTable['vfatID'][tableVFATs == vfat]
+            dict_vfatID[vfat] = listOfIDs[listOfIDs > 0][0] if np.any(listOfIDs > 0) else listOfIDs[-1]
+            pass
+        pass
 
-        # Load the event into the fitter
-        if performFit:
-            fitter.feed(event)
+    # Load the data into the fitter
+    if performFit:
+        fitter.feedArrays(
+                vfatN=tableVFATs,
+                vfatCH=tableChans,
+                vcal=scanTable['vcal'],
+                Nhits=scanTable['Nhits'],
+                Nev=scanTable['Nev'],
+                isCurrentPulse=scanTable['isCurrentPulse'] if 'isCurrentPulse' in scanTable.dtype.names else None,
+                calSF=scanTable['calSF'] if 'calSF' in scanTable.dtype.names else None)
 
     # Loop over input data and fill histograms
     print("Filling Histograms")
     fill2DScurveSummaryPlots(
             scurveTree=scurveTree,
+            scanTable=scanTable,
             vfatHistos=vSummaryPlots,
             vfatChanLUT=dict_vfatChanLUT,
             vfatHistosPanPin2=vSummaryPlotsPanPin2,
@@ -375,7 +398,22 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
         print("Fitting Histograms")
         fitSummary = open(outputDir+'/fitSummary.txt','w')
         fitSummary.write('vfatN/I:vfatID/I:vfatCH/I:fitP0/F:fitP1/F:fitP2/F:fitP3/F\n')
-        scanFitResults = fitter.fit(debug=args.debug)
+        fitResults = None
+        if not args.noCache:
+            from gempython.gemplotting.utils.anaInfo import fitCacheMaxSizeDefault
+            from gempython.gemplotting.utils.cacheutils import getCacheDir, loadFromCache, storeInCache
+            fitCacheDir = getCacheDir("scurveFits")
+            fitCacheKey = fitter.getCacheKey(backend=args.fitBackend, vfatList=vfatList, seed=args.seed)
+            if not args.rebuildCache:
+                fitResults = loadFromCache(fitCacheDir, fitCacheKey)
+        if fitResults is not None:
+            print("Fit results taken from cache entry {0}/{1}".format(fitCacheDir, fitCacheKey))
+            fitter.setFitResultArrays(fitResults)
+            scanFitResults = fitter.scanFitResults
+        else:
+            scanFitResults = fitter.fit(debug=args.debug, backend=args.fitBackend, nWorkers=args.fitWorkers, vfatList=vfatList, seed=args.seed)
+            if not args.noCache:
+                storeInCache(fitCacheDir, fitCacheKey, fitter.getFitResultArrays(), fitCacheMaxSizeDefault)
         for vfat in range(nVFATS):
             # If provided, skip all VFATs but the requested one
             if ((vfatList is not None) and (vfat not in vfatList)):
@@ -387,10 +425,10 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
                             vfat,
                             dict_vfatID[vfat],
                             chan,
-                            fitter.scanFuncs[vfat][chan].GetParameter(0),
-                            fitter.scanFuncs[vfat][chan].GetParameter(1),
-                            fitter.scanFuncs[vfat][chan].GetParameter(2),
-                            fitter.scanFuncs[vfat][chan].GetParameter(3)
+                            fitter.scanFitParams[vfat][chan][0],
+                            fitter.scanFitParams[vfat][chan][1],
+                            fitter.scanFitParams[vfat][chan][2],
+                            fitter.scanFitParams[vfat][chan][3]
                             )
                         )
         fitSummary.close()
@@ -398,75 +436,29 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
         # Determine hot channels
         print("Determining hot channels")
         print("")
-        masks = {}
-        reason4Mask = {}
-        effectivePedestals = [ np.zeros(maxChans) for vfat in range(nVFATS) ]
-        print("| vfatN | Dead Chan | Hot Chan | Failed Fits | High Noise | High Eff Ped |")
-        print("| :---: | :-------: | :------: | :---------: | :--------: | :----------: |")
-        for vfat in range(nVFATS):
-            # If provided, skip all VFATs but the requested one
-            if ((vfatList is not None) and (vfat not in vfatList)):
-                continue
+        effectivePedestals = fitter.evalFuncs(0.0)
+        reasonArray, maskArray = getChannelMaskReasons(
+                scurveMean=np.array([ scanFitResults[0][vfat] for vfat in range(nVFATS) ]),
+                scurveSigma=np.array([ scanFitResults[1][vfat] for vfat in range(nVFATS) ]),
+                effPedFraction=getEffPedFraction(effectivePedestals, fitter.Nev),
+                fitFailed=np.logical_not(np.array(fitter.fitValid)),
+                zscore=args.zscore,
+                deadChanCutLow=args.deadChanCutLow,
+                deadChanCutHigh=args.deadChanCutHigh,
+                highNoiseCut=args.highNoiseCut,
+                maxEffPedPercent=args.maxEffPedPercent)
 
-            #trimValue = np.zeros(128)
-            scurveMean = np.zeros(maxChans)
-            channelNoise = np.zeros(maxChans)
-            fitFailed = np.zeros(maxChans, dtype=bool)
-            for chan in range(0, maxChans):
-                # Compute values for cuts
-                channelNoise[chan] = scanFitResults[1][vfat][chan]
-                effectivePedestals[vfat][chan] = fitter.scanFuncs[vfat][chan].Eval(0.0)
-
-                # Compute the value to apply MAD on for each channel
-                #trimValue[chan] = scanFitResults[0][vfat][chan] - args.ztrim * scanFitResults[1][vfat][chan]
-                scurveMean[chan] = scanFitResults[0][vfat][chan]
-                pass
-            fitFailed = np.logical_not(fitter.fitValid[vfat])
-
-            # Determine outliers
-            from gempython.gemplotting.utils.anautilities import isOutlierMADOneSided
-            #hot = isOutlierMADOneSided(trimValue, thresh=args.zscore,
-            #                           rejectHighTail=False)
-            hot = isOutlierMADOneSided(scurveMean, thresh=args.zscore,
-                                       rejectHighTail=False) # rejects scurves with means shifted to low charge values
-
-            # Create reason array
-            reason = np.zeros(maxChans, dtype=int) # Not masked
-            from gempython.gemplotting.utils.anaInfo import MaskReason
-            reason[hot] |= MaskReason.HotChannel
-            reason[fitFailed] |= MaskReason.FitFailed
-            nDeadChan = 0
-            for chan in range(0,len(channelNoise)):
-                if (args.deadChanCutLow < channelNoise[chan] and channelNoise[chan] < args.deadChanCutHigh):
-                    reason[chan] |= MaskReason.DeadChannel
-                    nDeadChan+=1
-                    pass
-                pass
-            reason[channelNoise > args.highNoiseCut ] |= MaskReason.HighNoise
-            nHighEffPed = 0
-            for chan in range(0, len(effectivePedestals)):
-                if chan not in fitter.Nev[vfat].keys():
-                    continue
-                if (effectivePedestals[vfat][chan] > (args.maxEffPedPercent * fitter.Nev[vfat][chan]) ):
-                    reason[chan] |= MaskReason.HighEffPed
-                    nHighEffPed+=1
-                    pass
-                pass
-            reason4Mask[vfat] = reason
-            masks[vfat] = ((reason != MaskReason.NotMasked) * (reason != MaskReason.DeadChannel))
-            print('| {0:5d} | {1:9d} | {2:8d} | {3:11d} | {4:10d} | {5:12d} |'.format(
-                    vfat,
-                    nDeadChan,
-                    np.count_nonzero(hot),
-                    np.count_nonzero(fitFailed),
-                    np.count_nonzero(channelNoise > args.highNoiseCut),
-                    nHighEffPed))
-            pass
+        # If provided, skip all VFATs but the requested one
+        listOfVFATs = [ vfat for vfat in range(nVFATS) if ((vfatList is None) or (vfat in vfatList)) ]
+        masks = dict((vfat, maskArray[vfat]) for vfat in listOfVFATs)
+        reason4Mask = dict((vfat, reasonArray[vfat]) for vfat in listOfVFATs)
+        printMaskReasonSummary(reason4Mask)
 
         # Make Distributions w/o Hot Channels
         print("Removing Hot Channels from Output Histograms")
         fill2DScurveSummaryPlots(
                 scurveTree=scurveTree,
+                scanTable=scanTable,
                 vfatHistos=vSummaryPlotsNoMaskedChan,
                 vfatChanLUT=dict_vfatChanLUT,
                 vfatHistosPanPin2=vSummaryPlotsNoMaskedChanPanPin2,
@@ -478,60 +470,55 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
                 gemType=gemType
         )
 
-        # Set the branches of the TTree and store the results
-        # Due to weird ROOT black magic this cannot be done here
-        #scurveFitTree = r.TTree('scurveFitTree','Tree Holding FitData')
-
-        from array import array
-        if 'detName' in listOfBranches:
-            detName = r.vector('string')()
-            detName.push_back(rp.tree2array(scurveTree, branches = [ 'detName' ] )[0][0][0])
-            scurveFitTree.Branch( 'detName', detName)
-        chi2 = array( 'f', [ 0 ] )
-        scurveFitTree.Branch( 'chi2', chi2, 'chi2/F')
-        mask = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'mask', mask, 'mask/I' )
-        maskReason = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'maskReason', maskReason, 'maskReason/I' )
-        ndf = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'ndf', ndf, 'ndf/I')
-        Nhigh = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'Nhigh', Nhigh, 'Nhigh/I')
-        noise = array( 'f', [ 0 ] )
-        scurveFitTree.Branch( 'noise', noise, 'noise/F')
-        panPin = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'panPin', panPin, 'panPin/I' )
-        pedestal = array( 'f', [ 0 ] )
-        scurveFitTree.Branch( 'pedestal', pedestal, 'pedestal/F')
-        ped_eff = array( 'f', [ 0 ] )
-        scurveFitTree.Branch( 'ped_eff', ped_eff, 'ped_eff/F')
-        ROBstr = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'ROBstr', ROBstr, 'ROBstr/I' )
-        trimDAC = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'trimDAC', trimDAC, 'trimDAC/I' )
-        threshold = array( 'f', [ 0 ] )
-        scurveFitTree.Branch( 'threshold', threshold, 'threshold/F')
+        # Store the results of each channel in a table, written as scurveFitTree below
+        vfatIdx = np.repeat(listOfVFATs, maxChans)
+        chanIdx = np.tile(np.arange(maxChans), len(listOfVFATs))
+        fitResultArrays = np.array([ [ scanFitResults[resIdx][vfat] for vfat in range(nVFATS) ] for resIdx in range(6) ])
+        lutArrays = dict((lutType, dict_vfatChanLUT.getArray(lutType)) for lutType in [ "PanPin", "Strip" ])
+
+        fitTable = np.zeros(len(vfatIdx), dtype=[
+            ('chi2', 'f4'),
+            ('gemType', 'i4'),
+            ('mask', 'i4'),
+            ('maskReason', 'i4'),
+            ('ndf', 'i4'),
+            ('Nhigh', 'i4'),
+            ('noise', 'f4'),
+            ('panPin', 'i4'),
+            ('pedestal', 'f4'),
+            ('ped_eff', 'f4'),
+            ('ROBstr', 'i4'),
+            ('trimDAC', 'i4'),
+            ('threshold', 'f4'),
+            ('trimPolarity' if isVFAT3 else 'trimRange', 'i4'),
+            ('vfatCH', 'i4'),
+            ('vfatID', 'u4'), #Hex Chip ID of VFAT
+            ('vfatN', 'i4'),
+            ('vthr', 'i4') ])
+        fitTable['chi2'] = fitResultArrays[3][vfatIdx, chanIdx]
+        fitTable['gemType'] = [ key for key, value in gemTypeMapping.iteritems() if value == gemType ][0]
+        fitTable['mask'] = maskArray[vfatIdx, chanIdx]
+        fitTable['maskReason'] = reasonArray[vfatIdx, chanIdx]
+        fitTable['ndf'] = fitResultArrays[5][vfatIdx, chanIdx]
+        fitTable['Nhigh'] = fitResultArrays[4][vfatIdx, chanIdx]
+        fitTable['noise'] = fitResultArrays[1][vfatIdx, chanIdx]
+        fitTable['panPin'] = lutArrays["PanPin"][vfatIdx, chanIdx]
+        fitTable['pedestal'] = fitResultArrays[2][vfatIdx, chanIdx]
+        fitTable['ped_eff'] = np.where(fitter.Nev[vfatIdx, chanIdx] > 0, getEffPedFraction(effectivePedestals, fitter.Nev)[vfatIdx, chanIdx], 0.) # 0 for channels without data
+        fitTable['ROBstr'] = lutArrays["Strip"][vfatIdx, chanIdx]
+        fitTable['trimDAC'] = trim_list[vfatIdx, chanIdx]
+        fitTable['threshold'] = fitResultArrays[0][vfatIdx, chanIdx]
         if isVFAT3:
-            trimPolarity = array( 'i', [ 0 ] )
-            scurveFitTree.Branch('trimPolarity', trimPolarity, 'trimPolarity/I' )
+            fitTable['trimPolarity'] = trimPolarity_list[vfatIdx, chanIdx]
         else:
-            trimRange = array( 'i', [ 0 ] )
-            scurveFitTree.Branch( 'trimRange', trimRange, 'trimRange/I' )
-        vfatCH = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'vfatCH', vfatCH, 'vfatCH/I' )
-        vfatID = array( 'L', [0] )
-        scurveFitTree.Branch( 'vfatID', vfatID, 'vfatID/i' ) #Hex Chip ID of VFAT
-        vfatN = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'vfatN', vfatN, 'vfatN/I' )
-        vthr = array( 'i', [ 0 ] )
-        scurveFitTree.Branch( 'vthr', vthr, 'vthr/I' )
-        scurve_h = r.TH1F()
-        scurveFitTree.Branch( 'scurve_h', scurve_h)
-        scurve_fit = r.TF1()
-        scurveFitTree.Branch( 'scurve_fit', scurve_fit)
-        #ztrim = array( 'f', [ 0 ] )
-        #ztrim[0] = args.ztrim
-        #scurveFitTree.Branch( 'ztrim', ztrim, 'ztrim/F')
+            fitTable['trimRange'] = trimRange_list[vfatIdx, chanIdx]
+        fitTable['vfatCH'] = chanIdx
+        fitTable['vfatID'] = [ dict_vfatID[vfat] for vfat in vfatIdx ]
+        fitTable['vfatN'] = vfatIdx
+        fitTable['vthr'] = vthr_list[vfatIdx, chanIdx]
+        detName = None
+        if 'detName' in listOfBranches:
+            detName = rp.tree2array(scurveTree, branches = [ 'detName' ] )[0][0][0]
 
         # Make output plots
         print("Storing Output Data")
@@ -590,47 +577,19 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
                 allEffPedByiEta[ieta][(iphi-1)*chan + chan] = effectivePedestals[vfat][chan]
                 allThreshByiEta[ieta][(iphi-1)*chan + chan] = scanFitResults[0][vfat][chan]
 
-                # Set arrays linked to TBranches
-                chi2[0] = scanFitResults[3][vfat][chan]
-                mask[0] = masks[vfat][chan]
-                maskReason[0] = reason4Mask[vfat][chan]
-                ndf[0] = int(scanFitResults[5][vfat][chan])
-                Nhigh[0] = int(scanFitResults[4][vfat][chan])
-                noise[0] = scanFitResults[1][vfat][chan]
-                panPin[0] = dict_vfatChanLUT[vfat]["PanPin"][chan]
-                if chan in fitter.Nev[vfat].keys():
-                    ped_eff[0] = effectivePedestals[vfat][chan]/fitter.Nev[vfat][chan]
-                pedestal[0] = scanFitResults[2][vfat][chan]
-                ROBstr[0] = dict_vfatChanLUT[vfat]["Strip"][chan]
-                threshold[0] = scanFitResults[0][vfat][chan]
-                trimDAC[0] = trim_list[vfat][chan]
-                if isVFAT3:
-                    trimPolarity[0] = trimPolarity_list[vfat][chan]
-                else:
-                    trimRange[0] = trimRange_list[vfat][chan]
-                vfatCH[0] = chan
-                vfatID[0] = dict_vfatID[vfat]
-                vfatN[0] = vfat
-                vthr[0] = vthr_list[vfat][chan]
-
-                # Set TObjects linked to TBranches
-                holder_curve = fitter.scanHistos[vfat][chan]
-                holder_curve.Copy(scurve_h)
-                holder_fit = fitter.getFunc(vfat,chan).Clone('scurveFit_vfat{0}_chan{1}'.format(vfat,chan))
-                holder_fit.Copy(scurve_fit)
-
                 # Filling the arrays for plotting later
                 if args.drawbad:
-                    if (chi2[0] > 1000.0 or chi2[0] < 1.0):
+                    if (scanFitResults[3][vfat][chan] > 1000.0 or scanFitResults[3][vfat][chan] < 1.0):
                         canvas = r.TCanvas('canvas', 'canvas', 500, 500)
                         r.gStyle.SetOptStat(1111111)
+                        scurve_h = fitter.getHisto(vfat,chan)
                         scurve_h.Draw()
+                        scurve_fit = fitter.getFunc(vfat,chan)
                         scurve_fit.Draw('SAME')
                         canvas.Update()
-                        canvas.SaveAs('Fit_Overlay_vfat{0}_vfatCH{1}.png'.format(VFAT, chan))
+                        canvas.SaveAs('Fit_Overlay_vfat{0}_vfatCH{1}.png'.format(vfat, chan))
                         pass
                     pass
-                scurveFitTree.Fill()
                 pass
 
             # Make fit Summary plot
@@ -947,6 +906,7 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
             canvOfScurveHistosNoMaskedChan = plotAllSCurvesOnCanvas(vSummaryPlotsNoMaskedChan,None,"scurvesNoMaskedChan")
 
         canvOfScurveFits = {}
+        funcsOfScurveFits = {} # the canvases only hold pointers to the TF1's
         for vfat in range(nVFATS):
             # If provided, skip all VFATs but the requested one
             if ((vfatList is not None) and (vfat not in vfatList)):
@@ -954,20 +914,22 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
 
             canvOfScurveFits[vfat] = r.TCanvas("canv_scurveFits_vfat{0}".format(vfat),"Scurve Fits from VFAT{0}".format(vfat),600,600)
             canvOfScurveFits[vfat].cd()
+            funcsOfScurveFits[vfat] = {}
             for chan in range (0,maxChans):
                 if masks[vfat][chan]: # Do not draw fit for masked channels
                     continue
 
+                funcsOfScurveFits[vfat][chan] = fitter.getFunc(vfat,chan)
                 if chan == 0:
-                    fitter.scanFuncs[vfat][chan].Draw()
+                    funcsOfScurveFits[vfat][chan].Draw()
                 else:
-                    fitter.scanFuncs[vfat][chan].Draw("same")
+                    funcsOfScurveFits[vfat][chan].Draw("same")
             canvOfScurveFits[vfat].Update()
 
     # Save TObjects
     outF.cd()
     if performFit:
-        scurveFitTree.Write()
+        scurveFitTree = writeScurveFitTree(outF, fitTable, detName=detName, fitter=fitter, slim=args.slim)
     for vfat in range(nVFATS):
         # If provided, skip all VFATs but the requested one
         if ((vfatList is not None) and (vfat not in vfatList)):
@@ -1024,19 +986,22 @@ def anaUltraScurve(args, scurveFilename, calFile=None, GEBtype="short", outputDi
 
         outF.Close()
         inFile.Close()
+
+        from gempython.gemplotting.utils.scanresults import writeColumnarFile
+        writeColumnarFile(outputDir+'/'+outfilename, "scurveFitTree", fitTable)
         return array_fitData
     else:
         outF.Close()
         inFile.Close()
         return
 
-def fill2DScurveSummaryPlots(scurveTree, vfatHistos, vfatChanLUT, vfatHistosPanPin2=None, lutType="vfatCH", chanMasks=None, calDAC2Q_m=None, calDAC2Q_b=None, vfatList=None, gemType="ge11"):
+def fill2DScurveSummaryPlots(scurveTree, vfatHistos, vfatChanLUT, vfatHistosPanPin2=None, lutType="vfatCH", chanMasks=None, calDAC2Q_m=None, calDAC2Q_b=None, vfatList=None, gemType="ge11", scanTable=None):
     """
-    Fills 2D Scurve summary plots from scurveTree TTree
+    Fills 2D Scurve summary plots from scurveTree TTree, see fill2DScurveSummaryPlotsFromArrays()
     vfatHistos        - container of histograms for each vfat where len(vfatHistos) = Total number of VFATs
                         The n^th element is a 2D histogram of Hits vs. (Strip || Chan || PanPin)
-    vfatChanLUT       - Nested dictionary specifying the VFAT channel to strip and PanPin mapping;
-                        see getMapping() for details on expected format
+    vfatChanLUT       - ChannelMap (or nested dictionary) specifying the VFAT channel to strip and
+                        PanPin mapping; see getMapping() for details on expected format
     vfatHistosPanPin2 - As vfatHistos but for the other side of the readout board connector if lutType is "PanPin"
     lutType           - Type of look up to be peformed in vfatChanLUT, see mappingNames of anaInfo.py for
                         expected names
@@ -1047,11 +1012,13 @@ def fill2DScurveSummaryPlots(scurveTree, vfatHistos, vfatChanLUT, vfatHistosPanP
                         if argument is None a value of 1.0 is used for all VFATs
     calDAC2Q_b        - as calDAC2Q_m but for intercept b, but a value of 0 is used if argument is None
     vfatList - List of VFAT positions to consider in the analysis, if None analyzes all (default). Useful for debugging
+    scanTable         - structured numpy array holding the scurveTree data, as returned by readScurveTree();
+                        if provided scurveTree is not read again
     """
-    from gempython.gemplotting.utils.anaInfo import dict_calSF, mappingNames
-    from gempython.gemplotting.utils.anautilities import first_index_gt
+    from gempython.gemplotting.utils.anaInfo import mappingNames
+    from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
     from gempython.tools.hw_constants import vfatsPerGemVariant
-    from math import sqrt
+    import numpy as np
 
     # Check if lutType is expected
     if lutType not in mappingNames:
@@ -1059,6 +1026,64 @@ def fill2DScurveSummaryPlots(scurveTree, vfatHistos, vfatChanLUT, vfatHistosPanP
         print("fill2DScurveSummaryPlots() - I was expecting one of the following: ", mappingNames)
         raise LookupError
 
+    # Get the data
+    if scanTable is None:
+        scanTable = readScurveTree(scurveTree)
+
+    # Convert the look up table to an array indexed as [vfat][chan]
+    from gempython.gemplotting.mapping.channelMapLUT import ChannelMap
+    if isinstance(vfatChanLUT, ChannelMap):
+        lutArray = vfatChanLUT.resize(vfatsPerGemVariant[gemType]).getArray(lutType)
+    else:
+        lutArray = np.zeros((vfatsPerGemVariant[gemType], maxChans), dtype=int)
+        for vfat in vfatChanLUT:
+            lutArray[vfat] = vfatChanLUT[vfat][lutType]
+            pass
+        pass
+
+    fill2DScurveSummaryPlotsFromArrays(
+            scanTable=scanTable,
+            vfatHistos=vfatHistos,
+            lutArray=lutArray,
+            vfatHistosPanPin2=vfatHistosPanPin2,
+            isPanPin=(lutType == mappingNames[1]),
+            chanMasks=chanMasks,
+            calDAC2Q_m=calDAC2Q_m,
+            calDAC2Q_b=calDAC2Q_b,
+            vfatList=vfatList,
+            gemType=gemType)
+
+    return
+
+def fill2DScurveSummaryPlotsFromArrays(scanTable, vfatHistos, lutArray, vfatHistosPanPin2=None, isPanPin=False, chanMasks=None, calDAC2Q_m=None, calDAC2Q_b=None, vfatList=None, gemType="ge11"):
+    """
+    Fills 2D Scurve summary plots from the columns of the scurveTree.  The
+    strip, PanPin or channel and the charge bin of all entries are computed at
+    once and the bin contents of each histogram are set in a single step.
+
+    As with TH2::SetBinContent() the last entry falling in a given bin wins and
+    bins out of the axis range are moved to the underflow/overflow bins.
+
+    scanTable         - structured numpy array with at least the vfatN, vfatCH, vcal and Nhits
+                        fields (and isCurrentPulse, calSF for current pulse data),
+                        e.g. as returned by readScurveTree()
+    vfatHistos        - container of histograms for each vfat, see fill2DScurveSummaryPlots()
+    lutArray          - numpy array of int indexed as [vfat][chan] giving the strip, PanPin or channel
+                        to be used as x coordinate
+    vfatHistosPanPin2 - As vfatHistos but for the other side of the readout board connector if isPanPin is True
+    isPanPin          - True if lutArray gives the PanPin of each channel
+    chanMasks         - As in fill2DScurveSummaryPlots()
+    calDAC2Q_m        - As in fill2DScurveSummaryPlots()
+    calDAC2Q_b        - As in fill2DScurveSummaryPlots()
+    vfatList          - As in fill2DScurveSummaryPlots()
+    """
+    from gempython.gemplotting.utils.anaInfo import dict_calSF
+    from gempython.gemplotting.utils.binning import findBins, getUniformBinEdges
+    from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
+    from gempython.tools.hw_constants import vfatsPerGemVariant
+    import numpy as np
+    import root_numpy as rp
+
     # Set calDAC2Q slope to unity if not provided
     if calDAC2Q_m is None:
         calDAC2Q_m = np.ones(vfatsPerGemVariant[gemType])
@@ -1067,63 +1092,129 @@ def fill2DScurveSummaryPlots(scurveTree, vfatHistos, vfatChanLUT, vfatHistosPanP
     if calDAC2Q_b is None:
         calDAC2Q_b = np.zeros(vfatsPerGemVariant[gemType])
 
-    # Get list of bin edges in Y
-    # Must be done for each VFAT since the conversion from DAC units to fC may be unique to the VFAT
-    listOfBinEdgesY = {}
-    for vfat in vfatHistos:
-        listOfBinEdgesY[vfat] = [ vfatHistos[vfat].GetYaxis().GetBinLowEdge(binY)
-                for binY in range(1,vfatHistos[vfat].GetNbinsY()+2) ] #Include overflow
-        pass
+    # Skip all VFATs but the requested ones and masked channels
+    if vfatList is not None:
+        scanTable = scanTable[np.in1d(scanTable['vfatN'], vfatList)]
+    if chanMasks is not None:
+        arrayMasks = np.zeros((vfatsPerGemVariant[gemType], maxChans), dtype=bool)
+        for vfat in chanMasks:
+            arrayMasks[vfat] = chanMasks[vfat]
+            pass
+        scanTable = scanTable[np.logical_not(arrayMasks[scanTable['vfatN'], scanTable['vfatCH']])]
 
-    # check current pulse?
-    checkCurrentPulse = False
-    listOfBranchNames = [branch.GetName() for branch in scurveTree.GetListOfBranches() ]
-    if "isCurrentPulse" in listOfBranchNames:
-        checkCurrentPulse = True
-        pass
+    vfatN = scanTable['vfatN']
+    vcal = scanTable['vcal'].astype(float)
 
-    # Fill Histograms
-    for event in scurveTree:
-        # If provided, skip all VFATs but the requested one
-        if ((vfatList is not None) and (event.vfatN not in vfatList)):
-            continue
+    # Get the channel, strip, or Pan Pin
+    stripPinOrChan = lutArray[vfatN, scanTable['vfatCH']]
+
+    # Determine charge
+    charge = np.asarray(calDAC2Q_m, dtype=float)[vfatN]*vcal+np.asarray(calDAC2Q_b, dtype=float)[vfatN]
+    if "isCurrentPulse" in scanTable.dtype.names: #Potentially v3 electronics
+        #Q = CAL_DUR * CAL_DAC * 10nA * CAL_FS
+        calSFValue = np.array([ dict_calSF[sf] for sf in sorted(dict_calSF) ])[scanTable['calSF']]
+        charge = np.where(scanTable['isCurrentPulse'], (1./ 40079000) * vcal * (10 * 1e-9) * calSFValue * 1e15, charge)
 
-        # Skip entry if channel is masked
-        if chanMasks is not None:
-            if chanMasks[event.vfatN][event.vfatCH]:
+    # Determine the binX, and the histogram, of each entry
+    if isPanPin and vfatHistosPanPin2 is not None:
+        isPanPin2 = (stripPinOrChan >= maxChans/2)
+        binX = np.where(isPanPin2, maxChans-stripPinOrChan, maxChans/2-stripPinOrChan)
+    else:
+        isPanPin2 = np.zeros(len(scanTable), dtype=bool)
+        binX = stripPinOrChan+1
+
+    # Fill Summary Histograms
+    for vfat in np.unique(vfatN):
+        for histos, onHisto in [ (vfatHistos, np.logical_not(isPanPin2)), (vfatHistosPanPin2, isPanPin2) ]:
+            toFill = (vfatN == vfat) & onHisto
+            if not np.any(toFill):
                 continue
+            hist = histos[vfat]
 
-        # Get the channel, strip, or Pan Pin
-        stripPinOrChan = vfatChanLUT[event.vfatN][lutType][event.vfatCH]
-
-        # Determine charge
-        charge = calDAC2Q_m[event.vfatN]*event.vcal+calDAC2Q_b[event.vfatN]
-        if checkCurrentPulse: #Potentially v3 electronics
-            if event.isCurrentPulse:
-                #Q = CAL_DUR * CAL_DAC * 10nA * CAL_FS
-                charge = (1./ 40079000) * event.vcal * (10 * 1e-9) * dict_calSF[event.calSF] * 1e15
-
-        # Determine the binY that corresponds to this charge value
-        chargeBin = first_index_gt(listOfBinEdgesY[event.vfatN], charge)-1
-
-        # Fill Summary Histogram
-        from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
-        if lutType is mappingNames[1] and vfatHistosPanPin2 is not None:
-            if (stripPinOrChan < maxChans/2):
-                vfatHistos[event.vfatN].SetBinContent(maxChans/2-stripPinOrChan,chargeBin,event.Nhits)
-                vfatHistos[event.vfatN].SetBinError(maxChans/2-stripPinOrChan+1,chargeBin,sqrt(event.Nhits))
-                pass
-            else:
-                vfatHistosPanPin2[event.vfatN].SetBinContent(maxChans-stripPinOrChan,chargeBin,event.Nhits)
-                vfatHistosPanPin2[event.vfatN].SetBinError(maxChans-stripPinOrChan,chargeBin,sqrt(event.Nhits))
-                pass
-            pass
-        else:
-            vfatHistos[event.vfatN].SetBinContent(stripPinOrChan+1,chargeBin,event.Nhits)
+            # Determine the binY that corresponds to each charge value
+            binEdgesY = getUniformBinEdges(hist.GetNbinsY(), hist.GetYaxis().GetXmin(), hist.GetYaxis().GetXmax()) #Include overflow
+            binY = findBins(binEdgesY, charge[toFill])
+
+            content = rp.hist2array(hist, include_overflow=True)
+            content[np.clip(binX[toFill], 0, hist.GetNbinsX()+1), np.clip(binY, 0, hist.GetNbinsY()+1)] = scanTable['Nhits'][toFill]
+            nEntries = hist.GetEntries()
+            rp.array2hist(content, hist)
+            hist.SetEntries(nEntries + np.count_nonzero(toFill))
             pass
+        pass
 
     return
 
+def getChannelMaskReasons(scurveMean, scurveSigma, effPedFraction, fitFailed, zscore=3.5, deadChanCutLow=0, deadChanCutHigh=0, highNoiseCut=1.5, maxEffPedPercent=0.02):
+    """
+    Determines the maskReason of each channel of a detector from the results
+    of its scurve fits, see MaskReason of anaInfo.  All inputs are numpy arrays
+    of shape (nVFATs, 128) and the hot channel search is made independently
+    for each VFAT.  Returns a tuple of numpy arrays (reason, mask) of the same
+    shape where mask is True for channels that should be masked; dead channels
+    are not masked.
+
+    scurveMean       - scurve mean of each channel
+    scurveSigma      - scurve sigma of each channel
+    effPedFraction   - effective pedestal of each channel divided by the number of pulses,
+                       nan for channels without data; see getEffPedFraction()
+    fitFailed        - bool, True if the fit of the channel failed
+    zscore           - Z-Score for outlier identification in the MAD algo, applied on scurveMean
+    deadChanCutLow   - If (deadChanCutLow < scurveSigma < deadChanCutHigh) DeadChannel is set
+    deadChanCutHigh  - See deadChanCutLow
+    highNoiseCut     - If (scurveSigma > highNoiseCut) HighNoise is set
+    maxEffPedPercent - If (effPedFraction > maxEffPedPercent) HighEffPed is set
+    """
+    from gempython.gemplotting.utils.anaInfo import MaskReason
+    from gempython.gemplotting.utils.anautilities import isOutlierMADOneSidedByRow
+    import numpy as np
+
+    hasData = np.isfinite(effPedFraction)
+    highEffPed = hasData & (np.where(hasData, effPedFraction, 0.) > maxEffPedPercent)
+
+    reason = np.zeros(np.shape(scurveMean), dtype=int) # Not masked
+    reason[isOutlierMADOneSidedByRow(scurveMean, thresh=zscore, rejectHighTail=False)] |= MaskReason.HotChannel # rejects scurves with means shifted to low charge values
+    reason[fitFailed] |= MaskReason.FitFailed
+    reason[(deadChanCutLow < scurveSigma) & (scurveSigma < deadChanCutHigh)] |= MaskReason.DeadChannel
+    reason[scurveSigma > highNoiseCut] |= MaskReason.HighNoise
+    reason[highEffPed] |= MaskReason.HighEffPed
+
+    return (reason, ((reason != MaskReason.NotMasked) & (reason != MaskReason.DeadChannel)))
+
+def getEffPedFraction(effectivePedestals, nev):
+    """
+    Returns the effective pedestal of each channel divided by its number of
+    pulses; channels without pulses give nan.
+
+    effectivePedestals - numpy array of the fit functions evaluated at 0, e.g. ScanDataFitter.evalFuncs(0.0)
+    nev                - numpy array of the same shape storing the number of pulses of each channel
+    """
+    import numpy as np
+
+    hasData = (nev > 0)
+    return np.where(hasData, effectivePedestals / np.where(hasData, nev, 1.), np.nan)
+
+def readScurveTree(scurveTree):
+    """
+    Reads in a single pass all the branches of scurveTree that are used by the
+    scurve analysis.  Returns a structured numpy array with one entry per
+    entry of scurveTree; branches that are not present in scurveTree (e.g.
+    vthr for v2b electronics) are omitted.
+
+    scurveTree - TTree produced by ultraScurve.py or 'run_scans.py scurve'
+    """
+    import root_numpy as rp
+
+    listOfScurveBranches = [
+            'vfatN', 'vfatCH', 'vfatID', 'vcal', 'Nhits', 'Nev',
+            'isCurrentPulse', 'calSF',
+            'trimDAC', 'trimPolarity', 'trimRange',
+            'vthr', 'vth1', 'vth2'
+            ]
+    listOfBranchNames = [ branch.GetName() for branch in scurveTree.GetListOfBranches() ]
+
+    return rp.tree2array(scurveTree, branches=[ bName for bName in listOfScurveBranches if bName in listOfBranchNames ])
+
 def plotAllSCurvesOnCanvas(vfatHistos, vfatHistosPanPin2=None, obsName="scurves"):
     """
     Plots all scurves for a given vfat on a TCanvas for all vfats
@@ -1166,3 +1257,411 @@ def plotAllSCurvesOnCanvas(vfatHistos, vfatHistosPanPin2=None, obsName="scurves"
             canv_dict[vfat].Update()
 
     return canv_dict
+
+def printMaskReasonSummary(reason4Mask):
+    """
+    Prints a markdown table with the number of channels of each VFAT
+    assigned to each maskReason
+
+    reason4Mask - dictionary whose keys are VFAT positions and values are numpy
+                  arrays of the maskReason of each channel, see getChannelMaskReasons()
+    """
+    from gempython.gemplotting.utils.anaInfo import MaskReason
+    import numpy as np
+
+    print("| vfatN | Dead Chan | Hot Chan | Failed Fits | High Noise | High Eff Ped |")
+    print("| :---: | :-------: | :------: | :---------: | :--------: | :----------: |")
+    for vfat in sorted(reason4Mask):
+        reason = reason4Mask[vfat]
+        print('| {0:5d} | {1:9d} | {2:8d} | {3:11d} | {4:10d} | {5:12d} |'.format(
+                vfat,
+                np.count_nonzero(reason & MaskReason.DeadChannel),
+                np.count_nonzero(reason & MaskReason.HotChannel),
+                np.count_nonzero(reason & MaskReason.FitFailed),
+                np.count_nonzero(reason & MaskReason.HighNoise),
+                np.count_nonzero(reason & MaskReason.HighEffPed)))
+        pass
+
+    return
+
+def remaskUltraScurve(args, fitFilename, outputDir=None, vfatList=None):
+    """
+    Reapplies the channel mask decisions of anaUltraScurve() to an existing scurve analysis
+    output fitFilename, e.g. to try new cuts, without refitting or reading the input scurveTree.
+    The cuts are evaluated on the threshold, noise and ped_eff branches of scurveFitTree;
+    the FitFailed maskReason found in fitFilename is kept.  The detector type is read from
+    the gemType branch of scurveFitTree, files without it are taken to be ge11 as in
+    anaUltraScurve().
+
+    Only the mask and maskReason branches of scurveFitTree, the vSummaryPlotsNoMaskedChan
+    histograms (and their canvases), PrunedSummary.png and chConfig.txt are rewritten; plots
+    which depend on the fit results themselves are left as they are.  The strip, PanPin or
+    channel axis of the summary plots is taken from the histograms found in fitFilename.
+
+    The args namespace is expected to have the attributes deadChanCutLow, deadChanCutHigh,
+    highNoiseCut, maxEffPedPercent, isVFAT2 and zscore, see anaUltraScurve(); if missing the
+    same defaults are used.
+
+    Returns a structured numpy array with the same dnames as anaUltraScurve()
+
+    fitFilename - Physical filename of the output TFile of anaUltraScurve(), it is updated in place
+    outputDir   - Directory where chConfig.txt and PrunedSummary.png are written.  If None this
+                  will be the directory of fitFilename
+    vfatList    - List of VFAT positions to remask, if None all VFATs found in fitFilename are
+                  remasked. Others keep their existing mask and maskReason
+    """
+
+    from gempython.gemplotting.utils.anaInfo import maxEffPedPercentDefault, highNoiseCutDefault, deadChanCutLowDefault, deadChanCutHighDefault
+
+    # Check attributes of input args
+    # If not present assign appropriate default arguments
+    if hasattr(args,'maxEffPedPercent') is False:
+        args.maxEffPedPercent = maxEffPedPercentDefault
+    if hasattr(args,'highNoiseCut') is False:
+        args.highNoiseCut = highNoiseCutDefault
+    if hasattr(args,'deadChanCutLow') is False:
+        args.deadChanCutLow = deadChanCutLowDefault
+    if hasattr(args,'deadChanCutHigh') is False:
+        args.deadChanCutHigh = deadChanCutHighDefault
+    if hasattr(args,'isVFAT2') is False:
+        args.isVFAT2 = False
+    if hasattr(args, 'zscore') is False:
+        args.zscore = 3.5
+
+    # Same dead channel defaults as anaUltraScurve()
+    if args.isVFAT2:
+        if args.deadChanCutLow is None:
+            args.deadChanCutLow = 4.14E-02
+        if args.deadChanCutHigh is None:
+            args.deadChanCutHigh = 1.09E-01
+    else:
+        if args.deadChanCutLow is None:
+            args.deadChanCutLow = 0
+        if args.deadChanCutHigh is None:
+            args.deadChanCutHigh = 0
+
+    import os
+    if outputDir is None:
+        outputDir = os.path.dirname(os.path.abspath(fitFilename))
+        pass
+
+    # Open the existing analysis output
+    if not os.path.isfile(fitFilename):
+        raise IOError("Input file {0} does not exist, the scurves must be analyzed before they can be remasked".format(fitFilename))
+    import ROOT as r
+    fitFile = r.TFile(fitFilename, 'update')
+    if not fitFile.IsOpen():
+        fitFile.Close()
+        raise IOError("Unable to open input file {0} check to make sure you have read and write permissions".format(fitFilename))
+    if fitFile.IsZombie():
+        fitFile.Close()
+        raise IOError("Input file {0} is a Zombie, check to make sure you have write permissions and file has expected size".format(fitFilename))
+    scurveFitTree = fitFile.Get('scurveFitTree')
+    if not scurveFitTree:
+        fitFile.Close()
+        raise IOError("Input file {0} has no scurveFitTree, was it produced with --doNotFit?".format(fitFilename))
+
+    # Determine the detector type
+    import numpy as np
+    import root_numpy as rp
+    from gempython.gemplotting.mapping.chamberInfo import gemTypeMapping
+    listOfBranches = [ branch.GetName() for branch in scurveFitTree.GetListOfBranches() ]
+    if 'gemType' not in listOfBranches:
+        gemType = "ge11"
+    else:
+        gemType = gemTypeMapping[rp.tree2array(tree=scurveFitTree, branches=[ 'gemType' ], stop=1)[0][0]]
+    from gempython.tools.hw_constants import vfatsPerGemVariant
+    nVFATS = vfatsPerGemVariant[gemType]
+    from gempython.gemplotting.mapping.chamberInfo import CHANNELS_PER_VFAT as maxChans
+
+    if ((vfatList is not None) and ((min(vfatList) < 0) or (max(vfatList) > nVFATS-1))):
+        fitFile.Close()
+        raise ValueError("remaskUltraScurve(): Either vfatList=None or entries in vfatList must be in [0,{0}]".format(nVFATS-1))
+
+    # Read the scalar branches of the fit results
+    isVFAT3 = ('trimPolarity' in listOfBranches)
+    fitData = rp.tree2array(scurveFitTree, branches=[
+        'vfatN', 'vfatCH', 'vfatID', 'ROBstr', 'panPin', 'trimDAC', 'trimPolarity' if isVFAT3 else 'trimRange',
+        'threshold', 'noise', 'ped_eff', 'mask', 'maskReason' ])
+    tableVFATs = fitData['vfatN']
+    tableChans = fitData['vfatCH']
+
+    def getChamberArray(name):
+        chamberArray = np.zeros((nVFATS, maxChans))
+        chamberArray[tableVFATs, tableChans] = fitData[name]
+        return chamberArray
+
+    # ped_eff is evaluated for every channel with data, whatever Nhigh is, and is 0 for
+    # channels without data; the latter all failed their fit and can never pass the cut
+    from gempython.gemplotting.utils.anaInfo import MaskReason
+    scurveMean = getChamberArray('threshold')
+    scurveSigma = getChamberArray('noise')
+    fitFailed = (getChamberArray('maskReason').astype(int) & MaskReason.FitFailed).astype(bool)
+    pedEff = getChamberArray('ped_eff')
+    effPedFraction = np.where(np.logical_not(fitFailed) | (pedEff > 0), pedEff, np.nan)
+
+    # Apply the cuts
+    reasonArray, maskArray = getChannelMaskReasons(
+            scurveMean=scurveMean,
+            scurveSigma=scurveSigma,
+            effPedFraction=effPedFraction,
+            fitFailed=fitFailed,
+            zscore=args.zscore,
+            deadChanCutLow=args.deadChanCutLow,
+            deadChanCutHigh=args.deadChanCutHigh,
+            highNoiseCut=args.highNoiseCut,
+            maxEffPedPercent=args.maxEffPedPercent)
+
+    # If provided, skip all VFATs but the requested one
+    toRemask = np.ones(len(fitData), dtype=bool) if vfatList is None else np.in1d(tableVFATs, vfatList)
+    mask = np.where(toRemask, maskArray[tableVFATs, tableChans], fitData['mask'])
+    maskReason = np.where(toRemask, reasonArray[tableVFATs, tableChans], fitData['maskReason'])
+    listOfVFATs = np.unique(tableVFATs[toRemask])
+    reason4Mask = dict((vfat, reasonArray[vfat]) for vfat in listOfVFATs)
+    print("Determining hot channels")
+    print("")
+    printMaskReasonSummary(reason4Mask)
+
+    # Make Distributions w/o Hot Channels from the ones with all channels
+    print("Removing Hot Channels from Output Histograms")
+    r.gROOT.SetBatch(True)
+    from gempython.utils.nesteddict import nesteddict as ndict
+    vSummaryPlotsNoMaskedChan = ndict()
+    vSummaryPlotsNoMaskedChanPanPin2 = ndict()
+    isPanPin = False
+    for vfat in reason4Mask:
+        vSummaryPlots = fitFile.Get('VFAT{0}/vSummaryPlots{0}'.format(vfat))
+        if not vSummaryPlots:
+            continue
+        vSummaryPlotsPanPin2 = fitFile.Get('VFAT{0}/vSummaryPlotsPanPin2_{0}'.format(vfat))
+        isPanPin = bool(vSummaryPlotsPanPin2)
+
+        # Determine the binX of each channel as in fill2DScurveSummaryPlotsFromArrays()
+        onVFAT = (tableVFATs == vfat)
+        maskedChans = onVFAT & mask.astype(bool)
+        if isPanPin:
+            stripPinOrChan = fitData['panPin'][maskedChans]
+            isPanPin2 = (stripPinOrChan >= maxChans/2)
+            binX = np.where(isPanPin2, maxChans-stripPinOrChan, maxChans/2-stripPinOrChan)
+        elif vSummaryPlots.GetXaxis().GetTitle() == "VFAT Channel":
+            isPanPin2 = np.zeros(np.count_nonzero(maskedChans), dtype=bool)
+            binX = fitData['vfatCH'][maskedChans]+1
+        else:
+            isPanPin2 = np.zeros(np.count_nonzero(maskedChans), dtype=bool)
+            binX = fitData['ROBstr'][maskedChans]+1
+
+        for histos, histo, newName, onHisto in [
+                (vSummaryPlotsNoMaskedChan, vSummaryPlots, 'vSummaryPlotsNoMaskedChan{0}', np.logical_not(isPanPin2)),
+                (vSummaryPlotsNoMaskedChanPanPin2, vSummaryPlotsPanPin2, 'vSummaryPlotsNoMaskedChanPanPin2_{0}', isPanPin2) ]:
+            if not histo:
+                continue
+            histos[vfat] = histo.Clone(newName.format(vfat))
+            histos[vfat].SetDirectory(0)
+            content = rp.hist2array(histos[vfat], include_overflow=True)
+            content[binX[onHisto]] = 0
+            rp.array2hist(content, histos[vfat])
+            histos[vfat].SetEntries(np.count_nonzero(content))
+            pass
+        pass
+
+    from gempython.gemplotting.utils.anautilities import getSummaryCanvas
+    if isPanPin:
+        canvOfScurveHistosNoMaskedChan = plotAllSCurvesOnCanvas(vSummaryPlotsNoMaskedChan,vSummaryPlotsNoMaskedChanPanPin2,"scurvesNoMaskedChan")
+        getSummaryCanvas(vSummaryPlotsNoMaskedChan, vSummaryPlotsNoMaskedChanPanPin2, '{0}/PrunedSummary.png'.format(outputDir), gemType=gemType, write2Disk=True)
+    else:
+        canvOfScurveHistosNoMaskedChan = plotAllSCurvesOnCanvas(vSummaryPlotsNoMaskedChan,None,"scurvesNoMaskedChan")
+        getSummaryCanvas(vSummaryPlotsNoMaskedChan, None, '{0}/PrunedSummary.png'.format(outputDir), gemType=gemType, write2Disk=True)
+
+    # Write the channel config file
+    confF = open(outputDir+'/chConfig.txt','w')
+    if isVFAT3:
+        confF.write('vfatN/I:vfatID/I:vfatCH/I:trimDAC/I:trimPolarity/I:mask/I:maskReason/I\n')
+        for idx in range(len(fitData)):
+            confF.write('{0:d}\t{1:d}\t{2:d}\t{3:d}\t{4:d}\t{5:d}\t{6:d}\n'.format(
+                tableVFATs[idx],
+                fitData['vfatID'][idx],
+                tableChans[idx],
+                fitData['trimDAC'][idx],
+                fitData['trimPolarity'][idx],
+                mask[idx],
+                maskReason[idx]))
+    else:
+        confF.write('vfatN/I:vfatID/I:vfatCH/I:trimDAC/I:mask/I:maskReason/I\n')
+        for idx in range(len(fitData)):
+            confF.write('{0:d}\t{1:d}\t{2:d}\t{3:d}\t{4:d}\t{5:d}\n'.format(
+                tableVFATs[idx],
+                fitData['vfatID'][idx],
+                tableChans[idx],
+                fitData['trimDAC'][idx],
+                mask[idx],
+                maskReason[idx]))
+    confF.close()
+
+    # Rewrite scurveFitTree with the new mask and maskReason branches, all other branches are copied
+    fitFile.cd()
+    scurveFitTree.SetBranchStatus('mask', 0)
+    scurveFitTree.SetBranchStatus('maskReason', 0)
+    newScurveFitTree = scurveFitTree.CloneTree()
+    newMasks = np.zeros(len(fitData), dtype=[ ('mask', 'i4'), ('maskReason', 'i4') ])
+    newMasks['mask'] = mask
+    newMasks['maskReason'] = maskReason
+    rp.array2tree(newMasks, tree=newScurveFitTree)
+    newScurveFitTree.Write('', r.TObject.kOverwrite)
+
+    # Replace the summaries w/o Hot Channels
+    for vfat in vSummaryPlotsNoMaskedChan:
+        dirVFAT = fitFile.GetDirectory("VFAT{0}".format(vfat))
+        dirVFAT.cd()
+        vSummaryPlotsNoMaskedChan[vfat].Write('', r.TObject.kOverwrite)
+        if isPanPin:
+            vSummaryPlotsNoMaskedChanPanPin2[vfat].Write('', r.TObject.kOverwrite)
+        canvOfScurveHistosNoMaskedChan[vfat].Write('', r.TObject.kOverwrite)
+        pass
+
+    list_bNames = ['mask','maskReason','noise','pedestal','ped_eff','threshold','vfatCH','vfatID','vfatN']
+    array_fitData = rp.tree2array(newScurveFitTree,branches=list_bNames)
+
+    fitFile.Close()
+
+    from gempython.gemplotting.utils.scanresults import makeColumnarFile
+    makeColumnarFile(fitFilename, "scurveFitTree")
+    return array_fitData
+
+def getScurveFitHistoTree(fitFile):
+    """
+    Returns the TTree of fitFile holding the scurve histograms and fits, see
+    writeScurveFitTree() and getScurveHistoAndFit(); its entries are in the same
+    order as scurveFitTree.  Files
+    written before these branches were moved out of scurveFitTree give scurveFitTree
+    itself.  Returns None if fitFile has neither.
+
+    fitFile - TFile produced by anaUltraScurve()
+    """
+
+    scurveFitHistoTree = fitFile.Get('scurveFitHistoTree')
+    if scurveFitHistoTree: # TObjects, or arrays in slim mode
+        return scurveFitHistoTree
+
+    scurveFitTree = fitFile.Get('scurveFitTree')
+    if scurveFitTree and scurveFitTree.GetBranch('scurve_h'):
+        return scurveFitTree
+
+    return None
+
+def getScurveHistoAndFit(scurveFitHistoTree):
+    """
+    Returns a tuple (histo, fit) holding the scurve histogram and its fit function
+    for the current entry of scurveFitHistoTree, see getScurveFitHistoTree().  For
+    files written in slim mode the TH1D and TF1 are rebuilt from the stored arrays,
+    see writeScurveFitTree(); otherwise copies of the stored objects are returned.
+
+    scurveFitHistoTree - TTree returned by getScurveFitHistoTree(), after GetEntry()
+    """
+
+    if scurveFitHistoTree.GetBranch('scurve_h'):
+        return (scurveFitHistoTree.scurve_h.Clone(), scurveFitHistoTree.scurve_fit.Clone())
+
+    import numpy as np
+    def getLeafArray(name):
+        leaf = scurveFitHistoTree.GetLeaf(name)
+        return np.array([ leaf.GetValue(idx) for idx in range(leaf.GetLen()) ])
+
+    from gempython.gemplotting.fitting.fitScanData import makeScurveFunc, makeScurveHisto
+    vfat = scurveFitHistoTree.vfatN
+    chan = scurveFitHistoTree.vfatCH
+    histoRange = getLeafArray('histoRange')
+    funcRange = getLeafArray('funcRange')
+    histo = makeScurveHisto('scurve_vfat{0}_chan{1}_h'.format(vfat,chan), getLeafArray('scurveHits'), histoRange[0], histoRange[1])
+    fit = makeScurveFunc('scurveFit_vfat{0}_chan{1}'.format(vfat,chan), getLeafArray('fitParams'), funcRange[0], funcRange[1], bool(scurveFitHistoTree.fitValid))
+
+    return (histo, fit)
+
+def writeScurveFitTree(outDir, fitTable, detName=None, fitter=None, slim=False):
+    """
+    Writes the fit results in the scurveFitTree TTree of outDir in a single step
+    with root_numpy.array2tree, one entry per element of fitTable.  Branch names
+    are the field names of fitTable and branch types follow its dtype ('f4' gives
+    /F, 'i4' gives /I and 'u4' gives /i).  Returns scurveFitTree.
+
+    If fitter is provided the scurve histogram and fit function of each entry are
+    stored in the scurve_h and scurve_fit branches of a second TTree,
+    scurveFitHistoTree, with the same order of entries; tools which only need the
+    fit results do not have to read them.  See getScurveFitHistoTree().
+
+    If slim is True no TObject is written, instead scurveFitHistoTree stores
+    for each entry the fixed size arrays from which getScurveHistoAndFit() rebuilds
+    them:
+
+        scurveHits - content of each bin of the histogram, including under/overflow
+        histoRange - axis range of the histogram
+        fitParams  - the four parameters of the fit function
+        funcRange  - range of the fit function
+        fitValid   - 1 if the fit converged, 0 otherwise
+
+    outDir   - TDirectory, e.g. a TFile, where the TTrees are written
+    fitTable - structured numpy array with at least the vfatN and vfatCH fields
+    detName  - If not None this is stored in the detName branch of scurveFitTree
+    fitter   - ScanDataFitter holding the fits of the entries of fitTable
+    slim     - If True the scurves are stored as arrays rather than TObjects
+    """
+    import ROOT as r
+    import root_numpy as rp
+
+    outDir.cd()
+    scurveFitTree = rp.array2tree(fitTable, name='scurveFitTree')
+    scurveFitTree.SetTitle('Tree Holding FitData')
+    if detName is not None:
+        detNameVec = r.vector('string')()
+        detNameVec.push_back(detName)
+        detNameBranch = scurveFitTree.Branch('detName', detNameVec)
+        for entry in range(len(fitTable)):
+            detNameBranch.Fill()
+            pass
+        pass
+    scurveFitTree.Write()
+
+    if (fitter is not None) and slim:
+        import numpy as np
+        vfatN = fitTable['vfatN']
+        vfatCH = fitTable['vfatCH']
+        curveTable = np.zeros(len(fitTable), dtype=[
+            ('vfatN', 'i4'),
+            ('vfatCH', 'i4'),
+            ('scurveHits', 'i4', (fitter.nBins+2,)),
+            ('histoRange', 'f8', (2,)),
+            ('fitParams', 'f8', (4,)),
+            ('funcRange', 'f8', (2,)),
+            ('fitValid', 'i4') ])
+        curveTable['vfatN'] = vfatN
+        curveTable['vfatCH'] = vfatCH
+        curveTable['scurveHits'] = fitter.scanHits[vfatN, vfatCH]
+        curveTable['histoRange'] = [ fitter.getHistoRange(vfat) for vfat in vfatN ]
+        curveTable['fitParams'] = fitter.scanFitParams[vfatN, vfatCH]
+        curveTable['funcRange'] = [ fitter.getFuncRange(vfat) for vfat in vfatN ]
+        curveTable['fitValid'] = np.array(fitter.fitValid)[vfatN, vfatCH]
+        outDir.cd()
+        scurveFitHistoTree = rp.array2tree(curveTable, name='scurveFitHistoTree')
+        scurveFitHistoTree.SetTitle('Tree Holding the scurve histograms and fits')
+        scurveFitHistoTree.Write()
+    elif fitter is not None:
+        scurveFitHistoTree = r.TTree('scurveFitHistoTree','Tree Holding the scurve histograms and fits')
+        from array import array
+        vfatN = array( 'i', [ 0 ] )
+        scurveFitHistoTree.Branch( 'vfatN', vfatN, 'vfatN/I' )
+        vfatCH = array( 'i', [ 0 ] )
+        scurveFitHistoTree.Branch( 'vfatCH', vfatCH, 'vfatCH/I' )
+        scurve_h = r.TH1F()
+        scurveFitHistoTree.Branch( 'scurve_h', scurve_h)
+        scurve_fit = r.TF1()
+        scurveFitHistoTree.Branch( 'scurve_fit', scurve_fit)
+        for vfat, chan in zip(fitTable['vfatN'], fitTable['vfatCH']):
+            vfatN[0] = vfat
+            vfatCH[0] = chan
+            fitter.getHisto(vfat,chan).Copy(scurve_h)
+            fitter.getFunc(vfat,chan).Copy(scurve_fit)
+            scurveFitHistoTree.Fill()
+            pass
+        scurveFitHistoTree.Write()
+        pass
+
+    return scurveFitTree
@@ -80,24 +80,11 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
     from gempython.gemplotting.utils.multiprocUtils import redirectStdOutAndErr
     redirectStdOutAndErr("anaUltraLatency",outputDir)
 
-    # Build the channel to strip mapping from the text file
+    # Location of the channel to strip mapping files, the mapping is built once gemType is known
     #from gempython.tools.hw_constants import gemVariants
     import pkg_resources
     MAPPING_PATH = pkg_resources.resource_filename('gempython.gemplotting', 'mapping/')
 
-    from gempython.utils.nesteddict import nesteddict as ndict
-    dict_vfatChanLUT = ndict()
-    from gempython.gemplotting.utils.anautilities import getMapping
-    if args.extChanMapping is not None:
-        dict_vfatChanLUT = getMapping(extChanMapping)
-    elif GEBtype == 'long':
-        dict_vfatChanLUT = getMapping(MAPPING_PATH+'/longChannelMap.txt')
-    elif GEBtype == 'short':
-        dict_vfatChanLUT = getMapping(MAPPING_PATH+'/shortChannelMap.txt')
-    else:
-        raise RuntimeError("No external mapping provided and GEB type was not recognized")
-
-
     print('Initializing Histograms')
     if args.isVFAT2:
         dacName = "VThreshold1"
@@ -149,7 +136,7 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
     dict_vfatChanLUT = ndict()
     from gempython.gemplotting.utils.anautilities import getMapping
     if args.extChanMapping is not None:
-        dict_vfatChanLUT = getMapping(extChanMapping, gemType=gemType)
+        dict_vfatChanLUT = getMapping(args.extChanMapping, gemType=gemType)
     elif GEBtype == 'long':
         dict_vfatChanLUT = getMapping(MAPPING_PATH+'/longChannelMap.txt', gemType=gemType)
     elif GEBtype == 'short':
@@ -172,7 +159,6 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
     dict_h2D_thrDAC = ndict()
     dict_hMaxThrDAC = {}
     dict_hMaxThrDAC_NoOutlier = {}
-    dict_chanMaxThrDAC = {}
     for vfat in range(0,nVFATS):
         if vfat not in dict_chipID:
             dict_h2D_thrDAC[vfat] = r.TH2D()
@@ -195,14 +181,31 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
         pass
 
     print('Filling Histograms')
+    list_bNames = ['vfatN','vfatCH','vth1','Nhits']
+    if args.isVFAT2:
+        list_bNames.append('trimRange')
+    array_thrData = rp.tree2array(thrTree, branches=list_bNames)
+    array_thrData = array_thrData[
+            (array_thrData['vfatN'] >= 0) & (array_thrData['vfatN'] < nVFATS) &
+            (array_thrData['vfatCH'] >= 0) & (array_thrData['vfatCH'] < maxChans) &
+            (array_thrData['vth1'] >= 0) & (array_thrData['vth1'] <= THR_DAC_MAX)]
     if args.isVFAT2:
         dict_trimRange = dict((vfat,0) for vfat in range(0,nVFATS))
-    for event in thrTree:
-        if args.isVFAT2:
-            dict_trimRange[int(event.vfatN)] = int(event.dict_trimRange)
-
-        stripPinOrChan = dict_vfatChanLUT[event.vfatN][stripChanOrPinType][event.vfatCH]
-        dict_h2D_thrDAC[event.vfatN].Fill(stripPinOrChan,event.vth1,event.Nhits)
+        dict_trimRange.update(zip(array_thrData['vfatN'].tolist(), array_thrData['trimRange'].tolist()))
+
+    # Hits vs. (vfatN, strip, pin or channel, threshold), i.e. the bins of dict_h2D_thrDAC
+    array_vfatN = array_thrData['vfatN'].astype(np.int64)
+    array_stripPinOrChan = dict_vfatChanLUT.map(array_vfatN, array_thrData['vfatCH'].astype(np.int64), stripChanOrPinType).astype(np.int64)
+    # Panasonic pins run from 2 to 129, those beyond the x axis are dropped as TH2::Fill() puts them in the overflow
+    inRange = (array_stripPinOrChan >= 0) & (array_stripPinOrChan < maxChans)
+    array_thrDACHits = np.bincount(
+            ((array_vfatN * maxChans + array_stripPinOrChan) * (THR_DAC_MAX+1) + array_thrData['vth1'].astype(np.int64))[inRange],
+            weights=array_thrData['Nhits'][inRange].astype(np.float64),
+            minlength=nVFATS * maxChans * (THR_DAC_MAX+1)).reshape(nVFATS, maxChans, THR_DAC_MAX+1)
+    for vfat in range(0,nVFATS):
+        if vfat not in dict_chipID:
+            continue
+        rp.array2hist(array_thrDACHits[vfat], dict_h2D_thrDAC[vfat])
         pass
 
     # Make output TFile and make output TTree
@@ -234,42 +237,29 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
     print('Determining hot channels')
 
     from gempython.gemplotting.utils.anaInfo import MaskReason
-    from gempython.gemplotting.utils.anautilities import isOutlierMADOneSided
-    import numpy as np
-    import root_numpy as rp #note need root_numpy-4.7.2 (may need to run 'pip install root_numpy --upgrade')
-    hot_channels = {}
+    from gempython.gemplotting.utils.anautilities import isOutlierMADOneSidedByRow
+
+    #For each channel the maximum threshold is the first threshold below
+    #THR_DAC_MAX without hits at or above the most populated one, -1 if there is none
+    array_thrDACs = np.arange(THR_DAC_MAX+1)
+    isEmptyAbovePeak = ((array_thrDACHits == 0) & (array_thrDACs < THR_DAC_MAX) &
+            (array_thrDACs >= np.argmax(array_thrDACHits, axis=2)[:,:,np.newaxis]))
+    array_chanMaxThrDAC = np.where(np.any(isEmptyAbovePeak, axis=2), np.argmax(isEmptyAbovePeak, axis=2), -1)
+
+    #Determine Outliers (e.g. "hot" channels) of all VFATs at once
+    array_isHotChan = isOutlierMADOneSidedByRow(array_chanMaxThrDAC, thresh=args.zscore)
     for vfat in range(0,nVFATS):
         if vfat not in dict_chipID:
             continue
 
-        #For each channel determine the maximum thresholds
-        dict_chanMaxThrDAC[vfat] = -1 * np.ones((2,dict_h2D_thrDAC[vfat].GetNbinsX()))
-        for chan in range(0,maxChans):
-            chanProj = dict_h2D_thrDAC[vfat].ProjectionY("projY",chan+1,chan+1,"")
-            for thresh in range(chanProj.GetMaximumBin(),THR_DAC_MAX+1):
-                if(chanProj.GetBinContent(thresh) == 0):
-                    dict_chanMaxThrDAC[vfat][0][chan]=chan
-                    dict_chanMaxThrDAC[vfat][1][chan]=(thresh-1)
-                    dict_hMaxThrDAC[vfat].Fill(thresh-1)
-                    break
-                pass
-            pass
-
-        #Determine Outliers (e.g. "hot" channels)
-        hot_channels[vfat] = [ False for chan in range(0,maxChans) ]
-        chanOutliers = isOutlierMADOneSided(dict_chanMaxThrDAC[vfat][1,:], thresh=args.zscore)
-        for chan in range(0,len(chanOutliers)):
-            hot_channels[vfat][chan] = chanOutliers[chan]
-
-            if not chanOutliers[chan]:
-                dict_hMaxThrDAC_NoOutlier[vfat].Fill(dict_chanMaxThrDAC[vfat][1][chan])
-                pass
-            pass
+        array_maxThrDAC = array_chanMaxThrDAC[vfat].astype(np.float64)
+        rp.fill_hist(dict_hMaxThrDAC[vfat], array_maxThrDAC[array_maxThrDAC >= 0])
+        rp.fill_hist(dict_hMaxThrDAC_NoOutlier[vfat], array_maxThrDAC[~array_isHotChan[vfat]])
 
         #Fill TTree
         for chan in range(0,maxChans):
-            mask[0] = hot_channels[vfat][chan]
-            if hot_channels[vfat][chan]:
+            mask[0] = int(array_isHotChan[vfat][chan])
+            if array_isHotChan[vfat][chan]:
                 maskReason[0] = MaskReason.HotChannel
             else:
                 maskReason[0] = 0x0
@@ -278,7 +268,7 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
             vfatCH[0] = chan
             vfatID[0] = dict_chipID[vfat]
             vfatN[0] = vfat
-            vthr[0] = int(dict_chanMaxThrDAC[vfat][1][chan])
+            vthr[0] = int(array_chanMaxThrDAC[vfat][chan])
             thrAnaTree.Fill()
             pass
         pass
@@ -321,7 +311,8 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
             list_bNames.append("trimPolarity")
 
         from gempython.gemplotting.utils.anautilities import initVFATArray
-        array_VFATSCurveData = rp.root2array(fileScurveFitTree,treename="scurveFitTree",branches=list_bNames)
+        from gempython.gemplotting.utils.scanresults import readScanResults
+        array_VFATSCurveData = readScanResults(fileScurveFitTree,"scurveFitTree",list_bNames)
         dict_vfatTrimMaskData = dict((idx,initVFATArray(array_VFATSCurveData.dtype)) for idx in np.unique(array_VFATSCurveData[list_bNames[0]]))
         for dataPt in array_VFATSCurveData:
             dict_vfatTrimMaskData[dataPt['vfatN']][dataPt[list_bNames[1]]]['mask'] =  dataPt['mask']
@@ -339,21 +330,16 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
         for vfat in range(0,nVFATS):
             if vfat not in dict_chipID:
                 continue
-            vfatChanArray = hot_channels[ hot_channels['vfatN'] == vfat ]
-            for chan in range(0,dict_h2D_thrDAC[vfat].GetNbinsX()):
-                isHotChan = vfatChanArray[ vfatChanArray['vfatCH'] == chan ]['mask']
-
-                if fileScurveFitTree is not None:
-                    isHotChan = (isHotChan or dict_vfatTrimMaskData[vfat][chan]['mask'])
-                    pass
+            isNoisyChan = array_isHotChan[vfat]
+            if fileScurveFitTree is not None:
+                isNoisyChan = isNoisyChan | (dict_vfatTrimMaskData[vfat]['mask'] != 0)
+                pass
 
-                if isHotChan:
-                    print('VFAT {0} Strip {1} is noisy'.format(vfat,chan))
-                    for thresh in range(THR_DAC_MAX+1):
-                        dict_h2D_thrDAC[vfat].SetBinContent(chan, thresh, 0)
-                        pass
-                    pass
+            for chan in np.flatnonzero(isNoisyChan):
+                print('VFAT {0} Strip {1} is noisy'.format(vfat,chan))
                 pass
+            array_thrDACHits[vfat][isNoisyChan] = 0
+            rp.array2hist(array_thrDACHits[vfat], dict_h2D_thrDAC[vfat])
             pass
         pass
 
@@ -380,25 +366,25 @@ def anaUltraThreshold(args,thrFilename,GEBtype="short",outputDir=None,fileScurve
         getSummaryCanvas(dictSummary=dict_h2D_thrDAC, name='{0}/ThreshPrunedSummary.png'.format(outputDir), drawOpt="colz", gemType=gemType, write2Disk=True)
         getSummaryCanvas(dictSummary=dict_h2D_thrDACProjPruned, name='{0}/VFATPrunedSummary.png'.format(outputDir), drawOpt="", gemType=gemType, write2Disk=True)
 
-    #Now determine what thrDAC to use for configuration.  The first threshold bin with no entries for now.
+    #Now determine what thrDAC to use for configuration: one above the highest
+    #non-zero threshold with more than 10 hits, found from the reversed array.
     #Make a text file readable by TTree::ReadFile
     print('Determining the thrDAC values for each VFAT')
+    isAboveTenHits = array_thrDACHits.sum(axis=1)[:,1:] > 10.0
+    array_vt1 = np.where(np.any(isAboveTenHits, axis=1), THR_DAC_MAX+1 - np.argmax(isAboveTenHits[:,::-1], axis=1), 0)
     vt1 = dict((vfat,0) for vfat in range(0,nVFATS))
     for vfat in range(0,nVFATS):
         if vfat not in dict_chipID:
             continue
-        proj = dict_h2D_thrDAC[vfat].ProjectionY()
-        proj.Draw()
-        for thresh in range(THR_DAC_MAX+1,0,-1):
-            if (proj.GetBinContent(thresh+1)) > 10.0:
-                if args.debug:
-                    print('vt1 for VFAT {0} found'.format(vfat))
-                vt1[vfat]=(thresh+1)
-                break
-            pass
+        vt1[vfat] = int(array_vt1[vfat])
+        if args.debug and vt1[vfat] > 0:
+            print('vt1 for VFAT {0} found'.format(vfat))
         pass
     outFile.Close()
 
+    from gempython.gemplotting.utils.scanresults import makeColumnarFile
+    makeColumnarFile("{0}/{1}".format(outputDir,args.outfilename), "thrAnaTree")
+
     txt_vfat = open(outputDir+"/vfatConfig.txt", 'w')
     if args.isVFAT2:
         txt_vfat.write("vfatN/I:vfatID/I:vt1/I:trimRange/I\n")
@@ -651,24 +637,28 @@ def calibrateThrDAC(args):
             raise IOError("calibrateThrDAC(): File {0}/{1} does not exist or is not readable".format(dirPath, infoTuple[1]))
         filename = "{0}/{1}/{2}".format(dirPath, infoTuple[1], tree_names["scurveAna"][0])
 
-        # Load the file
-        r.TH1.AddDirectory(False)
-        scanFile = r.TFile(filename,"READ")
-
-        if not scanFile.IsOpen():
-            raise IOError("calibrateThrDAC(): File {0} is not open or is not readable; please check input list of scandates: {1}".format(filename,args.inputFile))
-        if scanFile.IsZombie():
-            raise IOError("calibrateThrDAC(): File {0} is a zombie; consider removing this from your input list of scandates: {1}".format(filename,args.inputFile))
+        # Check the file, unless an up to date columnar copy of scurveFitTree exists
+        from gempython.gemplotting.utils.scanresults import hasColumnarFile, readScanResults
+        if not hasColumnarFile(filename, "scurveFitTree"):
+            r.TH1.AddDirectory(False)
+            scanFile = r.TFile(filename,"READ")
+
+            if not scanFile.IsOpen():
+                raise IOError("calibrateThrDAC(): File {0} is not open or is not readable; please check input list of scandates: {1}".format(filename,args.inputFile))
+            if scanFile.IsZombie():
+                raise IOError("calibrateThrDAC(): File {0} is a zombie; consider removing this from your input list of scandates: {1}".format(filename,args.inputFile))
+            scanFile.Close()
+            pass
 
         # Determine vfatID
         list_bNames = ['vfatN','vfatID']
-        array_vfatData = rp.tree2array(tree=scanFile.scurveFitTree, branches=list_bNames)
+        array_vfatData = readScanResults(filename, "scurveFitTree", list_bNames)
         array_vfatData = np.unique(array_vfatData)
 
         import os
         # Get scurve data for this arm dac value (used for boxplots)
         list_bNames = ['noise', 'threshold', 'vfatN', 'vthr', 'ped_eff']
-        scurveFitData = rp.tree2array(tree=scanFile.scurveFitTree, branches=list_bNames)
+        scurveFitData = readScanResults(filename, "scurveFitTree", list_bNames)
 
         #remove channels that fail quality cuts
         scurveFitMask1 = np.logical_or(scurveFitData['noise'] < args.deadChanCutLow,scurveFitData['noise'] > args.deadChanCutHigh)